@@ -0,0 +1,62 @@
+'''
+
+Description: Helpers for backfilling several NHL seasons or drafts in one run.
+
+Both nhl_data_pull.py (--seasons) and juniors_data_pull.py (--drafts) accept a
+range of seasons/draft years to pull in a single process instead of being
+launched once per SEASON/DRAFT setting. Progress through a backfill is
+tracked in the work queue (see work_queue), so an interrupted backfill picks
+up where it stopped when it's rerun with the same range.
+'''
+
+__version__ = '1.0'
+__title__ = 'backfill'
+
+import re
+import argparse
+
+def _expand(text, pattern, step):
+    '''
+    Expand a comma separated list of values/ranges (i.e. '2005-2008,2012')
+    into a sorted list without duplicates. step() turns a start and end value
+    into every value in between.
+    '''
+
+    values = []
+    for part in text.split(','):
+        bounds = part.strip().split('-')
+        if len(bounds) > 2 or not all(re.fullmatch(pattern, b)
+                for b in bounds):
+            raise argparse.ArgumentTypeError(f"invalid range: {part}")
+        start, end = bounds[0], bounds[-1]
+        if end < start:
+            raise argparse.ArgumentTypeError(f"range is backwards: {part}")
+        values.extend(step(start, end))
+
+    return sorted(set(values))
+
+def season_range(text):
+    '''
+    Parse a list of NHL seasons for the --seasons option, in the same format
+    as the SEASON config setting: '20102011-20192020' or '20102011,20152016'.
+    '''
+
+    def step(start, end):
+        for season in (start, end):
+            if int(season[4:]) != int(season[:4]) + 1:
+                raise argparse.ArgumentTypeError(f"invalid season: {season}")
+        return [f"{year}{year + 1}"
+            for year in range(int(start[:4]), int(end[:4]) + 1)]
+
+    return _expand(text, r'\d{8}', step)
+
+def draft_range(text):
+    '''
+    Parse a list of draft years for the --drafts option: '2005-2019' or
+    '2005,2010'.
+    '''
+
+    def step(start, end):
+        return [str(year) for year in range(int(start), int(end) + 1)]
+
+    return _expand(text, r'\d{4}', step)
@@ -0,0 +1,255 @@
+'''
+
+Description: End-to-end benchmark of the NHL data pull programs.
+
+Generates a synthetic league (see synthetic_league), serves it from a local
+stub of the NHL API, and runs nhl_data_pull.py and juniors_data_pull.py
+against it and a local Postgres database. Each program writes its per-phase
+metrics (see metrics) to a JSON summary, which is collected into a report of
+wall time, requests/sec, rows/sec, and database round trips for every phase.
+
+The benchmark database is wiped and recreated from config/create_table.sql
+before each run (unless --keep-db is passed), so point it at a database that
+is only used for benchmarking.
+'''
+
+__version__ = '1.0'
+__title__ = 'benchmark'
+__author__ = 'Paul Hegedus'
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+import psycopg2
+
+from configparser import ConfigParser
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from statements import TABLES
+from synthetic_league import League
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def argsetup():
+    '''
+    Setup command line argument parser for the league and database settings.
+    '''
+
+    parser = argparse.ArgumentParser(description =
+                'Benchmark the NHL data pull programs against a synthetic '
+                'league.')
+    league = parser.add_argument_group('synthetic league')
+    league.add_argument('--teams', type=int, default=32)
+    league.add_argument('--roster', type=int, default=25,
+                help='players on each team\'s roster')
+    league.add_argument('--seasons', type=int, default=5,
+                help='NHL seasons played by each rostered player')
+    league.add_argument('--junior-seasons', type=int, default=3,
+                help='junior seasons played by each player')
+    league.add_argument('--rounds', type=int, default=7,
+                help='rounds in the Entry Draft')
+    league.add_argument('--probe-share', type=float, default=0.1,
+                help='share of draft picks without an NHL Player ID')
+    league.add_argument('--seed', type=int, default=0)
+
+    database = parser.add_argument_group('benchmark database')
+    database.add_argument('--db-host',
+                default=os.environ.get('PGHOST', 'localhost'))
+    database.add_argument('--db-port',
+                default=os.environ.get('PGPORT', '5432'))
+    database.add_argument('--db-name',
+                default=os.environ.get('PGDATABASE', 'nhl_benchmark'))
+    database.add_argument('--db-user',
+                default=os.environ.get('PGUSER', 'nhl_user'))
+    database.add_argument('--db-password',
+                default=os.environ.get('PGPASSWORD', ''))
+    database.add_argument('--keep-db', action='store_true',
+                help='don\'t wipe the benchmark database before running')
+
+    parser.add_argument('--latency-ms', type=float, default=0,
+                help='simulated latency of each stub API response')
+    parser.add_argument('--initial-load', action='store_true',
+                help='run the programs with --initial-load')
+    parser.add_argument('--skip-juniors', action='store_true',
+                help='only benchmark nhl_data_pull.py')
+    parser.add_argument('--output', help='write the report to a JSON file')
+    a = parser.parse_args()
+    return a
+
+class StubAPI(ThreadingHTTPServer):
+    '''
+    Local stand-in for the NHL API that serves a synthetic league's responses
+    and counts the requests it handles.
+    '''
+
+    daemon_threads = True
+
+    def __init__(self, responses, latency=0):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.responses = {path: json.dumps(data).encode()
+            for path, data in responses.items()}
+        self.latency = latency
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def site(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+class StubHandler(BaseHTTPRequestHandler):
+    '''
+    Serve a response from the stub API, or a 404 like the NHL API's.
+    '''
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        # links built from the API's own links can have doubled slashes
+        path = '/' + '/'.join(p for p in self.path.split('/') if p)
+        body = self.server.responses.get(path)
+        if body is None and '?season=' in path:
+            # past season rosters are served as the current roster
+            body = self.server.responses.get(path.split('?')[0])
+        status = 200
+        if body is None:
+            status = 404
+            body = b'{"messageNumber": 10, "message": "Object not found"}'
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # keep the stub quiet; requests are counted instead
+        pass
+
+def reset_database(args):
+    '''
+    Drop every table the programs write to and recreate them from
+    config/create_table.sql.
+    '''
+
+    connection = psycopg2.connect(user=args.db_user,
+        password=args.db_password, host=args.db_host,
+        database=args.db_name, port=args.db_port)
+    cursor = connection.cursor()
+    for table in TABLES:
+        cursor.execute(f"DROP TABLE IF EXISTS {table} CASCADE")
+    with open(f"{BASE_DIR}/config/create_table.sql") as f:
+        cursor.execute(f.read())
+    connection.commit()
+    cursor.close()
+    connection.close()
+
+def write_config(program, args, league, site, work_dir):
+    '''
+    Write a copy of a program's default config file that points it at the
+    stub API and benchmark database, with caching, the work queue's saved
+    progress, and fixtures out of the way. Returns the config file's path.
+    '''
+
+    config = ConfigParser()
+    config.read(f"{BASE_DIR}/config/{program.split('_')[0]}_data.ini")
+
+    config['DEFAULT']['LOGDIR'] = f"{work_dir}/logs"
+    config['DEFAULT']['SEASON'] = league.season
+    config['DEFAULT']['DRAFT'] = league.draft_year
+    config['DATABASE'].update({'USER': args.db_user,
+        'PASSWORD': args.db_password, 'CONNECTION': args.db_host,
+        'DB_NAME': args.db_name, 'PORT': str(args.db_port)})
+    config['LINKS']['site'] = site
+    config['LINKS']['base'] = f"{site}/api/v1"
+    config['CACHE'] = {'ENABLED': 'FALSE'}
+    config['QUEUE'] = {'PATH': f"{work_dir}/{program}_queue.sqlite"}
+    config['FIXTURES'] = {'MODE': 'OFF'}
+    # the stub can take as many requests as the fetch engine can send
+    config['RATE_LIMIT 127.0.0.1'] = {'RATE': '100000', 'BURST': '1000'}
+    config['METRICS'] = {'SUMMARY_PATH': f"{work_dir}/{program}.json"}
+
+    path = f"{work_dir}/{program}.ini"
+    with open(path, 'w') as f:
+        config.write(f)
+    return path
+
+def run_program(program, config_path, args, stub):
+    '''
+    Run one of the programs against the stub API and return its report: the
+    program's metrics summary plus its total wall time.
+    '''
+
+    command = [sys.executable, f"{BASE_DIR}/{program}.py", config_path,
+        '--restart']
+    if args.initial_load:
+        command.append('--initial-load')
+
+    stub.requests = 0
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=BASE_DIR)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        sys.exit(f"{program} exited with {result.returncode}...see its log "
+            f"in {os.path.dirname(config_path)}/logs")
+
+    with open(config_path.replace('.ini', '.json')) as f:
+        summary = json.load(f)
+    return dict({'wall_seconds': wall, 'stub_requests': stub.requests},
+        **summary)
+
+def print_report(report):
+    '''
+    Print each program's per-phase results as a table.
+    '''
+
+    print(f"League: {report['league']}")
+    header = (f"{'phase':<16}{'wall (s)':>10}{'requests':>10}{'req/s':>10}"
+        f"{'rows':>10}{'rows/s':>10}{'db trips':>10}")
+    for program, results in report['programs'].items():
+        print(f"\n{program}: {results['wall_seconds']:.2f}s total, "
+            f"{results['stub_requests']} requests served")
+        print(header)
+        for name, phase in results['phases'].items():
+            print(f"{name:<16}{phase['seconds']:>10.2f}"
+                f"{phase['requests']:>10}{phase['requests_per_sec']:>10.1f}"
+                f"{phase['rows']:>10}{phase['rows_per_sec']:>10.1f}"
+                f"{phase['db_round_trips']:>10}")
+
+if __name__ == '__main__':
+    args = argsetup()
+
+    league = League(teams=args.teams, roster=args.roster,
+        seasons=args.seasons, junior_seasons=args.junior_seasons,
+        rounds=args.rounds, probe_share=args.probe_share, seed=args.seed)
+    print(f"Generated synthetic league: {league.summary()}")
+
+    stub = StubAPI(league.responses, args.latency_ms / 1000)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+
+    if not args.keep_db:
+        reset_database(args)
+
+    programs = ['nhl_data_pull']
+    if not args.skip_juniors:
+        programs.append('juniors_data_pull')
+
+    report = {'league': league.summary(), 'programs': {}}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for program in programs:
+            config_path = write_config(program, args, league, stub.site,
+                work_dir)
+            report['programs'][program] = run_program(program, config_path,
+                args, stub)
+    stub.shutdown()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
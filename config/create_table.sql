@@ -2,6 +2,7 @@
 PostgreSQL table. */
 
 /* Drop Tables */
+-- DROP TABLE nhl_sync_state;
 -- DROP TABLE junior_skater_stats;
 -- DROP TABLE junior_goalie_stats;
 -- DROP TABLE nhl_draft;
@@ -74,6 +75,10 @@ CREATE TABLE "nhl_skater_stats" (
     "points" int,
     "shifts" int,
     "sequence" int,
+    "toi_seconds" int,
+    "pp_toi_seconds" int,
+    "even_toi_seconds" int,
+    "sh_toi_seconds" int,
     PRIMARY KEY ("player_id", "team_id", "season", "sequence")
 );
 
@@ -103,7 +108,9 @@ CREATE TABLE "nhl_goalie_stats" (
     "pp_save_pct" float,
     "sh_save_pct" float,
     "even_save_pct" float,
-    "sequence" int
+    "sequence" int,
+    "toi_seconds" int,
+    PRIMARY KEY ("player_id", "team_id", "season", "sequence")
 );
 
 CREATE TABLE "nhl_draft" (
@@ -119,7 +126,8 @@ CREATE TABLE "nhl_draft" (
   "dob" date,
   "country" char(3),
   "shoots" char(1),
-  "position" char(20)
+  "position" char(20),
+  "match_confidence" real
 );
 
 CREATE TABLE "junior_skater_stats" (
@@ -141,6 +149,10 @@ CREATE TABLE "junior_skater_stats" (
   "plus_minus" int,
   "pim" int,
   "sequence" int,
+  "toi_seconds" int,
+  "pp_toi_seconds" int,
+  "sh_toi_seconds" int,
+  "even_toi_seconds" int,
   PRIMARY KEY ("player_id", "season", "sequence")
 );
 
@@ -163,6 +175,15 @@ CREATE TABLE "junior_goalie_stats" (
   PRIMARY KEY ("player_id", "season", "sequence")
 );
 
+CREATE TABLE "nhl_sync_state" (
+  "player_id" int PRIMARY KEY,
+  "historic_hash" char(64),
+  "current_hash" char(64),
+  "complete" boolean,
+  "last_season" char(8),
+  "synced_at" timestamp
+);
+
 /* Add foreign key references */
 ALTER TABLE "nhl_team_players" ADD FOREIGN KEY ("team_id") REFERENCES "nhl_teams" ("id");
 ALTER TABLE "nhl_team_players" ADD FOREIGN KEY ("player_id") REFERENCES "nhl_players" ("id");
@@ -170,4 +191,9 @@ ALTER TABLE "nhl_skater_stats" ADD FOREIGN KEY ("player_id", "team_id", "season"
 ALTER TABLE "nhl_goalie_stats" ADD FOREIGN KEY ("player_id", "team_id", "season", "sequence") REFERENCES "nhl_team_players" ("player_id", "team_id", "season", "sequence");
 ALTER TABLE "nhl_draft" ADD FOREIGN KEY ("nhl_player_id") REFERENCES "nhl_players" ("id");
 ALTER TABLE "junior_skater_stats" ADD FOREIGN KEY ("player_id") REFERENCES "nhl_draft" ("nhl_player_id");
-ALTER TABLE "junior_goalie_stats" ADD FOREIGN KEY ("player_id") REFERENCES "nhl_draft" ("nhl_player_id");
\ No newline at end of file
+ALTER TABLE "junior_goalie_stats" ADD FOREIGN KEY ("player_id") REFERENCES "nhl_draft" ("nhl_player_id");
+
+/* Indexes for the lookups the programs run (see config/migrations) */
+CREATE UNIQUE INDEX "nhl_draft_year_pick" ON "nhl_draft" ("draft_year", "overall_pick") INCLUDE ("nhl_player_id");
+CREATE INDEX "nhl_players_position" ON "nhl_players" ("position_code") INCLUDE ("id");
+CREATE INDEX "nhl_team_players_season" ON "nhl_team_players" ("season") INCLUDE ("player_id");
\ No newline at end of file
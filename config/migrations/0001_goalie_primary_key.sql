@@ -0,0 +1,14 @@
+/* nhl_goalie_stats was created without a primary key, which the bulk
+writer's upserts (ON CONFLICT) and the foreign key lookups need. */
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'nhl_goalie_stats'::regclass AND contype = 'p'
+    ) THEN
+        ALTER TABLE "nhl_goalie_stats"
+            ADD PRIMARY KEY ("player_id", "team_id", "season", "sequence");
+    END IF;
+END
+$$;
@@ -0,0 +1,10 @@
+/* Sync state table used by nhl_data_pull.py --incremental. */
+
+CREATE TABLE IF NOT EXISTS "nhl_sync_state" (
+  "player_id" int PRIMARY KEY,
+  "historic_hash" char(64),
+  "current_hash" char(64),
+  "complete" boolean,
+  "last_season" char(8),
+  "synced_at" timestamp
+);
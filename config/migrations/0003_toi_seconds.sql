@@ -0,0 +1,45 @@
+/* Adds the integer seconds time on ice columns to a database created before
+they were added to create_table.sql, and backfills them from the 'MM:SS'
+varchar columns. Safe to run more than once. */
+
+/* 'MM:SS' (minutes can run past 59) to seconds; NULL if malformed */
+CREATE OR REPLACE FUNCTION toi_seconds(toi varchar) RETURNS int AS $$
+    SELECT CASE WHEN toi ~ '^\s*\d+:\d+\s*$'
+        THEN split_part(trim(toi), ':', 1)::int * 60
+            + split_part(trim(toi), ':', 2)::int
+    END
+$$ LANGUAGE SQL IMMUTABLE;
+
+ALTER TABLE "nhl_skater_stats"
+    ADD COLUMN IF NOT EXISTS "toi_seconds" int,
+    ADD COLUMN IF NOT EXISTS "pp_toi_seconds" int,
+    ADD COLUMN IF NOT EXISTS "even_toi_seconds" int,
+    ADD COLUMN IF NOT EXISTS "sh_toi_seconds" int;
+
+ALTER TABLE "nhl_goalie_stats"
+    ADD COLUMN IF NOT EXISTS "toi_seconds" int;
+
+ALTER TABLE "junior_skater_stats"
+    ADD COLUMN IF NOT EXISTS "toi_seconds" int,
+    ADD COLUMN IF NOT EXISTS "pp_toi_seconds" int,
+    ADD COLUMN IF NOT EXISTS "sh_toi_seconds" int,
+    ADD COLUMN IF NOT EXISTS "even_toi_seconds" int;
+
+/* Backfill each table with one set-based UPDATE rather than row by row */
+UPDATE "nhl_skater_stats" SET
+    "toi_seconds" = toi_seconds("time_on_ice"),
+    "pp_toi_seconds" = toi_seconds("pp_toi"),
+    "even_toi_seconds" = toi_seconds("even_toi"),
+    "sh_toi_seconds" = toi_seconds("sh_toi")
+WHERE "toi_seconds" IS NULL;
+
+UPDATE "nhl_goalie_stats" SET
+    "toi_seconds" = toi_seconds("time_on_ice")
+WHERE "toi_seconds" IS NULL;
+
+UPDATE "junior_skater_stats" SET
+    "toi_seconds" = toi_seconds("time_on_ice"),
+    "pp_toi_seconds" = toi_seconds("pp_toi"),
+    "sh_toi_seconds" = toi_seconds("sh_toi"),
+    "even_toi_seconds" = toi_seconds("even_toi")
+WHERE "toi_seconds" IS NULL;
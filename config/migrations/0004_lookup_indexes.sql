@@ -0,0 +1,19 @@
+/* Keys and covering indexes for the lookups the data pull programs run (see
+the statements in statements.py). Lookups by each stats table's full key -
+nhl_team_players/nhl_skater_stats/nhl_goalie_stats by (player_id, team_id,
+season, sequence), and junior stats by (player_id, season, sequence) - are
+served by their primary keys. */
+
+/* select_draft_picks: a pick is only made once per draft */
+CREATE UNIQUE INDEX IF NOT EXISTS "nhl_draft_year_pick"
+    ON "nhl_draft" ("draft_year", "overall_pick") INCLUDE ("nhl_player_id");
+
+/* select_skaters/select_goalies: players by position, joined to
+nhl_team_players on id */
+CREATE INDEX IF NOT EXISTS "nhl_players_position"
+    ON "nhl_players" ("position_code") INCLUDE ("id");
+
+/* select_skaters_incremental/select_goalies_incremental: players on a
+roster in the current season */
+CREATE INDEX IF NOT EXISTS "nhl_team_players_season"
+    ON "nhl_team_players" ("season") INCLUDE ("player_id");
@@ -0,0 +1,6 @@
+/* Adds the confidence (0 to 1) that each draft pick was matched to the right
+NHL Player Profile, written by juniors_data_pull.py. Picks stored before it
+was added are left NULL. */
+
+ALTER TABLE "nhl_draft"
+    ADD COLUMN IF NOT EXISTS "match_confidence" real;
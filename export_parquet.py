@@ -0,0 +1,237 @@
+'''
+
+Description: Export the stats and draft tables to partitioned Parquet files.
+
+Streams nhl_skater_stats, nhl_goalie_stats, junior_skater_stats,
+junior_goalie_stats, and nhl_draft out of the database with server-side
+cursors (so a table is never held in memory all at once) and writes each one
+to Parquet via Arrow, partitioned by season (or draft_year for nhl_draft):
+
+    {output}/nhl_skater_stats/season=20192020/part-0.parquet
+
+Columns are written with proper types rather than as they're stored: time on
+ice totals are written as integer seconds (the *_seconds columns, or
+converted from the 'MM:SS' strings for databases that haven't been migrated
+to them yet), seasons and draft years as integers, and char(n) columns have
+their padding stripped.
+Downstream jobs can read (or memory-map) just the partitions they need
+instead of querying the live database.
+
+Database credentials are read in from the [DATABASE] section of the
+configuration file passed on the command line.
+'''
+
+__version__ = '1.0'
+__title__ = 'export_parquet'
+__author__ = 'Paul Hegedus'
+
+import os
+import sys
+import shutil
+import argparse
+import psycopg2
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from configparser import ConfigParser
+from stats_parser import toi_seconds
+from statements import TOI_SECONDS
+
+# tables exported and the column each one is partitioned by
+EXPORTS = {
+    'nhl_skater_stats': 'season',
+    'nhl_goalie_stats': 'season',
+    'junior_skater_stats': 'season',
+    'junior_goalie_stats': 'season',
+    'nhl_draft': 'draft_year',
+}
+
+# char columns holding numbers, converted to integers
+INT_COLUMNS = ('season', 'draft_year')
+
+# Arrow type for each Postgres type in the tables (information_schema names)
+ARROW_TYPES = {
+    'smallint': pa.int16(),
+    'integer': pa.int32(),
+    'bigint': pa.int64(),
+    'real': pa.float32(),
+    'double precision': pa.float64(),
+    'numeric': pa.float64(),
+    'boolean': pa.bool_(),
+    'date': pa.date32(),
+    'timestamp without time zone': pa.timestamp('us'),
+    'character': pa.string(),
+    'character varying': pa.string(),
+    'text': pa.string(),
+}
+
+def argsetup():
+    '''
+    Setup command line argument parser for the config file and export options.
+    '''
+
+    parser = argparse.ArgumentParser(description =
+                'Export the stats and draft tables to partitioned Parquet '
+                'files.')
+    parser.add_argument('configf',
+                help='config file with the [DATABASE] settings')
+    parser.add_argument('--output', required=True,
+                help='directory to write the Parquet files to')
+    parser.add_argument('--tables', nargs='+', choices=list(EXPORTS),
+                default=list(EXPORTS), help='tables to export (default all)')
+    parser.add_argument('--batch-rows', type=int, default=50000,
+                help='rows fetched from the database and written to each '
+                'Parquet row group at a time')
+    a = parser.parse_args()
+    return a
+
+def table_schema(conn, table):
+    '''
+    Return the Arrow schema for the columns of a table that are exported, and
+    a converter (or None) for each column's values, in column order.
+
+    'MM:SS' time on ice columns are left out when the table has their integer
+    seconds column, and converted to seconds when it doesn't.
+    '''
+
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT column_name, data_type FROM information_schema.columns "
+        "WHERE table_name = %s ORDER BY ordinal_position", (table,)
+    )
+    columns = cursor.fetchall()
+    names = {column for column, _ in columns}
+    fields, converters = [], []
+    for column, data_type in columns:
+        if TOI_SECONDS.get(column) in names:
+            continue
+        elif column in TOI_SECONDS:
+            fields.append(pa.field(column, pa.int32()))
+            converters.append(toi_seconds)
+        elif column in INT_COLUMNS:
+            fields.append(pa.field(column, pa.int32()))
+            converters.append(_int)
+        elif data_type == 'character':
+            fields.append(pa.field(column, pa.string()))
+            converters.append(_strip)
+        else:
+            fields.append(pa.field(column,
+                ARROW_TYPES.get(data_type, pa.string())))
+            converters.append(None)
+    cursor.close()
+
+    if not fields:
+        sys.exit(f"Table {table} doesn't exist...exiting")
+    return pa.schema(fields), converters
+
+def _int(value):
+    return int(value) if value not in (None, '') else None
+
+def _strip(value):
+    return value.rstrip() if value is not None else None
+
+def record_batch(schema, converters, rows):
+    '''
+    Convert a list of rows from the database into an Arrow record batch.
+    '''
+
+    columns = []
+    for field, convert, values in zip(schema, converters, zip(*rows)):
+        if convert:
+            values = [convert(value) for value in values]
+        columns.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+def export_table(conn, table, partition, output, batch_rows):
+    '''
+    Stream a table out of the database with a server-side cursor, in order of
+    its partition column, and write each partition's rows to its own Parquet
+    file. The table's export is written to a temporary directory and swapped
+    in once it's finished, so readers never see a partial export.
+
+    Returns the number of rows and partitions written.
+    '''
+
+    schema, converters = table_schema(conn, table)
+    part_index = schema.get_field_index(partition)
+    target = os.path.join(output, table)
+    temp = f"{target}.tmp-{os.getpid()}"
+    if os.path.isdir(temp):
+        shutil.rmtree(temp)
+    os.makedirs(temp)
+
+    # named cursors are server-side; rows are fetched batch_rows at a time
+    cursor = conn.cursor(name=f"export_{table}")
+    cursor.itersize = batch_rows
+    cursor.execute(f"SELECT {', '.join(schema.names)} FROM {table} "
+        f"ORDER BY {partition}")
+
+    # partition value of the rows being written; nothing's been written yet
+    writer, current = None, object()
+    total, partitions = 0, 0
+    while True:
+        rows = cursor.fetchmany(batch_rows)
+        if not rows:
+            break
+
+        # rows come back in partition order; split the batch where the
+        # partition value changes
+        start = 0
+        for i in range(len(rows) + 1):
+            value = rows[i][part_index] if i < len(rows) else None
+            if i < len(rows) and value == current:
+                continue
+            if i > start:
+                batch = record_batch(schema, converters, rows[start:i])
+                writer.write_table(pa.Table.from_batches([batch]))
+                total += i - start
+            if i == len(rows):
+                break
+            # first row of a new partition
+            if writer:
+                writer.close()
+            current = value
+            key = converters[part_index](value) if converters[part_index] \
+                else value
+            part_dir = os.path.join(temp, f"{partition}={key}")
+            os.makedirs(part_dir)
+            writer = pq.ParquetWriter(
+                os.path.join(part_dir, 'part-0.parquet'), schema
+            )
+            partitions += 1
+            start = i
+
+    if writer:
+        writer.close()
+    cursor.close()
+    # end the read-only transaction the named cursor ran in
+    conn.rollback()
+
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+    os.replace(temp, target)
+    return total, partitions
+
+if __name__ == '__main__':
+    args = argsetup()
+
+    config = ConfigParser()
+    config.read(args.configf)
+    try:
+        conn = psycopg2.connect(
+            user = config['DATABASE']['USER'],
+            password = config['DATABASE']['PASSWORD'],
+            host = config['DATABASE']['CONNECTION'],
+            database = config['DATABASE']['DB_NAME'],
+            port = config['DATABASE']['PORT'],
+        )
+    except psycopg2.DatabaseError as e:
+        sys.exit(f"Couldn't connect to the database: {e}")
+
+    os.makedirs(args.output, exist_ok=True)
+    for table in args.tables:
+        rows, partitions = export_table(conn, table, EXPORTS[table],
+            args.output, args.batch_rows)
+        print(f"Exported {rows} rows of {table} in {partitions} "
+            f"partitions to {os.path.join(args.output, table)}")
+    conn.close()
@@ -0,0 +1,155 @@
+'''
+
+Description: Record/replay store for responses from the NHL's API.
+
+In record mode, every response request_data() hands back (whether it came
+from the API or the response cache) is written to a compressed zip archive
+keyed by its URL. In replay mode, request_data() serves every URL from that
+archive instead of going out to the network, optionally sleeping for a
+simulated latency first. Replaying a recorded run gives reproducible timings
+for the NHL data pull programs on a machine with no network access.
+
+The store is setup from the [FIXTURES] section of the configuration file.
+'''
+
+__version__ = '1.0'
+__title__ = 'fixtures'
+
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import zipfile
+import threading
+
+log_file = logging.getLogger(__name__)
+
+RECORD = 'RECORD'
+REPLAY = 'REPLAY'
+
+def _entry_name(url):
+    '''
+    Return the name of the archive entry a URL's response is stored under.
+    '''
+
+    return f"{hashlib.sha1(url.encode()).hexdigest()}.json"
+
+class FixtureStore:
+    '''
+    Zip archive of NHL API responses keyed by URL.
+
+    path    -> location of the archive
+    mode    -> RECORD to add responses to the archive, REPLAY to serve them
+    latency -> seconds to sleep before serving each replayed response
+    jitter  -> max seconds added to/taken off the latency; the amount for a
+               URL is the same on every replay
+    '''
+
+    def __init__(self, path, mode, latency=0, jitter=0):
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.jitter = jitter
+
+        # counters reported when the store is closed
+        self.recorded = 0
+        self.replayed = 0
+
+        self.lock = threading.Lock()
+        if mode == REPLAY:
+            self.archive = zipfile.ZipFile(path, 'r')
+        else:
+            # responses already in the archive are kept as recorded
+            self.archive = zipfile.ZipFile(path, 'a', zipfile.ZIP_DEFLATED)
+        self.names = set(self.archive.namelist())
+
+    def record(self, url, data):
+        '''
+        Add a URL's response to the archive, unless it was already recorded.
+        '''
+
+        name = _entry_name(url)
+        body = json.dumps({'url': url, 'data': data})
+        with self.lock:
+            if name in self.names:
+                return
+            self.archive.writestr(name, body)
+            self.names.add(name)
+            self.recorded += 1
+
+    def replay(self, url):
+        '''
+        Return a URL's recorded response after the simulated latency. Raises
+        LookupError if the URL was never recorded, since the run can't be
+        replayed as is.
+        '''
+
+        name = _entry_name(url)
+        if name not in self.names:
+            log_file.error(f"No recorded response for {url} in {self.path}..."
+                f"record the run again before replaying it...exiting")
+            raise LookupError(f"No recorded response for {url}")
+
+        delay = self.latency
+        if self.jitter:
+            delay += random.Random(url).uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        with self.lock:
+            body = self.archive.read(name)
+            self.replayed += 1
+        log_file.info(f"Replayed recorded data for {url}...")
+        return json.loads(body)['data']
+
+    def summary(self):
+        '''
+        Return a one line summary of the store's counters for the log.
+        '''
+
+        return (
+            f"Fixture store: {self.recorded} responses recorded, "
+            f"{self.replayed} replayed, {len(self.names)} in {self.path}"
+        )
+
+    def close(self):
+        '''
+        Log the store's counters and close the archive.
+        '''
+
+        log_file.info(self.summary())
+        with self.lock:
+            self.archive.close()
+
+def open_fixtures(config):
+    '''
+    Setup the fixture store from the [FIXTURES] section of the configuration
+    file. Returns None unless MODE is RECORD or REPLAY.
+
+    Settings:
+        MODE        -> OFF, RECORD, or REPLAY
+        PATH        -> zip archive the responses are stored in
+        LATENCY_MS  -> milliseconds to sleep before serving a replayed response
+        JITTER_MS   -> max milliseconds added to/taken off of LATENCY_MS
+    '''
+
+    mode = config.get('FIXTURES', 'MODE', fallback='OFF').upper()
+    if mode not in (RECORD, REPLAY):
+        return None
+
+    path = config.get('FIXTURES', 'PATH', fallback=None)
+    if not path:
+        path = f"{os.path.expanduser('~')}/cache/nhl_api_fixtures.zip"
+
+    # create the fixture directory if it doesn't exist
+    fixture_dir = os.path.dirname(path)
+    if mode == RECORD and fixture_dir and not os.path.isdir(fixture_dir):
+        os.makedirs(fixture_dir)
+
+    latency = config.getfloat('FIXTURES', 'LATENCY_MS', fallback=0) / 1000
+    jitter = config.getfloat('FIXTURES', 'JITTER_MS', fallback=0) / 1000
+
+    log_file.info(f"{mode.capitalize()}ing NHL API responses in {path}...")
+    return FixtureStore(path, mode, latency, jitter)
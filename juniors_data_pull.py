@@ -12,10 +12,8 @@ __version__ = '1.0'
 __title__ = 'juniors_data_pull'
 __author__ = 'Paul Hegedus'
 
-import os
 import sys
-import logging
-import requests
+import time
 import psycopg2
 import argparse
 import pandas as pd
@@ -25,43 +23,26 @@ import pdb
 
 from configparser import ConfigParser
 from googlesearch import search
+from urllib.error import HTTPError
 from datetime import datetime
 from pprint import pprint
-
-def open_logs(logs):
-    '''
-    Create a log file and setup parameters.
-    '''
-    
-    # check if log directory from config file exists
-    log_check = os.path.isdir(logs)
-
-    # create the directory if it doesn't exist
-    if not log_check:
-        try:
-            os.makedirs(logs)
-        except:
-            # couldn't create dir; default to {HOME}/logs
-            home_dir = os.path.expanduser('~')
-            logs = f"{home_dir}/logs"
-            if not os.path.isdir(logs):
-                os.makedirs(logs)
-
-    # create log filename with timestamp
-    now = datetime.now()
-    date_format = now.strftime("%d%b%y_%H%M%S")
-    log_file = f"{logs}/juniors_data_pull_{date_format}.log"
-
-    # create and configure logger
-    logging.basicConfig(filename=log_file,
-                        format='[%(asctime)s] %(message)s',
-                        filemode='w')
-    logger = logging.getLogger()
-
-    # set the threshold of logger to DEBUG
-    logger.setLevel(logging.DEBUG)
-
-    return logger
+from nhl_api import (setup_session, close_session, request_batch,
+    request_iter, host_limiter, replayable, cached_responses)
+from rate_limit import retry_after, retryable
+from nhl_db import (BulkWriter, PreparedConnection, sql_select, empty_tables,
+    drop_indexes, create_indexes, commit_policy)
+from backfill import draft_range
+from work_queue import open_queue
+from metrics import phase, write_summary
+from log_setup import open_logs
+from migrate import migrate
+from stats_parser import toi_seconds
+from player_index import open_player_index
+from name_match import confidence, MATCH, REVIEW
+
+# tables loaded with COPY by --initial-load if they're empty
+LOAD_TABLES = ('nhl_players', 'nhl_draft', 'junior_skater_stats',
+    'junior_goalie_stats')
 
 def argsetup():
     '''
@@ -71,6 +52,12 @@ def argsetup():
     parser = argparse.ArgumentParser(description =
                 'Read in player/team data from the NHL\'s website.')
     parser.add_argument('configf', help='configuration file')
+    parser.add_argument('--initial-load', action='store_true',
+                help='load empty tables with COPY instead of upserts')
+    parser.add_argument('--drafts', type=draft_range,
+                help='backfill a range of drafts, i.e. 2005-2019')
+    parser.add_argument('--restart', action='store_true',
+                help='ignore progress saved by an interrupted run')
     a = parser.parse_args()
     return a
 
@@ -91,7 +78,8 @@ def database_connect():
                     password = db_passwd,
                     host = db_host,
                     database = db_name,
-                    port = db_port
+                    port = db_port,
+                    connection_factory = PreparedConnection
         )
         log_file.info('Database connection successfully established.')
     except psycopg2.DatabaseError as e:
@@ -101,137 +89,20 @@ def database_connect():
 
     return connection
 
-def request_data(url):
-    '''
-    Request data from specified URL pointing to a NHLStats API endpoint.
-
-    The requested dataset is a dict containing key-value pairs:
-        i.e.  {
-                'copyright': 'NHL and the NHL Shield are registered...',
-                'teams': [{team_data}, {team_data}, ... {team_data}]
-              }
-    This function returns the full dict, it does not separate out the actual 
-    data found in the list of dicts that makes up the value from a key-value
-    pair after the copyright info.
-
-    Note: Retry the connection twice if run into timeout error.
-    '''
-
-    log_file.info(f"Requesting data from {url}...")
-    for i in range(3):
-        try:
-            r = requests.get(url)
-            if r.status_code == 200:
-                # successful request, return data
-                log_file.info(
-                    f"Pulled data on {i + 1} try from {url}..."
-                )
-                return r.json()
-            else:
-                # bad request
-                if i == 2:
-                    # last attempt; return bad data if any
-                    log_file.info(
-                        f"Failed to pull data {i + 1} times from {url}..."
-                    )
-                    return r.json()
-        except requests.exceptions.Timeout:
-            # retry
-            log_file.info(
-              f"Connection to {url} timed out on try {_ + 1}...retrying"
-            )
-            continue
-        except requests.exceptions.RequestException as e:
-            log_file.error(e)
-            sys.exit(1)
-
-def sql_insert(conn, cmd):
-    '''
-    Execute an SQL insert command using an established database connection.
-
-    conn -> preexisting database connection [(i.e. a connection setup using 
-        nhl_data_pull.database_connect()]
-    cmd  -> SQL insert command to execute
-    '''
-
-    cursor = conn.cursor()
-    try:
-        cursor.execute(cmd)
-        conn.commit()
-    except (Exception, psycopg2.DatabaseError) as e:
-        log_file.error(f"ERROR: {e}")
-        conn.rollback()
-        cursor.close()
-        return 1
-    cursor.close()
-    return 0
-
-def sql_update(conn, cmd):
-    '''
-    Execute an SQL update command using an established database connection.
-
-    conn -> preexisting database connection [(i.e. a connection setup using 
-        nhl_data_pull.database_connect()]
-    cmd  -> SQL update command to execute
-    '''
-
-    cursor = conn.cursor()
-    try:
-        cursor.execute(cmd)
-        conn.commit()
-    except (Exception, psycopg2.DatabaseError) as e:
-        log_file.error(f"ERROR: {e}")
-        conn.rollback()
-        cursor.close()
-        return 1
-    cursor.close()
-    return 0
-
-def sql_select(conn, cmd, fetchall):
-    '''
-    Execute an SQL select command using an established database connection, and
-    return one/all selected records depending on fetchall parameter.
-
-    conn  -> preexisting database connection
-    cmd   -> SQL select command to execute
-    fetch -> Boolean that tells function whether to return all results or only
-              one result
-    '''
-
-    cursor = conn.cursor()
-    try:
-        cursor.execute(cmd)
-        if fetchall:
-            result = cursor.fetchall()
-        else:
-            result = cursor.fetchone()
-    except (Exception, psycopg2.DatabaseError) as e:
-        log_file.error(f"ERROR: {e}")
-        conn.rollback()
-        cursor.close()
-        return 1
-    cursor.close()
-    return result
-
 def get_player_id(name):
     '''
     Provided an NHL Player's name, return their NHL Player ID if they have one.
 
     Input: NHL Player's name (first and last)
-    Output: NHL Player ID if found; NULL if not found
+    Output: NHL Player ID if found; None if not found
     '''
 
     log_file.info(f">>> Searching Google for {name}'s NHL Player ID...")
-    # search google for player name
+    # search google for player name; searches are spaced out by Google's
+    # rate limit rather than a fixed pause
     query = name + ' NHL'
-    player_search = search(
-        query,
-        tld = 'com',
-        num = 10,
-        start = 0,
-        stop = 10,
-        pause = 2
-    )
+    player_search = replayable(f"google:{query}",
+        lambda: _google_search(query))
     nhl_link = None
     for link in player_search:
         # check if it's the NHL website, which is where we get the Player ID
@@ -246,93 +117,108 @@ def get_player_id(name):
         # parse id out of the http link
         nhl_link = nhl_link.split('/')
         player_id = nhl_link[-1].split('-')
-        player_id = player_id[-1]
+        try:
+            player_id = int(player_id[-1])
+        except ValueError:
+            player_id = None
         log_file.info(f">>> NHL Player ID found for {name}: {player_id}...")
     else:
         log_file.info(f">>> Couldn't find NHL Player ID for {name}...")
-        player_id = 'NULL'
+        player_id = None
 
     return player_id
 
-def _nhl_player_check(player):
+def _google_search(query):
     '''
-    Given an NHL Player's ID, check if they have a corresponding record in the
-    players table of the database.
+    Return the list of links Google finds for a search query. Searches are
+    spaced out by Google's rate limit, and retried with backoff if Google
+    throttles them.
     '''
 
-    # check the players table in the database for record 
-    cmd = (
-        f"SELECT * FROM nhl_players WHERE id = {player}"
-    )
-    check = sql_select(db_connect, cmd, False)
-    if check:
-        # record exists for player in database
-        log_file.info(f">> Found matching NHL Player Profile for {player}...")
-        return 0
-    else:
-        # no record exists
-        log_file.info(f">> No NHL Player Profile found for {player}...")
-        return 1
-
-def _nhl_player_create(player):
+    limiter = host_limiter('www.google.com')
+    results = []
+    for attempt in range(limiter.retries + 1):
+        limiter.acquire()
+        try:
+            results = list(search(
+                query,
+                tld = 'com',
+                num = 10,
+                start = 0,
+                stop = 10,
+                pause = 0
+            ))
+            limiter.success()
+            break
+        except HTTPError as e:
+            if not retryable(e.code) or attempt == limiter.retries:
+                log_file.error(f">>> Google search for {query} failed: {e}")
+                break
+            # throttled by Google; back off before searching again
+            delay = limiter.failure(attempt, retry_after(e.headers))
+            log_file.info(f">>> Google search for {query} got {e.code}..."
+                f"retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+    return results
+
+def _nhl_player_check(players):
     '''
-    Create a player profile to add to the NHL players table in the database.
+    Given a list of NHL Player IDs, return the set of them that have a
+    corresponding record in the players table of the database (or were
+    queued for it this run), checking them all in one query.
     '''
 
-    # create link to NHL player profile
-    link = f"{nhl_players}/{player}"
-
-    # pull data for NHL player
-    data = request_data(link)
+    # check the records written this run, then the players table in the
+    # database for the rest
+    found = {player for player in players
+        if writer.contains('nhl_players', (player,))}
+    rest = [player for player in players if player not in found]
+    if rest:
+        stored = sql_select(db_connect, 'select_player_ids', (rest,),
+            fetchall=True)
+        if stored != 1:
+            found.update(player for player, in stored)
+    log_file.info(f">> Found matching NHL Player Profiles for {len(found)} "
+        f"of {len(players)} players...")
+    return found
+
+def _nhl_player_create(player, data):
+    '''
+    Create a player profile to add to the NHL players table in the database,
+    from the player's already requested {nhl_players}/{player} data.
+    '''
 
-    # remove copyright statement
-    for key in data.keys():
-        if key == 'people':
-            data = data[key][0]
-    
     # setup data points
-    first_name = data.get('firstName', 'NULL')
-    last_name = data.get('lastName', 'NULL')   
-    link = data.get('link', 'NULL')
-    dob = data.get('birthDate', 'NULL')
-    nationality = data.get('nationality', 'NULL')
-    active = data.get('active', 'NULL')
-    rookie = data.get('rookie', 'NULL')
-    shoots_catches = data.get('shootsCatches', 'NULL')
+    first_name = data.get('firstName')
+    last_name = data.get('lastName')
+    link = data.get('link')
+    dob = data.get('birthDate')
+    nationality = data.get('nationality')
+    active = data.get('active')
+    rookie = data.get('rookie')
+    shoots_catches = data.get('shootsCatches')
     try:
-        position_code = data.get('primaryPosition').get('abbreviation', 'NULL')
-        position_name = data.get('primaryPosition').get('name', 'NULL')
-        position_type = data.get('primaryPosition').get('type', 'NULL')
+        position_code = data.get('primaryPosition').get('abbreviation')
+        position_name = data.get('primaryPosition').get('name')
+        position_type = data.get('primaryPosition').get('type')
     except:
-        position_code = 'NULL'
-        position_name = 'NULL'
-        position_type = 'NULL'
-
-    # insert new record to players table
-    players_insert_cmd = (
-        f"INSERT INTO nhl_players (id, first_name, last_name, link, dob, "
-        f"nationality, active, rookie, shoots_catches, position_code, "
-        f"position_name, position_type) VALUES ({player}, $${first_name}$$, "
-        f"$${last_name}$$, $${link}$$, $${dob}$$, $${nationality}$$, "
-        f"{active}, {rookie}, $${shoots_catches}$$, "
-        f"$${position_code}$$ ,$${position_name}$$, "
-        f"$${position_type}$$)"
-    )
-    # insert the new player data into the database
-    status = sql_insert(db_connect, players_insert_cmd)
-
-    # log success
-    if status == 0:
-        log_file.info(f">> Created NHL Player profile for {player}...")
-        return 0
-    else:
-        return 1
+        position_code = None
+        position_name = None
+        position_type = None
+
+    # queue new record for players table; written with the rest of the round
+    writer.add('nhl_players', (player, first_name, last_name, link, dob,
+        nationality, active, rookie, shoots_catches, position_code,
+        position_name, position_type))
+    log_file.info(f">> Created NHL Player profile for {player}...")
+    return 0
 
-def _sequence_check(id, season, seq):
+class SequenceAllocator:
     '''
-    Check whether a player, season, sequence instance exists in the database
-    already. If so, increment sequence and return new value. Otherwise, return
-    sequence as is.
+    Assign the sequence number each of a draft's junior seasons is stored
+    under, from the sequences already stored for the draft's players (read
+    in one query) rather than checking the database for every season.
 
     In order to correctly parse out junior stats data and upload it to the
     database, we need to distinguish between player instances with the same
@@ -343,42 +229,510 @@ def _sequence_check(id, season, seq):
             20032004        U-18            1
             20032004       WJ18-A           2
             20032004        NAHL            2
+
+    A season keeps the sequence it was stored under by an earlier run, so
+    rerunning a draft updates the same rows instead of shifting them; new
+    seasons get the lowest free sequence from the API's sequence number up.
+    The tables' primary keys still enforce that no two rows share one.
     '''
 
-    # log function start
-    log_file.info(f">>> Checking whether player {id}'s {season} season with "
-        f"sequence {seq} already exists in the database...")
-    
-    # check junior_skater_stats for record
-    skater_check_cmd = (
-        f"SELECT EXISTS("
-        f"SELECT 1 FROM junior_skater_stats WHERE player_id = {id} AND "
-        f"season = $${season}$$ AND sequence = {seq})"
+    def __init__(self, players):
+        # player -> {(season, sequence): league} already in the database
+        self.stored = {}
+        # player -> {(season, sequence)} assigned this run
+        self.claimed = {}
+
+        if players:
+            rows = sql_select(db_connect, 'select_junior_sequences',
+                (list(players), list(players)), fetchall=True)
+            for player, season, sequence, league in (rows if rows != 1
+                    else []):
+                self.stored.setdefault(player, {})[(season, sequence)] = \
+                    league.strip() if league else league
+
+    def assign(self, player, season, league, sequence):
+        '''
+        Return the sequence a player's season in a league is stored under,
+        given the API's sequence number for it.
+        '''
+
+        stored = self.stored.get(player, {})
+        claimed = self.claimed.setdefault(player, set())
+
+        # where the season was stored by an earlier run, at the API's
+        # sequence or bumped to a later one
+        keys = [(season, sequence)] + sorted(key for key in stored
+            if key[0] == season and key[1] != sequence)
+        for key in keys:
+            if stored.get(key) == league and key not in claimed:
+                claimed.add(key)
+                if key[1] != sequence:
+                    log_file.info(f">>> Player {player}'s {season} season in "
+                        f"the {league} is stored with sequence {key[1]}...")
+                return key[1]
+
+        # new season; take the first sequence that isn't stored or assigned
+        assigned = sequence
+        while (season, assigned) in stored or (season, assigned) in claimed:
+            assigned += 1
+        claimed.add((season, assigned))
+        if assigned != sequence:
+            log_file.info(f">>> Found existing record for player {player}'s "
+                f"{season} season with sequence {sequence}. New sequence "
+                f"number is {assigned}..")
+        return assigned
+
+def _pick_id(draft_year, pick, prospects):
+    '''
+    Return a draft pick's NHL Player ID (or None if it can't be found without
+    checking the previous picks), their DOB if their prospect profile has it,
+    the confidence the ID is theirs, and where the ID came from. The ID comes
+    from the pick's prospect profile, the player index, or a Google search,
+    in that order. Only an ID from the prospect profile is certain (1.0);
+    the others are None until they're checked against the NHL Player Profile
+    they lead to.
+    '''
+
+    name = pick.get('prospect').get('fullName', 'NULL')
+    link = pick.get('prospect').get('link')
+    prospect_id = pick.get('prospect').get('id')
+    nhl_player_id = None
+    dob = None
+    match = None
+    source = None
+
+    # get NHL Player ID to pull drafted player's info
+    log_file.info(f"> Getting NHL Player ID for {name}")
+    if prospect_id is not None:
+        # check if prospect data has NHL Player ID
+        prospect_data = prospects[f"{nhl_site}/{link}"]
+        # remove copyright statement
+        for key in prospect_data.keys():
+            if key == 'prospects':
+                prospect_data = prospect_data[key][0]
+        nhl_player_id = prospect_data.get('nhlPlayerId')
+        dob = prospect_data.get('birthDate')
+        if nhl_player_id is not None:
+            return nhl_player_id, dob, 1.0, 'prospect'
+        # prospect profile without an NHL Player ID; check the local player
+        # index before checking the previous picks
+        nhl_player_id, index_match = player_index.lookup(name, dob,
+            draft_year)
+        source = 'index'
+    else:
+        # check the local player index before searching Google
+        nhl_player_id, index_match = player_index.lookup(name,
+            draft_year=draft_year)
+        source = 'index'
+        if nhl_player_id is not None:
+            log_file.info(f">> Prospect ID was null for {name}...found "
+                f"NHL Player ID in player index: {nhl_player_id} "
+                f"(confidence {index_match:.2f})...")
+        else:
+            # search Google for player's ID from their NHL profile
+            nhl_player_id = get_player_id(name)
+            source = 'google'
+            log_file.info(f">> Prospect ID was null for {name}...found "
+                f"NHL Player ID on Google: {nhl_player_id}...")
+
+    return nhl_player_id, dob, match, source
+
+def _request_profiles(players, profiles):
+    '''
+    Request the {nhl_players}/{player} profile of every NHL Player ID in a
+    list that isn't in profiles yet, all at once, and add them to profiles
+    with the copyright statement removed. A player ID that doesn't exist gets
+    an empty profile.
+    '''
+
+    links = list(dict.fromkeys(f"{nhl_players}/{player_id}"
+        for player_id in players if player_id not in profiles))
+    for link, player_data in zip(links, request_batch(links)):
+        # remove copyright
+        people = player_data.get('people') or [{}]
+        profiles[int(link.split('/')[-1])] = people[0]
+
+def _previous_pick_ids(draft_year, unresolved, known, dobs, profiles):
+    '''
+    Find the NHL Player IDs of draft picks without one by checking the IDs
+    just after the previous picks' - players drafted one after the other
+    were usually given IDs one after the other.
+
+    The previous three picks of every unresolved pick are read from the
+    database in one query, and the picks are then resolved in pick order, in
+    rounds: every pick whose previous picks have all been tried has its
+    candidate IDs' profiles requested in one concurrent batch and scored
+    against its name (and DOB, when known) in memory with
+    name_match.confidence(). An ID found for a pick is a candidate source for
+    the picks after it, so consecutive picks without a prospect profile can
+    still be found one after the other. Returns {overall pick: (NHL Player
+    ID, confidence)} for the picks a profile matching with at least REVIEW
+    confidence was found for.
+
+    unresolved -> {overall pick: name} for the picks without an ID
+    known      -> {overall pick: NHL Player ID} for picks found this run
+    dobs       -> {overall pick: DOB} from the picks' prospect profiles
+    profiles   -> {NHL Player ID: profile} of the profiles requested so far;
+                  the candidates' profiles are added to it
+    '''
+
+    log_file.info(f">> No prospect profile for {len(unresolved)} picks..."
+        f"generating NHL Player IDs using previous draft picks...")
+
+    # previous picks that weren't found this run are read from the database,
+    # including unresolved picks an earlier run stored an ID for
+    previous = {overall_pick - i for overall_pick in unresolved
+        for i in range(1, 4) if overall_pick - i >= 1}
+    missing = sorted(previous - set(known))
+    known = dict(known)
+    if missing:
+        stored = sql_select(db_connect, 'select_draft_picks',
+            (draft_year, missing), fetchall=True)
+        if stored != 1:
+            for overall_pick, player_id in stored:
+                known.setdefault(overall_pick, player_id)
+
+    found = {}
+    waiting = sorted(unresolved)
+    while waiting:
+        # picks whose previous picks have all been tried already
+        ready = [overall_pick for overall_pick in waiting
+            if not any(overall_pick - i in waiting for i in range(1, 4))]
+        waiting = [overall_pick for overall_pick in waiting
+            if overall_pick not in ready]
+
+        # candidate IDs for each pick, in the order they were checked one at
+        # a time: one after the previous pick's, then two after the pick
+        # before, ...
+        candidates = {overall_pick: _candidate_ids(overall_pick, known)
+            for overall_pick in ready}
+
+        # request every candidate's profile in the round at once
+        _request_profiles([player_id for ids in candidates.values()
+            for player_id in ids], profiles)
+
+        for overall_pick in ready:
+            name = unresolved[overall_pick]
+            best, best_score = _best_candidate(name, dobs.get(overall_pick),
+                candidates[overall_pick], profiles)
+
+            if best is None:
+                log_file.info(f">> Failed to find {name} after the previous "
+                    f"picks...")
+                continue
+            if best_score < MATCH:
+                # warn that the names only partly match just in case it's
+                # the wrong player
+                log_file.warning(
+                    f"WARNING: {name}'s name only partly matches NHL Profile "
+                    f"for {best} (confidence {best_score:.2f})..."
+                )
+            found[overall_pick] = (best, best_score)
+            # the picks after this one can check the IDs after it
+            known[overall_pick] = best
+            player_index.learn(name, best, dobs.get(overall_pick),
+                draft_year, source='probe')
+
+    return found
+
+def _candidate_ids(overall_pick, known):
+    '''
+    Return the candidate NHL Player IDs for a pick from the IDs of the three
+    picks before it (known -> {overall pick: NHL Player ID}): one after the
+    previous pick's, then one and two after the pick before that, and so on,
+    without repeats.
+    '''
+
+    ids = []
+    for i in range(1, 4):
+        if overall_pick - i not in known:
+            continue
+        for j in range(1, i + 1):
+            if known[overall_pick - i] + j not in ids:
+                ids.append(known[overall_pick - i] + j)
+    return ids
+
+def _best_candidate(name, dob, candidates, profiles):
+    '''
+    Return the candidate ID whose profile best matches a pick's name (and
+    DOB, when known) and its confidence, or (None, REVIEW) if none match
+    with at least REVIEW confidence. A different DOB scores 0; candidates are
+    in the order they're most likely to be the pick, so the first of any tie
+    wins.
+    '''
+
+    best, best_score = None, REVIEW
+    for player_id in candidates:
+        profile = profiles[player_id]
+        score = confidence(name, profile.get('fullName'), dob,
+            profile.get('birthDate'))
+        if score > best_score or (best is None and score == best_score):
+            best, best_score = player_id, score
+    return best, best_score
+
+def _draft(draft_year, draft_data):
+    '''
+    Pull the junior hockey data of every prospect selected in an NHL Entry
+    Draft, given the draft's data from {nhl_draft}/{draft_year}, and queue it
+    to be written to the database a round at a time.
+
+    Every URL the draft needs is requested up front, a stage at a time and
+    each stage all at once: the prospect profiles, then (once the picks' NHL
+    Player IDs are known) every pick's NHL Player Profile and yearByYear
+    stats. The picks are then parsed and written from memory.
+    '''
+
+    log_file.info(f"Getting junior hockey data for prospects selected in "
+        f"{draft_year} NHL Entry Draft..."
     )
-    skater_check = sql_select(db_connect, skater_check_cmd, False)
-    skater_check = skater_check[0]
     
-    # check junior_goalie_stats for record
-    goalie_check_cmd = (
-        f"SELECT EXISTS("
-        f"SELECT 1 FROM junior_goalie_stats WHERE player_id = {id} AND "
-        f"season = $${season}$$ AND sequence = {seq})"
+    # remove copyright info
+    for key in draft_data.keys():
+        if key == 'drafts':
+            draft_data = draft_data[key][0]
+
+    # skip picks that were written by an earlier run
+    draft_rounds = draft_data['rounds']
+    pending = set(queue.plan([
+        f"pick {draft_year} {pick.get('pickOverall')}"
+        for rnd in draft_rounds for pick in rnd['picks']
+    ]))
+    picks = [pick for rnd in draft_rounds for pick in rnd['picks']
+        if f"pick {draft_year} {pick.get('pickOverall')}" in pending]
+    if not picks:
+        return
+
+    # request every prospect profile in the draft at once
+    prospect_links = [
+        f"{nhl_site}/{pick.get('prospect').get('link')}"
+        for pick in picks
+        if pick.get('prospect').get('id') is not None
+    ]
+    draft_prospects = dict(
+        zip(prospect_links, request_batch(prospect_links))
     )
-    goalie_check = sql_select(db_connect, goalie_check_cmd, False)
-    goalie_check = goalie_check[0]
-
-    if skater_check or goalie_check:
-        # record already exists that player, season, and sequence
-        log_file.info(f">>> Found existing record for player {id}'s {season} "
-            f"season with sequence {seq}. New sequence number is {seq+1}..")
-        # increment sequence number
-        seq = seq + 1
-    else:
-        # record doesn't exist for that player, season, sequence
-        log_file.info(f">>> No record found for player {id}'s {season} season "
-            f"with sequnce {seq}...proceeding as normal...")
+
+    # find each pick's NHL Player ID from their prospect profile, the player
+    # index, or Google
+    draft_ids = {}
+    draft_dobs = {}
+    draft_matches = {}
+    draft_sources = {}
+    for pick in picks:
+        overall_pick = pick.get('pickOverall')
+        (draft_ids[overall_pick], draft_dobs[overall_pick],
+            draft_matches[overall_pick], draft_sources[overall_pick]) = \
+            _pick_id(draft_year, pick, draft_prospects)
+
+    # check the IDs from the player index and Google against the NHL Player
+    # Profiles they lead to, all requested at once; an ID whose profile
+    # doesn't match is dropped before anything is written for it
+    profiles = {}
+    unverified = [overall_pick for overall_pick, match in draft_matches.items()
+        if match is None and draft_ids[overall_pick] is not None]
+    _request_profiles([draft_ids[overall_pick]
+        for overall_pick in unverified], profiles)
+    for pick in picks:
+        overall_pick = pick.get('pickOverall')
+        if overall_pick not in unverified:
+            continue
+        name = pick.get('prospect').get('fullName', 'NULL')
+        player_id = draft_ids[overall_pick]
+        profile = profiles[player_id]
+        match = confidence(name, profile.get('fullName'),
+            draft_dobs[overall_pick], profile.get('birthDate'))
+        if match < REVIEW:
+            found = 'on Google' if draft_sources[overall_pick] == 'google' \
+                else 'in the player index'
+            log_file.warning(f"WARNING: {name}'s name doesn't match NHL "
+                f"Profile for {player_id} found {found} (confidence "
+                f"{match:.2f})...checking the previous picks instead...")
+            draft_ids[overall_pick] = None
+            continue
+        draft_matches[overall_pick] = match
+        if draft_sources[overall_pick] == 'google':
+            # only write back an ID the profile confirms
+            player_index.learn(name, player_id, draft_dobs[overall_pick],
+                draft_year, source='google')
+
+    # check the NHL Player IDs after the previous picks' for the rest of the
+    # draft all at once
+    unresolved = {
+        pick.get('pickOverall'): pick.get('prospect').get('fullName', 'NULL')
+        for pick in picks
+        if draft_ids[pick.get('pickOverall')] is None
+            and pick.get('pickOverall') != 1
+    }
+    if unresolved:
+        known = {overall_pick: player_id
+            for overall_pick, player_id in draft_ids.items()
+            if player_id is not None}
+        for overall_pick, (player_id, match) in _previous_pick_ids(
+                draft_year, unresolved, known, draft_dobs, profiles).items():
+            draft_ids[overall_pick] = player_id
+            draft_matches[overall_pick] = match
+
+    # request every pick's NHL Player Profile (unless it was requested as a
+    # candidate above) and yearByYear stats at once
+    player_ids = [player_id for player_id in draft_ids.values()
+        if player_id is not None]
+    _request_profiles(player_ids, profiles)
+    junior_links = [f"{nhl_players}/{player_id}/{stats_byYear}"
+        for player_id in player_ids]
+    draft_seasons = dict(zip(player_ids, request_batch(junior_links)))
+
+    # check which players already have an NHL player profile in our database
+    existing = _nhl_player_check(player_ids)
+
+    # read the junior season sequences already stored for the draft's players
+    sequences = SequenceAllocator(player_ids)
+
+    # cycle through each round of the draft
+    for rnd in draft_rounds:
+        # cycle through each pick of the round
+        for pick in rnd['picks']:
+            if f"pick {draft_year} {pick.get('pickOverall')}" not in pending:
+                continue
+
+            # select data points we need
+            rnd = pick.get('round')
+            rnd_pick = pick.get('pickInRound')
+            overall_pick = pick.get('pickOverall')
+            name = pick.get('prospect').get('fullName', 'NULL')
+            team_id = pick.get('team').get('id')
+            team_name = pick.get('team').get('name')
+            prospect_id = pick.get('prospect').get('id')
+            nhl_player_id = draft_ids[overall_pick]
+
+            if nhl_player_id is None:
+                # couldn't find nhl_player_id that matches draft pick; log error and skip to next pick
+                if overall_pick == 1:
+                    log_file.warning(f">> First pick in draft and no "
+                        f"prospect profile found...skipping...")
+                log_file.warning(f"WARNING: COULDN'T FIND A CORRESPONDING "
+                    f"PLAYER ID FOR {name}...MOVING TO NEXT PICK")
+                writer.complete(f"pick {draft_year} {overall_pick}")
+                continue
+
+            # NHL Player profile and season data were requested up front
+            player_data = profiles[nhl_player_id]
+            season_data = draft_seasons[nhl_player_id]
+
+            # set data points using player data
+            first_name = player_data.get('firstName')
+            last_name = player_data.get('lastName')
+            dob = player_data.get('birthDate')
+            country = player_data.get('birthCountry')
+            shoots = player_data.get('shootsCatches')
+            try:
+                position = player_data.get('primaryPosition').get('name')
+            except:
+                position = None
+
+            # every ID was checked against its profile before getting here
+            match = draft_matches[overall_pick]
+
+            if nhl_player_id not in existing:
+                # no record found, create one. Must be done b/c of foreign key references
+                _nhl_player_create(nhl_player_id, player_data)
+                existing.add(nhl_player_id)
+
+            # queue draft data for nhl_draft table of database
+            writer.add('nhl_draft', (nhl_player_id, draft_year, overall_pick,
+                rnd, rnd_pick, team_id, prospect_id, first_name, last_name,
+                dob, country, shoots, position, match))
+            # later lookups of the pick (i.e. the next draft's backfill run)
+            # are answered from memory
+            player_index.add(name, nhl_player_id, dob, draft_year)
+            player_index.add(f"{first_name} {last_name}", nhl_player_id, dob,
+                draft_year)
+            log_file.info(f"> Draft data queued for {draft_year} Round "
+                f"{rnd} Pick {rnd_pick} - {first_name} {last_name} (name "
+                f"match confidence {match:.2f})...")
         
-    return seq
+            log_file.info(f">> Pulling Junior hockey seasons for {name}...")
+
+            # remove copyright and parse down to just the season by season data
+            for key in season_data.keys():
+                if key == 'stats':
+                    season_data = season_data[key][0]['splits']
+            
+            with phase('junior_seasons'):
+                # cycle through player's seasons to parse out Junior hockey
+                for season in season_data:
+                    # check if that season's stats are from a Junior league
+                    league = season.get('league').get('name')
+                    if league in junior_leagues and position != 'Goalie':
+                        # get junior skater numbers for this season
+                        year = season.get('season')
+                        sequence = season.get('sequenceNumber')
+                        games = season.get('stat').get('games')
+                        goals = season.get('stat').get('goals')
+                        assists = season.get('stat').get('assists')
+                        points = season.get('stat').get('points')
+                        pp_goals = season.get('stat').get('powerPlayGoals')
+                        gw_goals = season.get('stat').get('gameWinningGoals')
+                        sh_goals = season.get('stat').get('shortHandedGoals')
+                        faceoff_pct = season.get('stat').get('faceOffPct')
+                        time_on_ice = season.get('stat').get('timeOnIce')
+                        pp_toi = season.get('stat').get('powerPlayTimeOnIce')
+                        sh_toi = season.get('stat').get('shortHandedTimeOnIce')
+                        even_toi = season.get('stat').get('evenTimeOnIce')
+                        plus_minus = season.get('stat').get('plusMinus')
+                        pim = season.get('stat').get('pim')
+
+                        # make sure sequence number isn't already being used this season
+                        sequence = sequences.assign(nhl_player_id, year,
+                            league, sequence)
+
+                        # queue junior skater stats for the database
+                        writer.add('junior_skater_stats', (nhl_player_id, year,
+                            league, games, goals, assists, points, pp_goals,
+                            gw_goals, sh_goals, faceoff_pct, time_on_ice, pp_toi,
+                            sh_toi, even_toi, plus_minus, pim, sequence,
+                        toi_seconds(time_on_ice), toi_seconds(pp_toi),
+                        toi_seconds(sh_toi), toi_seconds(even_toi)))
+                    elif league in junior_leagues and position == 'Goalie':
+                        # get Junior goalie stats for the season
+                        year = season.get('season')
+                        sequence = season.get('sequenceNumber')
+                        games = season.get('stat').get('games')
+                        wins = season.get('stat').get('wins')
+                        losses = season.get('stat').get('losses')
+                        ties = season.get('stat').get('ties')
+                        ot_wins = season.get('stat').get('ot')
+                        shutouts = season.get('stat').get('shutouts')
+                        goals_against = season.get('stat').get('goalsAgainst')
+                        gaa = season.get('stat').get('goalAgainstAverage')
+                        shots_against = season.get('stat').get('shotsAgainst')
+                        saves = season.get('stat').get('saves')
+                        save_pct = season.get('stat').get('savePercentage')
+
+                        # make sure sequence number isn't already being used this season
+                        sequence = sequences.assign(nhl_player_id, year,
+                            league, sequence)
+
+                        # queue goalie junior stats for the database
+                        writer.add('junior_goalie_stats', (nhl_player_id, year,
+                            league, games, wins, losses, ties, ot_wins, shutouts,
+                            goals_against, gaa, shots_against, saves, save_pct,
+                            sequence))
+                    else:
+                        # league either isn't a Junior league or isn't one we're looking at
+                        log_file.info(f">> Skipping {name}'s {season['season']} "
+                            f"season in the {league}...")
+                        # move on to next listed season
+                        continue
+
+                    log_file.info(f">> Added Junior season stats for {name}'s "
+                        f"{year} season in the {league}...")
+
+            # all Junior seasons should have been found by now
+            log_file.info(f">> Finished pulling Junior season stats for {name}...")
+            writer.complete(f"pick {draft_year} {overall_pick}")
+
+        # write the round's players, picks, and junior stats to the database
+        writer.flush()
 
 #!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
 
@@ -393,7 +747,7 @@ if __name__ == '__main__':
 
     # setup and test logging
     log_dir = config['DEFAULT']['LOGDIR']
-    log_file = open_logs(log_dir)
+    log_file = open_logs(log_dir, 'juniors_data_pull', config)
     now = datetime.now().strftime("%d%b%Y %H:%M:%S")
     try:
         log_file.info(f"Starting Juniors Data Pull at {now}...")
@@ -423,281 +777,90 @@ if __name__ == '__main__':
     db_host = config['DATABASE']['CONNECTION']
     db_name = config['DATABASE']['DB_NAME']
     db_port = config['DATABASE']['PORT']
+    db_batch_size = config.getint('DATABASE', 'BATCH_SIZE', fallback=500)
+    db_commit = commit_policy(config)
+
+    # setup fetch engine used to request data from the NHL API
+    setup_session(config)
 
     # open database connection using config file settings
     db_connect = database_connect()
 
-    # pull data from {nhl_draft}/{draft_year}
-    log_file.info(f"Getting junior hockey data for prospects selected in "
-        f"{draft_year} NHL Entry Draft..."
-    )
-    draft_data = request_data(f"{nhl_draft}/{draft_year}")
-    
-    # remove copyright info
-    for key in draft_data.keys():
-        if key == 'drafts':
-            draft_data = draft_data[key][0]
-
-    # cycle through each round of the draft
-    draft_rounds = draft_data['rounds']
-    for rnd in draft_rounds:
-        # cycle through each pick of the round
-        for pick in rnd['picks']:
-            # select data points we need
-            rnd = pick.get('round', 'NULL')
-            rnd_pick = pick.get('pickInRound', 'NULL')
-            overall_pick = pick.get('pickOverall', 'NULL')
-            name = pick.get('prospect').get('fullName', 'NULL')
-            link = pick.get('prospect').get('link', 'NULL')
-            team_id = pick.get('team').get('id', 'NULL')
-            team_name = pick.get('team').get('name', 'NULL')
-            prospect_id = pick.get('prospect').get('id', 'NULL')
-            
-            # reset nhl_player_id
-            nhl_player_id = 'NULL'
-
-            # get NHL Player ID to pull drafted player's info
-            log_file.info(f"> Getting NHL Player ID for {name}")
-            if prospect_id != 'NULL':
-                # check if prospect data has NHL Player ID
-                prospect_link = f"{nhl_site}/{link}"
-                prospect_data = request_data(prospect_link)
-                # remove copyright statement
-                for key in prospect_data.keys():
-                    if key == 'prospects':
-                        prospect_data = prospect_data[key][0]
-                nhl_player_id = prospect_data.get('nhlPlayerId', 'NULL')
-            else:
-                # search Google for player's ID from their NHL profile
-                nhl_player_id = get_player_id(name)
-                log_file.info(f">> Prospect ID was null for {name}...found "
-                    f"NHL Player ID on Google: {nhl_player_id}...")
-            
-            # track whether we need to skip a prospect because we can't find data
-            skip_prospect = False
-
-            # check whether we found NHL Player ID
-            if nhl_player_id == 'NULL':      
-                # couldn't find it, use previous draft pick to get current one's ID
-                log_file.info(f">> No prospect profile for {name}...generating "
-                    f"NHL Player ID using previous draft pick...")
-                # break variable for nested loops
-                breaking = False
-                for i in range(1, 4):
-                    if overall_pick == 1:
-                        # first pick in draft; skip
-                        log_file.warning(f">> First pick in draft and no "
-                            f"prospect profile found...skipping...")
-                        skip_prospect = True
-                        break
-                    select_previous_cmd = (
-                        f"SELECT nhl_player_id FROM nhl_draft "
-                        f"WHERE draft_year = $${draft_year}$$ AND "
-                        f"overall_pick = {overall_pick - i}"
-                    )
-                    previous_pick = sql_select(db_connect, select_previous_cmd, False)
-
-                    for j in range(1, i + 1):
-                        # essentially keep adding one to previous player id to find current one
-                        try:
-                            nhl_player_id = previous_pick[0] + j
-                        except:
-                            # couldn't find previous pick; move to next attempt
-                            log_file.info(
-                                f">> Failed to find previous pick on attempt "
-                                f"{j}...continuing with search...")
-                            skip_prospect = True
-                            continue
-
-                        # check that name from NHL Player Profile matches draft pick we're looking at
-                        player_link = f"{nhl_players}/{nhl_player_id}"
-                        player_data = request_data(player_link)
-
-                        # remove copyright
-                        for key in player_data.keys():
-                            if key == 'people':
-                                player_data = player_data[key][0]
-                        
-                        # compare to name variable from draft data
-                        full_name = player_data.get('fullName', 'NULL NULL')
-                        full_name = full_name.split()
-                        temp_name = name.split()
-                        # some draft pick's names aren't capitalized to match their NHL profile
-                        # and some draft pick's first names are their written in their native language
-                        if full_name[1].upper() == temp_name[1].upper():
-                            # last name's match, check first names
-                            if full_name[0].upper() == temp_name[0].upper():
-                                # found correct nhl_player_id; break from both loops
-                                skip_prospect = False
-                                breaking = True
-                                break
-                            elif full_name[0][0] == temp_name[0][0]:
-                                # warn that first names don't match, but first letters do just
-                                # in case it's the wrong player
-                                log_file.warning(
-                                    f"WARNING: {name}'s first name doesn't "
-                                    f"match NHL Profile for {nhl_player_id} "
-                                    f"but first letter and last name's do..."
-                                )
-                                skip_prospect = False
-                                breaking = True
-                                break
-                            else:
-                                # same last name, but not same person
-                                skip_prospect = True
-                        else:
-                            # didn't find correct id; reset nhl_player_id
-                            skip_prospect = True
-
-                    # check whether to break from outer loop
-                    if breaking:
-                        break
-            
-            if skip_prospect:
-                # couldn't find nhl_player_id that matches draft pick; log error and skip to next pick
-                log_file.warning(f"WARNING: COULDN'T FIND A CORRESPONDING "
-                    f"PLAYER ID FOR {name}...MOVING TO NEXT PICK")
-                continue
-            
-            # get NHL Player profile data
-            player_link = f"{nhl_players}/{nhl_player_id}"
-            player_data = request_data(player_link)
-            # remove copyright
-            for key in player_data.keys():
-                if key == 'people':
-                    player_data = player_data[key][0]
-
-            # set data points using player data
-            first_name = player_data.get('firstName', 'NULL')
-            last_name = player_data.get('lastName', 'NULL')
-            dob = player_data.get('birthDate', 'NULL')
-            country = player_data.get('birthCountry', 'NULL')
-            shoots = player_data.get('shootsCatches', 'NULL')
-            try:
-                position = player_data.get('primaryPosition').get('name', 'NULL')
-            except:
-                position = 'NULL'
-
-            # check if there's a corresponding NHL player profile in our database
-            check = _nhl_player_check(nhl_player_id)
-            if check == 1:
-                # no record found, create one. Must be done b/c of foreign key references
-                _nhl_player_create(nhl_player_id)
-
-            # insert draft data into nhl_draft table of database
-            draft_cmd = (
-                f"INSERT INTO nhl_draft (nhl_player_id, draft_year, "
-                f"overall_pick, round_number, round_pick, team_id, "
-                f"prospect_id, first_name, last_name, dob, country, shoots, "
-                f"position) VALUES ({nhl_player_id}, $${draft_year}$$, "
-                f"{overall_pick}, {rnd}, {rnd_pick}, {team_id}, {prospect_id}, "
-                f"$${first_name}$$, $${last_name}$$, "
-                f"to_date($${dob}$$, 'YYYY-MM-DD'), $${country}$$, "
-                f"$${shoots}$$, $${position}$$)"
-            )
-            draft_status = sql_insert(db_connect, draft_cmd)
-            if draft_status == 0:
-                log_file.info(f"> Draft data stored for {draft_year} Round "
-                    f"{rnd} Pick {rnd_pick} - {first_name} {last_name}...")
-        
-            # pdb.set_trace()
-            
-            log_file.info(f">> Pulling Junior hockey seasons for {name}...")
-
-            # pull Junior season data for player
-            junior_link = f"{nhl_players}/{nhl_player_id}/{stats_byYear}"
-            season_data = request_data(junior_link)
-
-            # remove copyright and parse down to just the season by season data
-            for key in season_data.keys():
-                if key == 'stats':
-                    season_data = season_data[key][0]['splits']
-            
-            # cycle through player's seasons to parse out Junior hockey
-            for season in season_data:
-                # check if that season's stats are from a Junior league
-                league = season.get('league').get('name', 'NULL')
-                if league in junior_leagues and position != 'Goalie':
-                    # get junior skater numbers for this season
-                    year = season.get('season', 'NULL')
-                    sequence = season.get('sequenceNumber', 'NULL')
-                    games = season.get('stat').get('games', 'NULL')
-                    goals = season.get('stat').get('goals', 'NULL')
-                    assists = season.get('stat').get('assists', 'NULL')
-                    points = season.get('stat').get('points', 'NULL')
-                    pp_goals = season.get('stat').get('powerPlayGoals', 'NULL')
-                    gw_goals = season.get('stat').get('gameWinningGoals', 'NULL')
-                    sh_goals = season.get('stat').get('shortHandedGoals', 'NULL')
-                    faceoff_pct = season.get('stat').get('faceOffPct', 'NULL')
-                    time_on_ice = season.get('stat').get('timeOnIce', 'NULL')
-                    pp_toi = season.get('stat').get('powerPlayTimeOnIce', 'NULL')
-                    sh_toi = season.get('stat').get('shortHandedTimeOnIce', 'NULL')
-                    even_toi = season.get('stat').get('evenTimeOnIce', 'NULL')
-                    plus_minus = season.get('stat').get('plusMinus', 'NULL')
-                    pim = season.get('stat').get('pim', 'NULL')
-
-                    # make sure sequence number isn't already being used this season
-                    sequence = _sequence_check(nhl_player_id, year, sequence)
-
-                    # generate SQL insert command for junior skater stats
-                    stats_cmd = (
-                        f"INSERT INTO junior_skater_stats (player_id, season, "
-                        f"league, games, goals, assists, points, pp_goals, "
-                        f"gw_goals, sh_goals, faceoff_pct, time_on_ice, "
-                        f"pp_toi, sh_toi, even_toi, plus_minus, pim, sequence) "
-                        f"VALUES ({nhl_player_id}, $${year}$$, $${league}$$, "
-                        f"{games}, {goals}, {assists}, {points}, {pp_goals}, "
-                        f"{gw_goals}, {sh_goals}, {faceoff_pct}, "
-                        f"$${time_on_ice}$$, $${pp_toi}$$, $${sh_toi}$$, "
-                        f"$${even_toi}$$, {plus_minus}, {pim}, {sequence})"
-                    )
-                elif league in junior_leagues and position == 'Goalie':
-                    # get Junior goalie stats for the season
-                    year = season.get('season', 'NULL')
-                    sequence = season.get('sequenceNumber', 'NULL')
-                    games = season.get('stat').get('games', 'NULL')
-                    wins = season.get('stat').get('wins', 'NULL')
-                    losses = season.get('stat').get('losses', 'NULL')
-                    ties = season.get('stat').get('ties', 'NULL')
-                    ot_wins = season.get('stat').get('ot', 'NULL')
-                    shutouts = season.get('stat').get('shutouts', 'NULL')
-                    goals_against = season.get('stat').get('goalsAgainst', 'NULL')
-                    gaa = season.get('stat').get('goalAgainstAverage', 'NULL')
-                    shots_against = season.get('stat').get('shotsAgainst', 'NULL')
-                    saves = season.get('stat').get('saves', 'NULL')
-                    save_pct = season.get('stat').get('savePercentage', 'NULL')
-
-                    # make sure sequence number isn't already being used this season
-                    sequence = _sequence_check(nhl_player_id, year, sequence)
-
-                    # generate SQL insert command for goalie junior stats
-                    stats_cmd = (
-                        f"INSERT INTO junior_goalie_stats (player_id, season, "
-                        f"league, games, wins, losses, ties, ot_wins, shutouts, "
-                        f"goals_against, gaa, shots_against, saves, save_pct, "
-                        f"sequence) VALUES ({nhl_player_id}, $${year}$$, "
-                        f"$${league}$$, {games}, {wins}, {losses}, {ties}, "
-                        f"{ot_wins}, {shutouts}, {goals_against}, {gaa}, "
-                        f"{shots_against}, {saves}, {save_pct}, {sequence})"
-                    )
-                else:
-                    # league either isn't a Junior league or isn't one we're looking at
-                    log_file.info(f">> Skipping {name}'s {season['season']} "
-                        f"season in the {league}...")
-                    # move on to next listed season
-                    continue
-
-                # insert Junior hockey data into junior_stats table
-                stats_status = sql_insert(db_connect, stats_cmd)
-                if stats_status == 0:
-                    log_file.info(f">> Added Junior season stats for {name}'s "
-                        f"{year} season in the {league}...")
-
-            # all Junior seasons should have been found by now
-            log_file.info(f">> Finished pulling Junior season stats for {name}...")
-
-    # close database connection
+    # bring the database's schema up to date before anything relies on it
+    if migrate(db_connect, log_file.info) != 0:
+        sys.exit('Failed to migrate the database...exiting')
+
+    # only bulk load tables with COPY if they're still empty
+    load_tables = set()
+    if args.initial_load:
+        load_tables = empty_tables(db_connect, LOAD_TABLES)
+        if load_tables:
+            log_file.info(f"Loading empty tables with COPY: "
+                f"{', '.join(sorted(load_tables))}...")
+            indexes = drop_indexes(db_connect, load_tables)
+        else:
+            log_file.warning('Tables already contain data...ignoring '
+                '--initial-load and upserting records...')
+
+    # pull a range of drafts if backfilling
+    drafts = [draft_year]
+    if args.drafts:
+        drafts = args.drafts
+        log_file.info(f"Backfilling {len(drafts)} drafts: {drafts[0]} to "
+            f"{drafts[-1]}...")
+
+    # track each draft pick in the work queue so an interrupted run resumes
+    # where it stopped
+    queue = open_queue(config, 'juniors_data_pull', {
+        'drafts': drafts, 'leagues': junior_leagues,
+    })
+    if args.restart:
+        queue.reset()
+
+    # index of player names to NHL Player IDs, checked before searching
+    # Google or probing the API for a pick without a prospect profile
+    player_index = open_player_index(config)
+    player_index.load_players(sql_select(db_connect, 'select_player_names',
+        fetchall=True) or [])
+    player_index.load_draft(sql_select(db_connect, 'select_draft_names',
+        fetchall=True) or [])
+    player_index.load_profiles(cached_responses(f"{nhl_players}/%"))
+    log_file.info(f"Loaded {len(player_index.names)} player names into the "
+        f"player index...")
+
+    # queue up rows to be written a round at a time; tables are registered in
+    # order of their foreign key references
+    writer = BulkWriter(db_connect, db_batch_size, load_tables, queue,
+        db_commit)
+    writer.register('nhl_players')
+    writer.register('nhl_draft')
+    writer.register('junior_skater_stats')
+    writer.register('junior_goalie_stats')
+
+    # pull data from {nhl_draft}/{draft_year}; the next drafts are requested
+    # while the current one is being parsed
+    draft_links = [f"{nhl_draft}/{year}" for year in drafts]
+    with phase('draft'):
+        for year, draft_data in zip(drafts, request_iter(draft_links)):
+            _draft(year, draft_data)
+
+        writer.close()
+
+    # run finished; a rerun with the same settings starts over
+    queue.finish()
+    queue.close()
+    player_index.close()
+
+    # rebuild any indexes dropped for the initial load
+    if load_tables:
+        create_indexes(db_connect, indexes)
+
+    # close database connection and fetch engine
     db_connect.close()
+    close_session()
+
+    # write out timings and counters for each phase of the run
+    write_summary(config, 'juniors_data_pull')
 
     # use all North American players drafted for that year to reproduce the Projectinator and rank their NHL performance projection
         # North American Leagues to include in analysis:
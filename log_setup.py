@@ -0,0 +1,138 @@
+'''
+
+Description: Queue-based logging for the NHL data pull programs.
+
+Log records are handed off to a queue and written to the log file by a
+background listener thread, so the fetch/write loop never waits on disk I/O.
+The log level, sampling of per-row messages, size-based rotation, and the
+format of the log file (plain text or JSON lines) are read in from the
+[LOGGING] section of the configuration file.
+
+Per-row messages are the detail lines the programs prefix with '>' (i.e.
+"> Draft data queued for...", ">> Wrote 25 rows to...") and the per-request
+lines from the fetch engine. With sampling on, only one in every SAMPLE_EVERY
+of them is kept; warnings and errors are always kept.
+'''
+
+__version__ = '1.0'
+__title__ = 'log_setup'
+
+import os
+import json
+import queue
+import atexit
+import logging
+import logging.handlers
+
+from datetime import datetime
+
+# loggers whose messages below WARNING are all per-request/per-row detail
+SAMPLED_LOGGERS = ('nhl_api', 'fixtures')
+
+class SampleFilter(logging.Filter):
+    '''
+    Keep one in every n per-row messages; every other message is kept.
+    '''
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = every
+        self.seen = 0
+
+    def filter(self, record):
+        if self.every <= 1 or record.levelno >= logging.WARNING:
+            return True
+        per_row = record.name in SAMPLED_LOGGERS or (
+            isinstance(record.msg, str) and record.msg.startswith('>')
+        )
+        if not per_row:
+            return True
+        # records are filtered in whichever thread logs them; a lost
+        # increment only shifts which message is sampled, so no lock
+        self.seen += 1
+        return self.seen % self.every == 1
+
+class JsonFormatter(logging.Formatter):
+    '''
+    Format each record as a single line JSON object.
+    '''
+
+    def format(self, record):
+        line = {
+            'time': datetime.fromtimestamp(record.created).isoformat(
+                timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            line['exception'] = self.formatException(record.exc_info)
+        return json.dumps(line)
+
+def open_logs(logs, program, config):
+    '''
+    Create a log file in the logs directory and start the queue listener that
+    writes to it. Returns the root logger.
+
+    logs    -> directory the log file is created in
+    program -> name of the program, used in the log file's name
+    config  -> configuration file with the [LOGGING] settings:
+        LEVEL         -> lowest level logged (DEBUG, INFO, WARNING, ERROR)
+        FORMAT        -> TEXT or JSON (one JSON object per line)
+        SAMPLE_EVERY  -> keep one in every n per-row messages; 1 keeps all
+        MAX_MB        -> rotate the log file once it's this big; 0 never
+                         rotates
+        BACKUPS       -> number of rotated log files to keep
+    '''
+
+    # create the directory if it doesn't exist
+    if not os.path.isdir(logs):
+        try:
+            os.makedirs(logs)
+        except:
+            # couldn't create dir; default to {HOME}/logs
+            home_dir = os.path.expanduser('~')
+            logs = f"{home_dir}/logs"
+            if not os.path.isdir(logs):
+                os.makedirs(logs)
+
+    # create log filename with timestamp
+    now = datetime.now()
+    date_format = now.strftime("%d%b%y_%H%M%S")
+    extension = 'log'
+    log_format = config.get('LOGGING', 'FORMAT', fallback='TEXT').upper()
+    if log_format == 'JSON':
+        extension = 'jsonl'
+    log_path = f"{logs}/{program}_{date_format}.{extension}"
+
+    max_bytes = int(config.getfloat('LOGGING', 'MAX_MB', fallback=0)
+        * 1024 * 1024)
+    if max_bytes > 0:
+        handler = logging.handlers.RotatingFileHandler(log_path, mode='w',
+            maxBytes=max_bytes,
+            backupCount=config.getint('LOGGING', 'BACKUPS', fallback=5))
+    else:
+        handler = logging.FileHandler(log_path, mode='w')
+    if log_format == 'JSON':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('[%(asctime)s] %(message)s'))
+
+    # loggers only put records on the queue; the listener thread formats
+    # and writes them
+    records = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(records)
+    queue_handler.addFilter(SampleFilter(
+        config.getint('LOGGING', 'SAMPLE_EVERY', fallback=1)))
+    listener = logging.handlers.QueueListener(records, handler)
+    listener.start()
+    # flush whatever's left in the queue on the way out, even on sys.exit()
+    atexit.register(listener.stop)
+
+    logger = logging.getLogger()
+    logger.addHandler(queue_handler)
+    level = config.get('LOGGING', 'LEVEL', fallback='INFO').upper()
+    logger.setLevel(getattr(logging, level, logging.INFO))
+
+    return logger
@@ -0,0 +1,229 @@
+'''
+
+Description: Per-phase timing and counters for the NHL data pull programs.
+
+Each program splits its run into phases (i.e. teams, players, skater stats)
+and times them with phase(). While a phase is running, the fetch engine,
+response cache, rate limiter, and database helpers count the work they do
+against it: requests sent to the API, cache hits/misses, retries, rows
+written, and round trips to the database. Alongside the phase counters:
+    - every API request's latency is added to a histogram for its endpoint
+    - every database statement's latency is added to a total for its name
+
+Everything is written out at the end of the run as a JSON summary, and
+optionally as a Prometheus textfile (for node_exporter's textfile collector).
+The benchmark suite (benchmark.py) reads its results from the JSON summary.
+
+Both files are setup from the [METRICS] section of the configuration file.
+'''
+
+__version__ = '1.0'
+__title__ = 'metrics'
+
+import os
+import json
+import time
+import logging
+import threading
+
+from contextlib import contextmanager
+
+log_file = logging.getLogger(__name__)
+
+# counters kept for every phase
+COUNTERS = ('requests', 'rows', 'db_round_trips', 'cache_hits',
+    'cache_misses', 'cache_revalidated', 'retries', 'throttled_waits',
+    'breaker_trips')
+
+# upper bounds (seconds) of the request latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+    float('inf'))
+
+# work done outside of any phase (i.e. setup) is counted against this one
+SETUP = 'setup'
+
+phases = {}
+histograms = {}
+statements = {}
+current = SETUP
+lock = threading.Lock()
+
+def _phase_totals(name):
+    '''
+    Return the totals for a phase, adding it if it hasn't been seen yet. Must
+    be called while holding the lock.
+    '''
+
+    if name not in phases:
+        phases[name] = dict({'seconds': 0.0}, **{c: 0 for c in COUNTERS})
+    return phases[name]
+
+@contextmanager
+def phase(name):
+    '''
+    Time a phase of the run; work counted while it's running is added to it.
+    Phases can be nested (i.e. junior seasons within the draft); the inner
+    phase takes the counts until it's done, and its time is included in the
+    outer phase's time.
+    '''
+
+    global current
+
+    with lock:
+        _phase_totals(name)
+        previous, current = current, name
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with lock:
+            phases[name]['seconds'] += elapsed
+            current = previous
+
+def count(counter, n=1):
+    '''
+    Add to one of the current phase's counters. Safe to call from any of the
+    fetch engine's worker threads.
+    '''
+
+    with lock:
+        _phase_totals(current)[counter] += n
+
+def observe(endpoint, seconds):
+    '''
+    Add a request's latency to the histogram for its API endpoint.
+    '''
+
+    with lock:
+        if endpoint not in histograms:
+            histograms[endpoint] = {'buckets': [0] * len(BUCKETS),
+                'count': 0, 'sum': 0.0}
+        histogram = histograms[endpoint]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram['buckets'][i] += 1
+                break
+        histogram['count'] += 1
+        histogram['sum'] += seconds
+
+def statement(name, seconds):
+    '''
+    Add a database statement's latency to the totals for its name (the name
+    in statements.STATEMENTS, or i.e. 'upsert nhl_players' for bulk writes).
+    '''
+
+    with lock:
+        totals = statements.setdefault(name, {'count': 0, 'seconds': 0.0})
+        totals['count'] += 1
+        totals['seconds'] += seconds
+
+@contextmanager
+def timed(name):
+    '''
+    Time a database statement and add it to the statement totals.
+    '''
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        statement(name, time.perf_counter() - start)
+
+def summary():
+    '''
+    Return the totals for every phase (along with the rates derived from
+    them), the request latency histograms, and the statement totals as a dict.
+    '''
+
+    with lock:
+        totals = {name: dict(values) for name, values in phases.items()}
+        latencies = {}
+        for endpoint, histogram in histograms.items():
+            # cumulative counts per upper bound, as Prometheus expects
+            cumulative, running = {}, 0
+            for bound, n in zip(BUCKETS, histogram['buckets']):
+                running += n
+                cumulative['+Inf' if bound == float('inf') else bound] = \
+                    running
+            latencies[endpoint] = {'buckets': cumulative,
+                'count': histogram['count'], 'sum': histogram['sum']}
+        db = {name: dict(values) for name, values in statements.items()}
+
+    for values in totals.values():
+        seconds = values['seconds']
+        values['requests_per_sec'] = \
+            values['requests'] / seconds if seconds else 0
+        values['rows_per_sec'] = values['rows'] / seconds if seconds else 0
+    return {'phases': totals, 'request_latency': latencies,
+        'db_statements': db}
+
+def _prometheus(program, totals):
+    '''
+    Format the summary in the Prometheus text exposition format.
+    '''
+
+    lines = []
+    label = f'program="{program}"'
+
+    lines.append('# TYPE nhl_pull_phase_seconds gauge')
+    for name, values in totals['phases'].items():
+        lines.append(f'nhl_pull_phase_seconds{{{label},phase="{name}"}} '
+            f"{values['seconds']}")
+    for counter in COUNTERS:
+        lines.append(f"# TYPE nhl_pull_{counter}_total counter")
+        for name, values in totals['phases'].items():
+            lines.append(f'nhl_pull_{counter}_total{{{label},'
+                f'phase="{name}"}} {values[counter]}')
+
+    lines.append('# TYPE nhl_pull_request_seconds histogram')
+    for endpoint, histogram in totals['request_latency'].items():
+        labels = f'{label},endpoint="{endpoint}"'
+        for bound, n in histogram['buckets'].items():
+            lines.append(f'nhl_pull_request_seconds_bucket{{{labels},'
+                f'le="{bound}"}} {n}')
+        lines.append(f"nhl_pull_request_seconds_sum{{{labels}}} "
+            f"{histogram['sum']}")
+        lines.append(f"nhl_pull_request_seconds_count{{{labels}}} "
+            f"{histogram['count']}")
+
+    lines.append('# TYPE nhl_pull_db_statement_seconds summary')
+    for name, values in totals['db_statements'].items():
+        labels = f'{label},statement="{name}"'
+        lines.append(f"nhl_pull_db_statement_seconds_sum{{{labels}}} "
+            f"{values['seconds']}")
+        lines.append(f"nhl_pull_db_statement_seconds_count{{{labels}}} "
+            f"{values['count']}")
+
+    return '\n'.join(lines) + '\n'
+
+def write_summary(config, program):
+    '''
+    Log each phase's totals, then write the summary to the files set in the
+    [METRICS] section of the configuration file:
+        SUMMARY_PATH    -> JSON file for the full summary
+        PROMETHEUS_PATH -> Prometheus textfile (i.e. in node_exporter's
+                           textfile collector directory)
+    Either can be left blank to skip it.
+    '''
+
+    totals = summary()
+    for name, values in totals['phases'].items():
+        log_file.info(f"Phase {name}: {values['seconds']:.2f}s, "
+            f"{values['requests']} requests, {values['rows']} rows, "
+            f"{values['db_round_trips']} database round trips...")
+
+    path = config.get('METRICS', 'SUMMARY_PATH', fallback=None)
+    if path:
+        with open(path, 'w') as f:
+            json.dump(totals, f, indent=2)
+        log_file.info(f"Wrote run metrics to {path}...")
+
+    path = config.get('METRICS', 'PROMETHEUS_PATH', fallback=None)
+    if path:
+        # write to a temp file first so the collector never reads half of it
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open(temp, 'w') as f:
+            f.write(_prometheus(program, totals))
+        os.replace(temp, path)
+        log_file.info(f"Wrote Prometheus metrics to {path}...")
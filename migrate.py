@@ -0,0 +1,224 @@
+'''
+
+Description: Versioned schema migrations and query plan check for the NHL data
+pull database.
+
+Migrations are the numbered SQL files in config/migrations, applied in order.
+Each one runs in its own transaction and is recorded in the
+schema_migrations table, so running this again only applies the migrations a
+database hasn't had yet. Every migration is written to be safe on a database
+created from the current config/create_table.sql, which already has their
+changes. The data pull programs apply any pending migrations when they start,
+so the statements they run never depend on a schema change a database hasn't
+had.
+
+With --check, the statements the programs run (see statements.py) are
+EXPLAINed and any sequential scan that an index could have avoided is flagged.
+Sequential scans are turned off for the check, so a tiny table (where the
+planner would rightly prefer one) still shows whether there's an index to
+use. The check exits with status 1 if it finds any scans to flag.
+
+Database credentials are read in from the [DATABASE] section of the
+configuration file passed on the command line.
+'''
+
+__version__ = '1.0'
+__title__ = 'migrate'
+__author__ = 'Paul Hegedus'
+
+import os
+import re
+import sys
+import json
+import argparse
+import psycopg2
+
+from configparser import ConfigParser
+from statements import STATEMENTS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MIGRATIONS_DIR = f"{BASE_DIR}/config/migrations"
+
+# sample parameters used to EXPLAIN each statement that takes any
+EXPLAIN_PARAMS = {
+    'select_teams_by_id': ([1, 2],),
+    'select_skaters_incremental': ('20192020',),
+    'select_goalies_incremental': ('20192020',),
+    'select_sync_state': ([8471214, 8471215],),
+    'select_player_ids': ([8471214, 8471215],),
+    'select_draft_picks': ('2015', [1, 2]),
+    'select_junior_sequences': ([8471214, 8471215], [8471214, 8471215]),
+}
+
+# statements that read a whole table by design; scanning it is expected
+FULL_READS = {
+    'select_teams': ('nhl_teams',),
+    'select_team_ids': ('nhl_teams',),
+    'select_skaters': ('nhl_team_players',),
+    'select_goalies': ('nhl_team_players',),
+    'select_skaters_incremental': ('nhl_team_players', 'nhl_sync_state'),
+    'select_goalies_incremental': ('nhl_team_players', 'nhl_sync_state'),
+    'select_player_names': ('nhl_players',),
+    'select_draft_names': ('nhl_draft',),
+}
+
+def argsetup():
+    '''
+    Setup command line argument parser for the config file and options.
+    '''
+
+    parser = argparse.ArgumentParser(description =
+                'Apply schema migrations to the NHL data pull database.')
+    parser.add_argument('configf',
+                help='config file with the [DATABASE] settings')
+    parser.add_argument('--check', action='store_true',
+                help='EXPLAIN the programs\' statements and flag sequential '
+                'scans instead of migrating')
+    parser.add_argument('--list', action='store_true',
+                help='list the migrations and whether each is applied')
+    a = parser.parse_args()
+    return a
+
+def migrations():
+    '''
+    Return (version, name, path) for each migration file, in order.
+    '''
+
+    found = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = re.match(r'(\d+)_(\w+)\.sql$', filename)
+        if match:
+            found.append((int(match.group(1)), match.group(2),
+                f"{MIGRATIONS_DIR}/{filename}"))
+    return found
+
+def applied_versions(conn):
+    '''
+    Return the set of migration versions already applied to the database,
+    creating the schema_migrations table if it doesn't exist yet.
+    '''
+
+    cursor = conn.cursor()
+    cursor.execute(
+        'CREATE TABLE IF NOT EXISTS schema_migrations ('
+        'version int PRIMARY KEY, name varchar, applied_at timestamp '
+        'DEFAULT now())'
+    )
+    cursor.execute('SELECT version FROM schema_migrations')
+    versions = {version for version, in cursor.fetchall()}
+    conn.commit()
+    cursor.close()
+    return versions
+
+def migrate(conn, report=print):
+    '''
+    Apply every migration the database hasn't had yet, each in its own
+    transaction. Stops at the first one that fails. Returns 0 if the
+    database is up to date, and 1 if a migration failed.
+
+    conn   -> preexisting database connection
+    report -> function progress messages are passed to, i.e. a log's info()
+    '''
+
+    applied = applied_versions(conn)
+    pending = [m for m in migrations() if m[0] not in applied]
+    if not pending:
+        report('Database is up to date')
+        return 0
+
+    cursor = conn.cursor()
+    for version, name, path in pending:
+        report(f"Applying migration {version:04d} {name}...")
+        with open(path) as f:
+            sql = f.read()
+        try:
+            cursor.execute(sql)
+            cursor.execute(
+                'INSERT INTO schema_migrations (version, name) VALUES (%s, %s)',
+                (version, name)
+            )
+            conn.commit()
+        except psycopg2.DatabaseError as e:
+            conn.rollback()
+            report(f"Migration {version:04d} {name} failed: {e}")
+            cursor.close()
+            return 1
+    cursor.close()
+    return 0
+
+def _seq_scans(plan):
+    '''
+    Yield the name of the table read by each sequential scan in an EXPLAIN
+    (FORMAT JSON) plan tree.
+    '''
+
+    if plan.get('Node Type') == 'Seq Scan':
+        yield plan.get('Relation Name')
+    for child in plan.get('Plans', []):
+        yield from _seq_scans(child)
+
+def check(conn):
+    '''
+    EXPLAIN every statement in the registry and print the sequential scans
+    that weren't expected. Returns the number of statements flagged.
+    '''
+
+    cursor = conn.cursor()
+    # make the planner use an index wherever there's one that fits
+    cursor.execute('SET enable_seqscan = off')
+    flagged = 0
+    for name, (cmd, _) in STATEMENTS.items():
+        params = EXPLAIN_PARAMS.get(name)
+        try:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {cmd}", params)
+        except psycopg2.DatabaseError as e:
+            conn.rollback()
+            cursor.execute('SET enable_seqscan = off')
+            print(f"{name}: couldn't EXPLAIN: {e}")
+            flagged += 1
+            continue
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        scans = [table for table in _seq_scans(plan[0]['Plan'])
+            if table not in FULL_READS.get(name, ())]
+        if scans:
+            flagged += 1
+            print(f"{name}: sequential scan on {', '.join(scans)}")
+        else:
+            print(f"{name}: ok")
+    conn.rollback()
+    cursor.close()
+    return flagged
+
+if __name__ == '__main__':
+    args = argsetup()
+
+    config = ConfigParser()
+    config.read(args.configf)
+    try:
+        conn = psycopg2.connect(
+            user = config['DATABASE']['USER'],
+            password = config['DATABASE']['PASSWORD'],
+            host = config['DATABASE']['CONNECTION'],
+            database = config['DATABASE']['DB_NAME'],
+            port = config['DATABASE']['PORT'],
+        )
+    except psycopg2.DatabaseError as e:
+        sys.exit(f"Couldn't connect to the database: {e}")
+
+    if args.list:
+        applied = applied_versions(conn)
+        for version, name, _ in migrations():
+            state = 'applied' if version in applied else 'pending'
+            print(f"{version:04d} {name}: {state}")
+        status = 0
+    elif args.check:
+        flagged = check(conn)
+        print(f"{flagged} statements flagged")
+        status = 1 if flagged else 0
+    else:
+        status = migrate(conn)
+
+    conn.close()
+    sys.exit(status)
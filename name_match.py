@@ -0,0 +1,216 @@
+'''
+
+Description: Fuzzy matching of draft picks' names to NHL Player Profiles.
+
+A draft pick's name doesn't always match the name on their NHL Player Profile:
+accents are dropped or kept, surnames have more than one part (i.e. "van
+Riemsdyk", "Ekman-Larsson"), and first names are transliterated differently
+(i.e. "Aleksandr" and "Alexander") or shortened. Names are compared on their
+normalized tokens, a phonetic key, and edit distance, and each comparison is
+given a confidence between 0 and 1. When both dates of birth are known they
+break ties, and rule out a match outright if they differ.
+
+A NameIndex holds a pool of candidate names, bucketed by the phonetic key of
+their surname, so finding the best candidates for a name only compares it to
+the names that sound alike.
+'''
+
+__version__ = '1.0'
+__title__ = 'name_match'
+
+import re
+import unicodedata
+
+# confidence a match needs to be accepted, and to be accepted without a
+# warning that it could be the wrong player
+REVIEW = 0.7
+MATCH = 0.85
+
+# weight of the surname in a match's confidence; the rest is the first name
+SURNAME_WEIGHT = 0.6
+
+# Soundex codes for each consonant; vowels, h, w, and y aren't coded
+SOUNDEX = {
+    **dict.fromkeys('bfpv', '1'), **dict.fromkeys('cgjkqsxz', '2'),
+    **dict.fromkeys('dt', '3'), 'l': '4', **dict.fromkeys('mn', '5'),
+    'r': '6',
+}
+
+def normalize_name(name):
+    '''
+    Return a name folded down to the form names are compared in: accents
+    removed, lower case, and punctuation (periods, hyphens, apostrophes)
+    turned into single spaces. i.e. "Jean-Sébastien Giguère" ->
+    "jean sebastien giguere".
+    '''
+
+    if not name:
+        return ''
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    return ' '.join(re.sub(r"[^a-z0-9]+", ' ', name.lower()).split())
+
+def tokens(name):
+    '''
+    Split a name into its first name and surname tokens. Everything after
+    the first token is taken as the surname, so multi-part surnames are
+    compared whole.
+    '''
+
+    parts = normalize_name(name).split()
+    if not parts:
+        return '', ()
+    return parts[0], tuple(parts[1:])
+
+def phonetic(word):
+    '''
+    Return the Soundex key of a word, i.e. "aleksandr" and "alexander" are
+    both "a425".
+    '''
+
+    if not word:
+        return ''
+    key = word[0]
+    last = SOUNDEX.get(word[0], '')
+    for c in word[1:]:
+        code = SOUNDEX.get(c, '')
+        if code and code != last:
+            key += code
+        # h and w don't separate letters with the same code; vowels do
+        if c not in 'hw':
+            last = code
+    return (key + '000')[:4]
+
+def distance(a, b):
+    '''
+    Return the Levenshtein (edit) distance between two strings.
+    '''
+
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+def similarity(a, b):
+    '''
+    Return how alike two normalized words are, from 0 to 1: 1 if they're the
+    same, otherwise by edit distance relative to their length, and at least
+    0.85 if they sound alike.
+    '''
+
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    score = 1 - distance(a, b) / max(len(a), len(b))
+    if phonetic(a) == phonetic(b):
+        score = max(score, 0.85)
+    return score
+
+def _first_similarity(a, b):
+    '''
+    Return how alike two first names are. A shortened first name (i.e.
+    "alex" for "alexander") scores 0.8, and only sharing a first letter
+    scores 0.5.
+    '''
+
+    score = similarity(a, b)
+    if score < 0.8 and a and b and (a.startswith(b) or b.startswith(a)):
+        score = 0.8
+    if score < 0.5 and a and b and a[0] == b[0]:
+        score = 0.5
+    return score
+
+def _surname_similarity(a, b):
+    '''
+    Return how alike two surnames (tuples of tokens) are, comparing them
+    whole and by their last tokens, i.e. "ekman larsson" and "larsson".
+    '''
+
+    if not a or not b:
+        return 0.0
+    whole = similarity(''.join(a), ''.join(b))
+    last = similarity(a[-1], b[-1])
+    # matching on just the last part of a multi-part surname counts for less
+    return max(whole, last * 0.9 if len(a) != len(b) else last)
+
+def confidence(name, other, dob=None, other_dob=None):
+    '''
+    Return the confidence (0 to 1) that two names are the same player's. If
+    both dates of birth are known, a match on them raises the confidence
+    and a mismatch makes it 0.
+
+    name, other    -> the names compared, i.e. a draft pick's name and the
+                      name on an NHL Player Profile
+    dob, other_dob -> their dates of birth (YYYY-MM-DD), if known
+    '''
+
+    first, surname = tokens(name)
+    other_first, other_surname = tokens(other)
+    score = (SURNAME_WEIGHT * _surname_similarity(surname, other_surname)
+        + (1 - SURNAME_WEIGHT) * _first_similarity(first, other_first))
+    if dob and other_dob:
+        if str(dob)[:10] != str(other_dob)[:10]:
+            return 0.0
+        # same birthday; halve the doubt
+        score = 1 - (1 - score) / 2
+    return round(score, 3)
+
+class NameIndex:
+    '''
+    Precomputed index over a pool of candidate names, bucketed by the
+    phonetic key of their last surname token.
+    '''
+
+    def __init__(self):
+        # phonetic key -> {candidate: (name, dob)}
+        self.buckets = {}
+
+    def add(self, name, candidate, dob=None):
+        '''
+        Add a candidate (i.e. an NHL Player ID) to the index under a name.
+        '''
+
+        _, surname = tokens(name)
+        if not surname:
+            return
+        bucket = self.buckets.setdefault(phonetic(surname[-1]), {})
+        _, old_dob = bucket.get(candidate, (None, None))
+        bucket[candidate] = (name, dob or old_dob)
+
+    def search(self, name, dob=None, threshold=REVIEW):
+        '''
+        Return (candidate, confidence) for every candidate in the index whose
+        name matches with at least the threshold confidence, best first.
+        '''
+
+        _, surname = tokens(name)
+        if not surname:
+            return []
+        scores = {}
+        for candidate, (other, other_dob) in self.buckets.get(
+                phonetic(surname[-1]), {}).items():
+            score = confidence(name, other, dob, other_dob)
+            if score >= threshold and score > scores.get(candidate, 0):
+                scores[candidate] = score
+        return sorted(scores.items(), key=lambda match: -match[1])
+
+    def best(self, name, dob=None, threshold=MATCH):
+        '''
+        Return (candidate, confidence) for the one candidate that best matches
+        a name, or (None, confidence) if no candidate reaches the threshold or
+        more than one is tied for the best match.
+        '''
+
+        matches = self.search(name, dob, threshold)
+        if not matches:
+            return None, 0.0
+        if len(matches) > 1 and matches[1][1] == matches[0][1]:
+            return None, matches[0][1]
+        return matches[0]
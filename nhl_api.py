@@ -0,0 +1,354 @@
+'''
+
+Description: Shared fetch engine for requesting data from the NHL's API.
+
+Both nhl_data_pull.py and juniors_data_pull.py pull their data through this
+module. Every request goes through a single pooled requests session (so
+connections to the API are kept alive and reused), and lists of URLs can be
+handed off to a thread pool to be requested concurrently. The size of the
+thread pool is read in from the [FETCH] section of the configuration file.
+Responses are cached on disk if the [CACHE] section of the configuration file
+enables it, and every request waits its turn on the per-host rate limiter
+setup from the [RATE_LIMIT] section (see rate_limit). Responses can also be
+recorded to, or replayed from, a fixture archive for offline runs (see
+fixtures).
+'''
+
+__version__ = '1.0'
+__title__ = 'nhl_api'
+
+import sys
+import time
+import logging
+import requests
+
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from response_cache import open_cache, endpoint
+from rate_limit import Scheduler, retry_after, retryable
+from fixtures import open_fixtures, REPLAY
+from metrics import count, observe
+
+log_file = logging.getLogger(__name__)
+
+class FetchError(Exception):
+    '''
+    Raised when a URL's data can't be pulled (i.e. the API still fails after
+    every retry). Requests run in the thread pool raise it rather than
+    exiting, so the program exits on the main thread once the batch's
+    pending requests have been cancelled.
+    '''
+
+# fetch engine state; setup_session() replaces these with config settings
+session = None
+executor = None
+cache = None
+scheduler = None
+fixtures = None
+max_workers = 8
+batch_size = 100
+timeout = 10
+
+def setup_session(config):
+    '''
+    Create the pooled session and thread pool used to request data from the
+    NHL API.
+
+    Settings are read in from the [FETCH] section of the configuration file:
+        MAX_WORKERS -> max number of requests to have in flight at once
+        BATCH_SIZE  -> number of URLs requested together by request_iter()
+        TIMEOUT     -> seconds to wait on a response before retrying
+
+    The response cache is setup from the [CACHE] section (see response_cache)
+    the rate limits from the [RATE_LIMIT] section (see rate_limit), and the
+    record/replay store from the [FIXTURES] section (see fixtures).
+    '''
+
+    global session, executor, cache, scheduler, fixtures, max_workers
+    global batch_size, timeout
+
+    max_workers = config.getint('FETCH', 'MAX_WORKERS', fallback=max_workers)
+    batch_size = config.getint('FETCH', 'BATCH_SIZE', fallback=batch_size)
+    timeout = config.getfloat('FETCH', 'TIMEOUT', fallback=timeout)
+
+    # keep enough connections open that every worker can reuse its own
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_workers,
+                          pool_maxsize=max_workers)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    cache = open_cache(config)
+    scheduler = Scheduler(config)
+    fixtures = open_fixtures(config)
+    log_file.info(f"Fetch engine setup with {max_workers} workers...")
+
+def close_session():
+    '''
+    Shut down the thread pool, close any connections left open by the
+    session, and log the response cache's hit/miss counters, each host's
+    rate limit counters, and the fixture store's counters.
+    '''
+
+    global session, executor, cache, scheduler, fixtures
+
+    if executor:
+        executor.shutdown()
+        executor = None
+    if cache:
+        cache.close()
+        cache = None
+    if scheduler:
+        for line in scheduler.summary():
+            log_file.info(line)
+        scheduler = None
+    if fixtures:
+        fixtures.close()
+        fixtures = None
+    if session:
+        session.close()
+        session = None
+
+def request_data(url):
+    '''
+    Request data from specified URL pointing to a NHLStats API endpoint.
+
+    The requested dataset is a dict containing key-value pairs:
+        i.e.  {
+                'copyright': 'NHL and the NHL Shield are registered...',
+                'teams': [{team_data}, {team_data}, ... {team_data}]
+              }
+    This function returns the full dict, it does not separate out the actual
+    data found in the list of dicts that makes up the value from a key-value
+    pair after the copyright info.
+
+    Note: Requests that time out, are throttled (429), or fail on the API's
+    end (5xx) are retried with exponential backoff, up to the RETRIES setting
+    for the host. Exits if the API still can't be reached after that. Any
+    other error response (i.e. 404 for a player ID that doesn't exist) is
+    returned as is. Should only be called from the main thread; the thread
+    pool runs _fetch(), which raises FetchError instead of exiting.
+    If the response cache is enabled, fresh cached responses are returned
+    without a request and stale ones are revalidated with the API. If the
+    fixture store is replaying, nothing is requested at all.
+    '''
+
+    try:
+        return _fetch(url)
+    except FetchError:
+        sys.exit(1)
+
+def _fetch(url):
+    '''
+    Request data from a URL (see request_data()), raising FetchError if it
+    can't be pulled.
+    '''
+
+    if session is None:
+        # fetch engine wasn't setup from a config file; use defaults
+        _default_setup()
+
+    try:
+        return _replayable(url, lambda: _request(url))
+    except LookupError as e:
+        # URL was never recorded for replay
+        raise FetchError(str(e))
+
+def _request(url):
+    '''
+    Request data from a URL through the response cache and rate limiter; see
+    request_data(). Raises FetchError if the data can't be pulled.
+    '''
+
+    # check the cache before going out to the API
+    entry = None
+    headers = {}
+    if cache:
+        entry = cache.lookup(url)
+        if entry and entry['fresh']:
+            count('cache_hits')
+            log_file.info(f"Pulled cached data for {url}...")
+            return entry['data']
+        count('cache_misses')
+        headers = cache.validators(entry)
+
+    log_file.info(f"Requesting data from {url}...")
+    limiter = scheduler.host(url)
+    tries = limiter.retries + 1
+    for _ in range(tries):
+        # wait for our turn to send a request to the API
+        limiter.acquire()
+        count('requests')
+        start = time.perf_counter()
+        try:
+            r = session.get(url, timeout=timeout, headers=headers)
+        except (requests.exceptions.Timeout,
+                requests.exceptions.ConnectionError) as e:
+            # retry after backing off
+            delay = limiter.failure(_)
+            log_file.info(f"Connection to {url} failed on try {_ + 1} "
+                f"({type(e).__name__})...retrying in {delay:.1f}s")
+            if _ < tries - 1:
+                time.sleep(delay)
+            continue
+        except requests.exceptions.RequestException as e:
+            log_file.error(e)
+            raise FetchError(f"Failed to pull data from {url}: {e}")
+        observe(endpoint(url), time.perf_counter() - start)
+
+        if r.status_code == 304 and entry:
+            # cached data is still current
+            limiter.success()
+            count('cache_revalidated')
+            log_file.info(f"Revalidated cached data for {url}...")
+            cache.refresh(url, entry['data'])
+            return entry['data']
+        elif r.status_code == 200:
+            # successful request, return data
+            limiter.success()
+            log_file.info(f"Pulled data on {_ + 1} try from {url}...")
+            data = r.json()
+            if cache:
+                cache.store(url, data, r.headers.get('ETag'),
+                            r.headers.get('Last-Modified'))
+            return data
+        elif retryable(r.status_code):
+            # throttled or API error; back off (as long as the API asks us
+            # to, if it says) before retrying
+            delay = limiter.failure(_, retry_after(r.headers))
+            log_file.info(f"Got {r.status_code} from {url} on try {_ + 1}..."
+                f"retrying in {delay:.1f}s")
+            if _ < tries - 1:
+                time.sleep(delay)
+        else:
+            # request itself is bad; retrying won't help, so return the
+            # error data if any
+            limiter.success()
+            log_file.info(f"Got {r.status_code} from {url}...")
+            try:
+                return r.json()
+            except ValueError:
+                return {}
+
+    log_file.error(f"Failed to pull data {tries} times from {url}...exiting")
+    raise FetchError(f"Failed to pull data {tries} times from {url}")
+
+def cached_responses(pattern):
+    '''
+    Return (url, data) for every response in the response cache whose URL
+    matches a SQL LIKE pattern, i.e. '%/people/%'. Returns nothing if the
+    cache isn't enabled.
+    '''
+
+    if not cache:
+        return []
+    return cache.scan(pattern)
+
+def replayable(key, fetch):
+    '''
+    Return the data from fetch() - i.e. a response, or Google search results -
+    passing it through the fixture store under the given key. In record mode
+    the data is stored; in replay mode the stored data is returned without
+    calling fetch() at all. Exits if the key was never recorded for replay.
+    '''
+
+    try:
+        return _replayable(key, fetch)
+    except LookupError:
+        sys.exit(1)
+
+def _replayable(key, fetch):
+    '''
+    Pass fetch()'s data through the fixture store (see replayable()), raising
+    LookupError if the key was never recorded for replay.
+    '''
+
+    if fixtures is None:
+        return fetch()
+    if fixtures.mode == REPLAY:
+        return fixtures.replay(key)
+    data = fetch()
+    fixtures.record(key, data)
+    return data
+
+def host_limiter(host):
+    '''
+    Return the rate limiter for a host, so requests sent to it outside of
+    request_data() (i.e. Google searches) are scheduled with the same limits.
+    '''
+
+    if scheduler is None:
+        _default_setup()
+    return scheduler.host(host)
+
+def request_batch(urls):
+    '''
+    Request data from a list of URLs concurrently and return a list of the
+    datasets in the same order as the URLs were provided.
+
+    A URL that appears in the list more than once is only requested once.
+    URLs are requested BATCH_SIZE at a time (see request_iter()), so a long
+    list never has more than two batches of requests queued at once.
+    '''
+
+    unique_urls = list(dict.fromkeys(urls))
+    results = dict(zip(unique_urls, request_iter(unique_urls)))
+
+    return [results[url] for url in urls]
+
+def request_iter(urls):
+    '''
+    Yield the dataset for each URL in a list, in order, while requesting them
+    concurrently BATCH_SIZE at a time.
+
+    The next batch is already being requested while the caller works through
+    the current one, so parsing/database work overlaps with network time.
+
+    If a URL's data can't be pulled, every request still waiting in the
+    thread pool is cancelled and the program exits.
+    '''
+
+    if executor is None:
+        _default_setup()
+
+    urls = list(urls)
+    pending = []
+    for i in range(0, len(urls), batch_size):
+        # queue up the next batch before handing back the previous one
+        futures = [
+            executor.submit(_fetch, url)
+            for url in urls[i:i + batch_size]
+        ]
+        for future in pending:
+            yield _result(future)
+        pending = futures
+
+    for future in pending:
+        yield _result(future)
+
+def _result(future):
+    '''
+    Return a request's data from its future. If the request failed, cancel
+    every request still waiting in the thread pool and exit, rather than
+    waiting on them (and their retries) first.
+    '''
+
+    global executor
+
+    try:
+        return future.result()
+    except FetchError as e:
+        log_file.error(f"{e}...cancelling pending requests and exiting")
+        executor.shutdown(wait=False, cancel_futures=True)
+        executor = None
+        sys.exit(1)
+
+def _default_setup():
+    '''
+    Setup the fetch engine with its default settings when setup_session() was
+    never called with a configuration file.
+    '''
+
+    from configparser import ConfigParser
+    setup_session(ConfigParser())
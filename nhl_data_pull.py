@@ -12,10 +12,7 @@ __version__ = '2.0'
 __title__ = 'nhl_data_pull'
 __author__ = 'Paul Hegedus'
 
-import os
 import sys
-import logging
-import requests
 import psycopg2
 import argparse
 import pandas as pd
@@ -26,41 +23,24 @@ import pdb
 from configparser import ConfigParser
 from datetime import datetime
 from pprint import pprint
-
-def open_logs(logs):
-    '''
-    Create a log file and setup parameters.
-    '''
-    
-    # check if log directory from config file exists
-    log_check = os.path.isdir(logs)
-
-    # create the directory if it doesn't exist
-    if not log_check:
-        try:
-            os.makedirs(logs)
-        except:
-            # couldn't create dir; default to {HOME}/logs
-            home_dir = os.path.expanduser('~')
-            logs = f"{home_dir}/logs"
-            if not os.path.isdir(logs):
-                os.makedirs(logs)
-
-    # create log filename with timestamp
-    now = datetime.now()
-    date_format = now.strftime("%d%b%y_%H%M%S")
-    log_file = f"{logs}/nhl_data_pull_{date_format}.log"
-
-    # create and configure logger
-    logging.basicConfig(filename=log_file,
-                        format='[%(asctime)s] %(message)s',
-                        filemode='w')
-    logger = logging.getLogger()
-
-    # set the threshold of logger to DEBUG
-    logger.setLevel(logging.DEBUG)
-
-    return logger
+from nhl_api import (setup_session, close_session, request_data,
+    request_batch, request_iter)
+from nhl_db import (BulkWriter, WriterPool, PreparedConnection, sql_select,
+    empty_tables, drop_indexes, create_indexes, open_pool, commit_policy)
+from backfill import season_range
+from work_queue import open_queue
+from stats_parser import parse_players, parse_settings
+from metrics import phase, write_summary
+from log_setup import open_logs
+from migrate import migrate
+
+# yearByYear stats datasets pulled this run, keyed by player ID, so each
+# player's stats are only requested from the API once
+player_years = {}
+
+# tables loaded with COPY by --initial-load if they're empty
+LOAD_TABLES = ('nhl_teams', 'nhl_players', 'nhl_team_players',
+    'nhl_skater_stats', 'nhl_goalie_stats', 'nhl_sync_state')
 
 def argsetup():
     '''
@@ -70,6 +50,15 @@ def argsetup():
     parser = argparse.ArgumentParser(description =
                 'Read in player/team data from the NHL\'s website.')
     parser.add_argument('configf', help='configuration file')
+    parser.add_argument('--initial-load', action='store_true',
+                help='load empty tables with COPY instead of upserts')
+    parser.add_argument('--incremental', action='store_true',
+                help='only rewrite stats that changed since the last sync')
+    parser.add_argument('--seasons', type=season_range,
+                help='backfill rosters for a range of seasons, i.e. '
+                '20102011-20192020')
+    parser.add_argument('--restart', action='store_true',
+                help='ignore progress saved by an interrupted run')
     a = parser.parse_args()
     return a
 
@@ -90,7 +79,8 @@ def database_connect():
                     password = db_passwd,
                     host = db_host,
                     database = db_name,
-                    port = db_port
+                    port = db_port,
+                    connection_factory = PreparedConnection
         )
         log_file.info('Database connection successfully established.')
     except psycopg2.DatabaseError as e:
@@ -100,109 +90,22 @@ def database_connect():
 
     return connection
 
-def request_data(url):
-    '''
-    Request data from specified URL pointing to a NHLStats API endpoint.
-
-    The requested dataset is a dict containing key-value pairs:
-        i.e.  {
-                'copyright': 'NHL and the NHL Shield are registered...',
-                'teams': [{team_data}, {team_data}, ... {team_data}]
-              }
-    This function returns the full dict, it does not separate out the actual 
-    data found in the list of dicts that makes up the value from a key-value
-    pair after the copyright info.
-
-    Note: Retry the connection twice if run into timeout error.
-    '''
-
-    log_file.info(f"Requesting data from {url}...")
-    for _ in range(3):
-        try:
-            r = requests.get(url)
-            if r.status_code == 200:
-                # successful request, return data
-                log_file.info(
-                    f"Pulled data on {_ + 1} try from {url}..."
-                )
-                return r.json()
-        except requests.exceptions.Timeout:
-            # retry
-            log_file.info(
-              f"Connection to {url} timed out on try {_ + 1}...retrying"
-            )
-            continue
-        except requests.exceptions.RequestException as e:
-            log_file.error(e)
-            sys.exit(1)
-
-def sql_insert(conn, cmd):
+def database_pool():
     '''
-    Execute an SQL insert command using an established database connection.
-
-    conn -> preexisting database connection [(i.e. a connection setup using 
-        nhl_data_pull.database_connect()]
-    cmd  -> SQL insert command to execute
+    Setup the pool of database connections used by the stats phases' writers.
+    Database credentials are the same as database_connect()'s.
     '''
 
-    cursor = conn.cursor()
+    log_file.info(f"Opening a pool of {db_writers} database writer "
+        f"connections...")
     try:
-        cursor.execute(cmd)
-        conn.commit()
-    except (Exception, psycopg2.DatabaseError) as e:
-        log_file.error(f"ERROR: {e}")
-        conn.rollback()
-        cursor.close()
-        return 1
-    cursor.close()
-    return 0
-
-def sql_update(conn, cmd):
-    '''
-    Execute an SQL update command using an established database connection.
-
-    conn -> preexisting database connection [(i.e. a connection setup using 
-        nhl_data_pull.database_connect()]
-    cmd  -> SQL update command to execute
-    '''
-
-    cursor = conn.cursor()
-    try:
-        cursor.execute(cmd)
-        conn.commit()
-    except (Exception, psycopg2.DatabaseError) as e:
-        log_file.error(f"ERROR: {e}")
-        conn.rollback()
-        cursor.close()
-        return 1
-    cursor.close()
-    return 0
-
-def sql_select(conn, cmd, fetchall):
-    '''
-    Execute an SQL select command using an established database connection, and
-    return one/all selected records depending on fetchall parameter.
+        pool = open_pool(db_writers, user = db_user, password = db_passwd,
+            host = db_host, database = db_name, port = db_port)
+    except psycopg2.DatabaseError as e:
+        log_file.error(e)
+        sys.exit()
 
-    conn  -> preexisting database connection
-    cmd   -> SQL select command to execute
-    fetch -> Boolean that tells function whether to return all results or only
-              one result
-    '''
-
-    cursor = conn.cursor()
-    try:
-        cursor.execute(cmd)
-        if fetchall:
-            result = cursor.fetchall()
-        else:
-            result = cursor.fetchone()
-    except (Exception, psycopg2.DatabaseError) as e:
-        log_file.error(f"ERROR: {e}")
-        conn.rollback()
-        cursor.close()
-        return 1
-    cursor.close()
-    return result
+    return pool
 
 def _teams(url):
     '''
@@ -227,6 +130,15 @@ def _teams(url):
         if key == 'teams':
             team_list = team_dataset[key]
 
+    # queue up each team's data to be written to the database together;
+    # franchise and active status are only set when a team is first added
+    writer = BulkWriter(db_connect, db_batch_size, load_tables,
+        policy=db_commit)
+    writer.register(
+        'nhl_teams',
+        update=('name', 'abbreviation', 'conf_id', 'division_id')
+    )
+
     # can now cycle thru each individual team
     for team_data in team_list:
         #pdb.set_trace()
@@ -238,46 +150,18 @@ def _teams(url):
         franchise_id = team_data['franchise']['franchiseId']
         active = team_data['active']
 
-        # determine if a record exists for that team or not
-        select_cmd = (
-            f"SELECT * FROM nhl_teams WHERE id = {team_id}"
-        )
-        record_check = sql_select(db_connect, select_cmd, False)
-        
-        # insert/update table record accordingly
-        if record_check:
-            # record exists for that team, just update the data
-            log_file.info(f"> Existing record found, updating NHL Team data "
-                f"for {team_name} ({team_id})...")
-
-            update_cmd = (
-                f"UPDATE nhl_teams SET id = {team_id}, name = $${team_name}$$, "
-                f"abbreviation = $${abbreviation}$$, conf_id = "
-                f"{conference_id}, division_id = {division_id} "
-                f"WHERE id = {team_id}"
-            )
-            # update team data in the database
-            status = sql_update(db_connect, update_cmd)
-        else:
-            # did not find a record for that team, insert new one
-            log_file.info(f"> No record found, inserting NHL Team data for "
-                f"{team_name} ({team_id})...")
-
-            insert_cmd = (
-                f"INSERT INTO nhl_teams (id, name, abbreviation, conf_id, "
-                f"division_id, franchise_id, active) VALUES ({team_id}, "
-                f"$${team_name}$$, $${abbreviation}$$, {conference_id}, "
-                f"{division_id}, {franchise_id}, {active})"
-            )
-            # insert the new team data into database
-            status = sql_insert(db_connect, insert_cmd)
-        
-        # log successful upload; sql_insert/update already log database errors
-        if status == 0: 
-            log_file.info(f">> Successfully uploaded data for {team_name} "
-                f"({team_id})...")
+        # insert new record or update the existing one for that team
+        log_file.info(f"> Queueing NHL Team data for {team_name} "
+            f"({team_id})...")
+        writer.add('nhl_teams', (team_id, team_name, abbreviation,
+            conference_id, division_id, franchise_id, active))
 
-def _players(url, team_ids):
+    # log successful upload; writer already logs database errors
+    if writer.close() == 0:
+        log_file.info(f">> Successfully uploaded data for {len(team_list)} "
+            f"NHL Teams...")
+
+def _players(url, team_ids, seasons):
     '''
     Overall function to get complete dataset of NHL players, then parse down 
     data to what is required and store in our database.
@@ -289,165 +173,143 @@ def _players(url, team_ids):
         - dob                   - position_code
         - nationality           - position_name
         - active                - position_type
+
+    Rosters are pulled for each season in the list (just the current season
+    unless backfilling with --seasons). A player is only requested from the API
+    once, no matter how many of the seasons' rosters they're on.
     '''
 
     # get roster from each team in database
     team_list = []
     if team_ids == 'ALL':
-        cmd = 'SELECT id, name FROM nhl_teams'
+        team_list = sql_select(db_connect, 'select_teams', fetchall=True)
     else:
-        cmd = (
-            f"SELECT id, name FROM nhl_teams "
-            f"WHERE id IN({team_ids})"
+        # create list of team ids with database list
+        team_ids = [int(id) for id in team_ids.split(',')]
+        team_list = sql_select(
+            db_connect, 'select_teams_by_id', (team_ids,), True
         )
-    # create list of team ids with database list
-    team_list = sql_select(db_connect, cmd, True)
 
-    # pdb.set_trace()
-    # get roster of players from each team
-    for team_id, team_name in team_list:
-        log_file.info(f"> Pulling NHL player data from {team_name} "
-            f"({team_id})...")
-        # create url to connect to api
-        team_roster = f"{nhl_teams}/{team_id}/roster"
-        # connect to api
-        player_dataset = request_data(team_roster)
-        # pull list of players from returned JSON object containing roster
-        for key in player_dataset.keys():
-            if key == 'roster':
-                player_dataset = player_dataset[key]
-        
-        player_list = parse_roster(player_dataset)
-        for endpoint in player_list:
-            # generate player's link to NHL API
-            url = f"{nhl_site}{endpoint}"
+    # queue up players and their team_players records to be written
+    # together; players must be written first b/c of foreign key references
+    writer = BulkWriter(db_connect, db_batch_size, load_tables, queue,
+        db_commit)
+    writer.register('nhl_players')
+    writer.register('nhl_team_players')
+
+    # player endpoint -> profile data for every player pulled so far
+    profiles = {}
+
+    for season in seasons:
+        # skip teams whose rosters were written by an earlier run
+        units = queue.plan(
+            [f"roster {season} {team_id}" for team_id, _ in team_list]
+        )
+        pending = {int(unit.split()[2]) for unit in units}
+        season_teams = [team for team in team_list if team[0] in pending]
+        if not season_teams:
+            continue
+
+        # request every team's roster for the season at once
+        log_file.info(f"> Pulling NHL rosters for the {season} season...")
+        team_rosters = request_batch(
+            [_roster_link(team_id, season) for team_id, _ in season_teams]
+        )
 
+        season_rosters = []
+        for player_dataset in team_rosters:
+            # pull list of players from returned JSON object containing roster
+            for key in player_dataset.keys():
+                if key == 'roster':
+                    player_dataset = player_dataset[key]
+            if isinstance(player_dataset, dict):
+                # no roster for this team in this season
+                player_dataset = []
+            season_rosters.append(parse_roster(player_dataset))
+
+        # request each new player's profile and yearByYear stats concurrently
+        new_players = list(dict.fromkeys(endpoint
+            for player_list in season_rosters for endpoint in player_list
+            if endpoint not in profiles))
+        people_links = [f"{nhl_site}{endpoint}" for endpoint in new_players]
+        stats_links = [f"{link}/{stats_byYear}" for link in people_links]
+        datasets = request_batch(people_links + stats_links)
+        people_datasets = datasets[:len(people_links)]
+        stats_datasets = datasets[len(people_links):]
+
+        for endpoint, dataset, years in zip(
+                new_players, people_datasets, stats_datasets):
             # get player's data
-            dataset = request_data(url)
             for key in dataset.keys():
                 if key == 'people':
                     dataset = dataset[key][0]
+            profiles[endpoint] = dataset
+            # hold onto yearByYear stats so the stats phase doesn't pull them
+            # from the API a second time
+            player_years[dataset['id']] = years
+
+        # get roster of players from each team
+        for (team_id, team_name), player_list in zip(
+                season_teams, season_rosters):
+            log_file.info(f"> Pulling NHL player data from {team_name} "
+                f"({team_id})...")
 
-            # parse out specific data we need for the database
-            player_id = dataset['id']
-            first_name = dataset['fullName'].split()[0]
-            last_name = dataset['fullName'].split()[1]
-            link = dataset['link']
-            dob = dataset['birthDate']
-            nationality = dataset['nationality']
-            active = dataset['active']
-            rookie = dataset['rookie']
-            shoots_catches = dataset['shootsCatches']
-            position_code = dataset['primaryPosition']['abbreviation']
-            position_name = dataset['primaryPosition']['name']
-            position_type = dataset['primaryPosition']['type']
-            season = current_season
-            
-            sequence = _get_player_sequence(endpoint, team_name)
-            if sequence is None:
-                # no NHL data found for this season
-                continue
-
-            # pdb.set_trace()
-
-            # determine if a record exists for that player
-            select_players_cmd = (
-                f"SELECT * FROM nhl_players WHERE id = {player_id}"
-            )
-            players_check = sql_select(
-                db_connect, select_players_cmd, False)
-
-            # insert/update players table accordingly
-            if players_check:
-                # record exists for that player, just update the data
-                log_file.info(f"> Existing record found, updating NHL Player "
-                    f"data for {last_name} ({player_id})...")
-                players_update_cmd = (
-                    f"UPDATE nhl_players SET id = {player_id}, first_name = "
-                    f"$${first_name}$$, last_name = $${last_name}$$, "
-                    f"link = $${link}$$, dob = $${dob}$$, "
-                    f"nationality = $${nationality}$$, active = {active}, "
-                    f"rookie = {rookie}, shoots_catches = "
-                    f"$${shoots_catches}$$, position_code = "
-                    f"$${position_code}$$, position_name = "
-                    f"$${position_name}$$, position_type = "
-                    f"$${position_type}$$ WHERE id = {player_id}"
-                )
-                # update player data in the database
-                players_status = sql_update(db_connect, players_update_cmd)
-            else:
-                # did not find a record for that player, insert new one
-                log_file.info(f"> No record found, inserting NHL Player data "
-                    f"for {last_name} ({player_id})...")
-                players_insert_cmd = (
-                    f"INSERT INTO nhl_players (id, first_name, last_name, "
-                    f"link, dob, nationality, active, rookie, shoots_catches, "
-                    f"position_code, position_name, position_type) VALUES "
-                    f"({player_id}, $${first_name}$$, $${last_name}$$, "
-                    f"$${link}$$, $${dob}$$, $${nationality}$$, "
-                    f"{active}, {rookie}, $${shoots_catches}$$, "
-                    f"$${position_code}$$ ,$${position_name}$$, "
-                    f"$${position_type}$$)"
+            for endpoint in player_list:
+                dataset = profiles[endpoint]
+
+                # parse out specific data we need for the database
+                player_id = dataset['id']
+                first_name = dataset['fullName'].split()[0]
+                last_name = dataset['fullName'].split()[1]
+                link = dataset['link']
+                dob = dataset['birthDate']
+                nationality = dataset['nationality']
+                active = dataset['active']
+                rookie = dataset['rookie']
+                shoots_catches = dataset['shootsCatches']
+                position_code = dataset['primaryPosition']['abbreviation']
+                position_name = dataset['primaryPosition']['name']
+                position_type = dataset['primaryPosition']['type']
+
+                sequence = _get_player_sequence(
+                    endpoint, player_years[player_id], team_id, season
                 )
-                # insert the new player data into the database
-                players_status = sql_insert(db_connect, players_insert_cmd)
-
-            # determine if a corresponding record exists in the team_player
-            # bridge table
-            select_team_players_cmd = (
-                f"SELECT * FROM nhl_team_players WHERE player_id = {player_id} "
-                f"AND team_id = {team_id} AND season = $${season}$$ AND "
-                f"sequence = {sequence}"
-            )
-            team_players_check = sql_select(
-                db_connect, select_team_players_cmd, False
-            )
+                if sequence is None:
+                    # no NHL data found for this season
+                    continue
+
+                # queue player's data and their bridge record with the team
+                log_file.info(f"> Queueing NHL Player data for {last_name} "
+                    f"({player_id})'s {season} season with the {team_name} "
+                    f"({team_id})...")
+                writer.add('nhl_players', (player_id, first_name, last_name,
+                    link, dob, nationality, active, rookie, shoots_catches,
+                    position_code, position_name, position_type))
+                # a player's active status is only current for the current
+                # season's roster; backfilled seasons are never active
+                writer.add('nhl_team_players', (player_id, team_id, season,
+                    active and season == current_season, sequence))
+
+            # write the team's players to the database in one transaction
+            writer.complete(f"roster {season} {team_id}")
+            if writer.flush() == 0:
+                log_file.info(f">> Successfully uploaded player data for "
+                    f"{team_name} ({team_id})...")
+
+            log_file.info(f">> Completed player data pull for {team_name} "
+                f"({team_id})...")
 
-            # insert/update team_players record accordingly
-            if team_players_check:
-                # record exists, just update the data
-                log_file.info(
-                    f"> Existing record found, updating team_players data for "
-                    f"{last_name} ({player_id})'s {season} season with the "
-                    f"{team_name} ({team_id})..."
-                )
-                team_players_update_cmd = (
-                    f"UPDATE nhl_team_players SET player_id = {player_id}, "
-                    f"team_id = {team_id}, season = $${season}$$, active = "
-                    f"{active}, sequence = {sequence} WHERE player_id = "
-                    f"{player_id} AND team_id = {team_id} AND season = "
-                    f"$${season}$$ AND sequence = {sequence}"
-                )
-                team_players_status = sql_update(
-                    db_connect, team_players_update_cmd
-                )
-            else:
-                # did not find a corresponding record in team_players table
-                log_file.info(
-                    f"> No record found, inserting data into team_players for"
-                    f"{last_name} ({player_id})'s {season} season with the "
-                    f"{team_name} ({team_id})..."
-                )
-                team_players_insert_cmd = (
-                    f"INSERT INTO nhl_team_players (player_id, team_id, "
-                    f"season, active, sequence) VALUES ({player_id}, "
-                    f"{team_id}, $${season}$$, {active}, {sequence})"
-                )
-                # insert the new team_players data into the database
-                team_players_status = sql_insert(
-                    db_connect, team_players_insert_cmd
-                )
+    writer.close()
 
-            # log successful upload; already logging database errors
-            if players_status == 0:
-                log_file.info(f">> Successfully uploaded data for {last_name} "
-                    f"({player_id}) to players table...")
-            if team_players_status == 0:
-                log_file.info(f">>> Uploaded data for {last_name} ({player_id}) "
-                    f"to team_players table...")
+def _roster_link(team_id, season):
+    '''
+    Return the link to a team's roster for a season. The current season's
+    roster is the team's default roster.
+    '''
 
-        log_file.info(f">> Completed player data pull for {team_name} "
-            f"({team_id})...")
+    if season == current_season:
+        return f"{nhl_teams}/{team_id}/roster"
+    return f"{nhl_teams}/{team_id}/roster?season={season}"
 
 def parse_roster(roster):
     '''
@@ -476,150 +338,49 @@ def _skaterStats_yearByYear():
         # get stats for all skaters in team_players table
         player_list = []
         # make sure we don't include goalies
-        cmd = (
-            f"SELECT DISTINCT player_id FROM nhl_team_players "
-            f"INNER JOIN nhl_players ON nhl_team_players.player_id = "
-            f"nhl_players.id WHERE nhl_players.position_code != 'G'"
-        )
-        select_results = sql_select(db_connect, cmd, True)
+        if incremental:
+            # only players never synced, still active last sync, or on a
+            # roster this season can have new stats
+            select_results = sql_select(db_connect,
+                'select_skaters_incremental', (current_season,), True)
+        else:
+            select_results = sql_select(
+                db_connect, 'select_skaters', fetchall=True
+            )
         for id in select_results:
             player_list.append(id[0])
     else:
         # get stats for player IDs listed in config file
-        player_list = stats_skatersByYear.split()
-    
-    for player_id in player_list:
-        # create a link to pull yearByYear stats for each player in list
-        link = f"{nhl_players}/{player_id}/{stats_byYear}"
-        
-        # pull the data
-        year_stats = request_data(link)
-
-        # remove copyright statement
-        for key in year_stats.keys():
-            if key == 'stats':
-                year_stats = year_stats[key][0]['splits']
-    
-        # keep only seasons with actual NHL data 
-        # i.e. ignore Junior Hockey data for now
-        nhl_years = []
-        for year in year_stats:
-            if year['league']['name'] == 'National Hockey League':
-                nhl_years.append(year)
-    
-        log_file.info(
-            f"{len(nhl_years)} NHL seasons found for player {player_id}"
-        )
+        player_list = [int(id) for id in stats_skatersByYear.split()]
+
+    # skip players whose stats were written by an earlier run
+    units = queue.plan([f"skater {player_id}" for player_id in player_list])
+    player_list = [int(unit.split()[1]) for unit in units]
+
+    # existing team_players records are left as is; only missing ones are
+    # added before the stats that reference them
+    # each player's rows are written by one of the pool's writers
+    writer = WriterPool(db_pool, db_writers, db_batch_size, load_tables,
+        queue, db_commit)
+    writer.register('nhl_team_players', update=())
+    writer.register('nhl_skater_stats')
+    writer.register('nhl_sync_state', depends=True)
+    team_ids = _team_ids()
+    sync_state = _load_sync_state(player_list)
+
+    # pull each player's yearByYear data (requested concurrently in batches)
+    # and parse it into rows, then queue the rows up to be written
+    results = _parse_stats('skater', player_list, sync_state, team_ids)
+    for player_id, result in zip(player_list, results):
+        partition = writer.partition(player_id)
+        _queue_stats(partition, 'skater', player_id, result)
+
+        # player is done once their stats are flushed to the database
+        partition.complete(f"skater {player_id}")
+
+    # write any remaining skater stats to the database
+    writer.close()
 
-        # parse out specific data we need for the database for each NHL year
-        for i, year in enumerate(nhl_years):
-            season = year['season']
-            team_id = year['team']['id']
-            toi = year['stat']['timeOnIce']
-            games = year['stat']['games']
-            assists = year['stat']['assists']
-            goals = year['stat']['goals']
-            pim = year['stat']['pim']
-            shots = year['stat']['shots']
-            hits = year['stat']['hits']
-            pp_goals = year['stat']['powerPlayGoals']
-            pp_points = year['stat']['powerPlayPoints']
-            pp_toi = year['stat']['powerPlayTimeOnIce']
-            even_toi = year['stat']['evenTimeOnIce']
-            faceoff_pct = year['stat']['faceOffPct']
-            shot_pct = year['stat']['shotPct']
-            gw_goals = year['stat']['gameWinningGoals']
-            ot_goals = year['stat']['overTimeGoals']
-            sh_goals = year['stat']['shortHandedGoals']
-            sh_points = year['stat']['shortHandedPoints']
-            sh_toi = year['stat']['shortHandedTimeOnIce']
-            blocked = year['stat']['blocked']
-            plus_minus = year['stat']['plusMinus']
-            points = year['stat']['points']
-            shifts = year['stat']['shifts']
-            sequence = year['sequenceNumber']
-        
-            # correctly set active to handle edge case of players that are
-            # traded/reassigned mid-season
-            if i < len(nhl_years) - 1:
-                # past NHL season; active should be false
-                active = False
-            else:
-                # current or last played NHL season for player
-                if season == current_season:
-                    active = True
-                else:
-                    # no NHL data for current season - in AHL/other league
-                    active = False
-
-            # ensure this season & sequence's data are in team_players
-            _team_players_check(player_id, team_id, season, active, sequence)
-
-            # determine if a record already exists for this skater/season
-            select_cmd = (
-                f"SELECT * FROM nhl_skater_stats WHERE player_id = "
-                f"{player_id} AND team_id = {team_id} AND season = "
-                f"$${season}$$ AND sequence = {sequence}"
-            )
-            skater_season_check = sql_select(db_connect, select_cmd, False)
-
-            # insert/update skater_season_stats record accordingly
-            if skater_season_check:
-                # record exists for that skater and season, just update data
-                log_file.info(
-                    f"> Existing record found, updating Skater data for "
-                    f"{player_id}'s {season} NHL season..."
-                )
-                update_cmd = (
-                    f"UPDATE nhl_skater_stats SET player_id = {player_id}, "
-                    f"team_id = {team_id}, season = $${season}$$, "
-                    f"time_on_ice = $${toi}$$, games = {games}, assists = "
-                    f"{assists}, goals = {goals}, pim = {pim}, shots = "
-                    f"{shots}, hits = {hits}, pp_goals = {pp_goals}, "
-                    f"pp_points = {pp_points}, pp_toi = $${pp_toi}$$, "
-                    f"even_toi = $${even_toi}$$, faceoff_pct = {faceoff_pct}, "
-                    f"shot_pct = {shot_pct}, gw_goals = {gw_goals}, "
-                    f"ot_goals = {ot_goals}, sh_goals = {sh_goals}, "
-                    f"sh_points = {sh_points}, sh_toi = $${sh_toi}$$, "
-                    f"blocked_shots = {blocked}, plus_minus = {plus_minus}, "
-                    f"points = {points}, shifts = {shifts}, sequence = "
-                    f"{sequence} WHERE player_id = {player_id} AND team_id = "
-                    f"{team_id} AND season = $${season}$$ AND sequence = "
-                    f"{sequence}"
-                )
-                # update skater data in the database
-                status = sql_update(db_connect, update_cmd)
-            else:
-                # did not find a record for skater and season, insert new one
-                log_file.info(f"> No record found, updating Skater data for "
-                    f"{player_id}'s {season} NHL season..."
-                )
-                insert_cmd = (
-                    f"INSERT INTO nhl_skater_stats (player_id, team_id, "
-                    f"season, time_on_ice, games, assists, goals, pim, "
-                    f"shots, hits, pp_goals, pp_points, pp_toi, even_toi, "
-                    f"faceoff_pct, shot_pct, gw_goals, ot_goals, sh_goals, "
-                    f"sh_points, sh_toi, blocked_shots, plus_minus, points, "
-                    f"shifts, sequence) VALUES ({player_id}, {team_id}, "
-                    f"$${season}$$, $${toi}$$, {games}, {assists}, {goals}, "
-                    f"{pim}, {shots}, {hits}, {pp_goals}, {pp_points}, "
-                    f"$${pp_toi}$$, $${even_toi}$$, {faceoff_pct}, "
-                    f"{shot_pct}, {gw_goals}, {ot_goals}, {sh_goals}, "
-                    f"{sh_points}, $${sh_toi}$$, {blocked}, {plus_minus}, "
-                    f"{points}, {shifts}, {sequence})"
-                )
-                # insert skater season stats into the database
-                status = sql_insert(db_connect, insert_cmd)
-
-            # log successful upload; already logging database errors
-            if status == 0:
-                if season == current_season:
-                    log_file.info(f">> Finished loading all data for skater "
-                        f"{player_id} with the {season} season...")
-                else:
-                    log_file.info(f">> Successfully inserted data for skater "
-                        f"{player_id} ({season} season) to the " f"skater_season_stats table...")
-    
     log_file.info(f">> Completed pulling yearByYear skater stats using list "
         f"from configuration file...")
         
@@ -632,213 +393,165 @@ def _goalieStats_yearByYear():
         # get stats for all goalies in team_players table
         player_list = []
         # only include goalies
-        cmd = (
-            f"SELECT DISTINCT player_id FROM nhl_team_players "
-            f"INNER JOIN nhl_players ON nhl_team_players.player_id = "
-            f"nhl_players.id WHERE nhl_players.position_code = 'G'"
-        )
-        select_results = sql_select(db_connect, cmd, True)
+        if incremental:
+            # only players never synced, still active last sync, or on a
+            # roster this season can have new stats
+            select_results = sql_select(db_connect,
+                'select_goalies_incremental', (current_season,), True)
+        else:
+            select_results = sql_select(
+                db_connect, 'select_goalies', fetchall=True
+            )
         for id in select_results:
             player_list.append(id[0])
     else:
         # get stats for player IDs listed in config file
-        player_list = stats_goaliesByYear.split()
+        player_list = [int(id) for id in stats_goaliesByYear.split()]
+
+    # skip players whose stats were written by an earlier run
+    units = queue.plan([f"goalie {player_id}" for player_id in player_list])
+    player_list = [int(unit.split()[1]) for unit in units]
+
+    # existing team_players records are left as is; only missing ones are
+    # added before the stats that reference them
+    # each player's rows are written by one of the pool's writers
+    writer = WriterPool(db_pool, db_writers, db_batch_size, load_tables,
+        queue, db_commit)
+    writer.register('nhl_team_players', update=())
+    writer.register('nhl_goalie_stats')
+    writer.register('nhl_sync_state', depends=True)
+    team_ids = _team_ids()
+    sync_state = _load_sync_state(player_list)
+
+    # pull each player's yearByYear data (requested concurrently in batches)
+    # and parse it into rows, then queue the rows up to be written
+    results = _parse_stats('goalie', player_list, sync_state, team_ids)
+    for player_id, result in zip(player_list, results):
+        partition = writer.partition(player_id)
+        _queue_stats(partition, 'goalie', player_id, result)
+
+        # player is done once their stats are flushed to the database
+        partition.complete(f"goalie {player_id}")
+
+    # write any remaining goalie stats to the database
+    writer.close()
 
-    for player_id in player_list:
-        # create link to player's yearByYear stats page
-        link = f"{nhl_players}/{player_id}/{stats_byYear}"
+    log_file.info(f">> Completed pulling yearByYear goalie stats using list "
+        f"from configuration file...")
 
-        # pull the player's yearByYear data
-        year_stats = request_data(link)
+def _team_ids():
+    '''
+    Return the set of NHL Team IDs stored in the teams table of the database.
 
-        # remove copyright statement
-        for key in year_stats.keys():
-            if key == 'stats':
-                year_stats = year_stats[key][0]['splits']
+    Stats for seasons with teams that aren't in the database can't be stored
+    b/c of the foreign key references on team_players.
+    '''
 
-        # keep only seasons with actual NHL data
-        nhl_years = []
-        for year in year_stats:
-            if year['league']['name'] == 'National Hockey League':
-                nhl_years.append(year)
+    team_ids = sql_select(db_connect, 'select_team_ids', fetchall=True)
+    return {id[0] for id in team_ids}
 
-        log_file.info(
-            f"{len(nhl_years)} NHL seasons found for player {player_id}"
-        )
+def _year_stats(player_list):
+    '''
+    Yield (player ID, yearByYear stats dataset) for each player in a list, in
+    order.
 
-        # parse out specific data we need for the database for each NHL year
-        for i, year in enumerate(nhl_years):
-            season = year['season']
-            team_id = year['team']['id']
-            toi = year['stat']['timeOnIce']
-            games = year['stat']['games']
-            starts = year['stat']['gamesStarted']
-            wins = year['stat']['wins']
-            losses = year['stat']['losses']
-            shutouts = year['stat']['shutouts']
-            saves = year['stat']['saves']
-            pp_saves = year['stat']['powerPlaySaves']
-            sh_saves = year['stat']['shortHandedSaves']
-            even_saves = year['stat']['evenSaves']
-            pp_shots = year['stat']['powerPlayShots']
-            sh_shots = year['stat']['shortHandedShots']
-            even_shots = year['stat']['evenShots']
-            save_pct = year['stat']['savePercentage']
-            gaa = year['stat']['goalAgainstAverage']
-            shots_against = year['stat']['shotsAgainst']
-            goals_against = year['stat']['goalsAgainst']
-            sequence = year['sequenceNumber']
-            
-            # pre 2005-2006 OT games could end in ties & OT wins weren't tracked
-            if season < '20052006':
-                ties = year['stat']['ties']
-                ot_wins = 'NULL'
-            else:
-                ties = 'NULL'
-                ot_wins = year['stat']['ot']
-
-            # individual save_pcts aren't saved if corresponding shot count is 0
-            if pp_shots != 0:
-                pp_save_pct = year['stat']['powerPlaySavePercentage']
-            else:
-                pp_save_pct = 0
-            if sh_shots != 0:
-                sh_save_pct = year['stat']['shortHandedSavePercentage']
-            else:
-                sh_save_pct = 0
-            if even_shots != 0:
-                even_save_pct = year['stat']['evenStrengthSavePercentage']
-            else:
-                even_save_pct = 0
-        
-            # correctly set active to handle edge case of players that are 
-            # traded/reassigned mid-season
-            if i < len(nhl_years) - 1:
-                # past NHL season; active should be false
-                active = False
-            else:
-                # current or last played NHL season
-                if season == current_season:
-                    active = True
-                else:
-                    # no NHL data for current season - in AHL/other league
-                    active = False
-
-            # ensure this season & sequence are in team_players table
-            _team_players_check(player_id, team_id, season, active, sequence)
-
-            # determine if a record already exists for this goalie/season
-            select_cmd = (
-                f"SELECT * FROM nhl_goalie_stats WHERE player_id = "
-                f"{player_id} AND team_id = {team_id} AND season = "
-                f"$${season}$$ AND sequence = {sequence}"
-            )
-            goalie_season_check = sql_select(db_connect, select_cmd, False)
-
-            # insert/update goalie_season_stats record accordingly
-            if goalie_season_check:
-                # record exists for that goalie and season, just update data
-                log_file.info(
-                    f"> Existing record found, updating Goalie data for "
-                    f"{player_id}'s {season} NHL season..."
-                )
-                update_cmd = (
-                    f"UPDATE nhl_goalie_stats SET player_id = {player_id}, "
-                    f"team_id = {team_id}, season = $${season}$$, "
-                    f"time_on_ice = $${toi}$$, games = {games}, starts = "
-                    f"{starts}, wins = {wins}, losses = {losses}, ties = "
-                    f"{ties}, ot_wins = {ot_wins}, shutouts = {shutouts}, "
-                    f"saves = {saves}, pp_saves = {pp_saves}, sh_saves = "
-                    f"{sh_saves}, even_saves = {even_saves}, pp_shots = "
-                    f"{pp_shots}, sh_shots = {sh_shots}, even_shots = "
-                    f"{even_shots}, save_pct = {save_pct}, gaa = {gaa}, "
-                    f"shots_against = {shots_against}, goals_against = "
-                    f"{goals_against}, pp_save_pct = {pp_save_pct}, "
-                    f"sh_save_pct = {sh_save_pct}, even_save_pct = "
-                    f"{even_save_pct}, sequence = {sequence} WHERE "
-                    f"player_id = {player_id} AND team_id = {team_id} AND "
-                    f"season = $${season}$$ AND sequence = {sequence}"
-                )
-                # update skater data in the database
-                status = sql_update(db_connect, update_cmd)
-            else:
-                # did not find a record for skater and season, insert new one
-                log_file.info(f"> No record found, updating Goalie data for "
-                    f"{player_id}'s {season} NHL season..."
-                )
-                insert_cmd = (
-                    f"INSERT INTO nhl_goalie_stats (player_id, team_id, "
-                    f"season, time_on_ice, games, starts, wins, losses, ties, "
-                    f"ot_wins, shutouts, saves, pp_saves, sh_saves, "
-                    f"even_saves, pp_shots, sh_shots, even_shots, save_pct, "
-                    f"gaa, shots_against, goals_against, pp_save_pct, "
-                    f"sh_save_pct, even_save_pct, sequence) VALUES ("
-                    f"{player_id}, {team_id}, $${season}$$, $${toi}$$, "
-                    f"{games}, {starts}, {wins}, {losses}, {ties}, "
-                    f"{ot_wins}, {shutouts}, {saves}, {pp_saves}, {sh_saves}, "
-                    f"{even_saves}, {pp_shots}, {sh_shots}, {even_shots}, "
-                    f"{save_pct}, {gaa}, {shots_against}, {goals_against}, "
-                    f"{pp_save_pct}, {sh_save_pct}, {even_save_pct}, "
-                    f"{sequence})"
-                )
-                # insert goalie season stats into the database
-                status = sql_insert(db_connect, insert_cmd)
-
-            # log successful upload; already logging database errors
-            if status == 0:
-                if season == current_season:
-                    log_file.info(f">> Finished loading all data for goalie "
-                        f"{player_id} with the {season} season...")
-                else:
-                    log_file.info(f">> Successfully inserted data for goalie "
-                        f"{player_id} ({season} season) to the "
-                        f"goalie_season_stats table...")
-    
-    log_file.info(f">> Completed pulling yearByYear goalie stats using list "
-        f"from configuration file...")
+    Players whose yearByYear stats were already pulled during this run (i.e.
+    by _players() for the sequence lookup) are handed back from memory; the
+    rest are requested concurrently in batches.
+    '''
+
+    missing = [player_id for player_id in player_list
+        if player_id not in player_years]
+    log_file.info(f"Reusing yearByYear stats pulled earlier in run for "
+        f"{len(player_list) - len(missing)} of {len(player_list)} players...")
 
-def _team_players_check(player, team, season, active, seq):
+    # create a link to pull yearByYear stats for each player not pulled yet
+    links = [f"{nhl_players}/{player_id}/{stats_byYear}"
+        for player_id in missing]
+    fetched = zip(missing, request_iter(links))
+
+    for player_id in player_list:
+        if player_id in player_years:
+            yield player_id, player_years[player_id]
+        else:
+            yield next(fetched)
+
+def _load_sync_state(player_list):
+    '''
+    Return a dict of player ID to the (historic_hash, current_hash) recorded
+    in the sync state table at the end of each player's last sync.
     '''
-    Given a player's stats for a particular season and sequence, determine if
-    there is a corresponding record in the team_players table.
 
-    If there's not a matching record, add one from the given data. This new 
-    record is necessary to be able to create a related stats record for that
-    player/season in skater_season_stats.
+    records = sql_select(
+        db_connect, 'select_sync_state', (list(player_list),), True
+    )
+    if records == 1:
+        # couldn't read the sync state; syncing every season is slower, but
+        # never skips one that changed
+        log_file.warning('Failed to read the sync state...syncing every '
+            'player\'s seasons in full...')
+        return {}
+    return {record[0]: (record[1], record[2]) for record in records}
+
+def _parse_stats(kind, player_list, sync_state, team_ids):
+    '''
+    Yield the parsed stats (see stats_parser.parse_player) of each player in a
+    list, in order. Players are parsed on the main thread as they're pulled,
+    or by a pool of workers if set in the [PARSE] section of the config file.
     '''
 
-    # check if record in team_players exists that matches provided column data
-    cmd = (
-        f"SELECT EXISTS("
-        f"SELECT 1 FROM nhl_team_players WHERE player_id = {player} AND "
-        f"team_id = {team} AND season = $${season}$$ AND sequence = {seq})"
+    tasks = (
+        (kind, player_id, year_stats, sync_state.get(player_id, (None, None)),
+            current_season, team_ids, incremental)
+        for player_id, year_stats in _year_stats(player_list)
     )
-    check = sql_select(db_connect, cmd, False)
-    # SQL command we run only returns True/False, so we have to parse that 
-    # out of the tuple returned by psycopg's cursor.fetchone()
-    check = check[0]
-
-    if not check:
-        # record doesn't exist in team_players; create it ourselves now
-        insert_cmd = (
-            f"INSERT INTO nhl_team_players (player_id, team_id, season, "
-            f"active, sequence) VALUES ({player}, {team}, $${season}$$, "
-            f"{active}, {seq})"
-        )
-        insert_status = sql_insert(db_connect, insert_cmd)
-        if insert_status == 0:
-            log_file.info(f">>> Added additional record to team_players for "
-                f"player {player} ({season})..."
-            )
-        return 0
+    return parse_players(tasks, **parse_config)
+
+def _queue_stats(writer, kind, player_id, result):
+    '''
+    Queue up a player's parsed stats to be written: a team_players record and
+    stats record for each of their NHL seasons, and their sync state if every
+    season could be stored.
+    '''
+
+    log_file.info(
+        f"{result['seasons']} NHL seasons found for player {player_id}"
+    )
+    log_file.info(f">> {result['changed']} of {result['seasons']} NHL seasons "
+        f"changed since last sync for player {player_id}...")
+
+    for team_id, season in result['skipped']:
+        log_file.warning(f"> No NHL Team found for {team_id}...skipping "
+            f"{player_id}'s {season} NHL season...")
+    for season, error in result['failed']:
+        log_file.warning(f"> Couldn't parse {player_id}'s {season} NHL "
+            f"season ({error})...skipping...")
+
+    # ensure each season & sequence's data are in team_players, then
+    # insert/update the player's stats for the season
+    for team_players, stats in result['rows']:
+        log_file.info(f"> Queueing {kind.capitalize()} data for {player_id}'s "
+            f"{team_players[2]} NHL season...")
+        writer.add('nhl_team_players', team_players)
+        writer.add(f"nhl_{kind}_stats", stats)
+
+    # the sync state is queued after the stats so it's only written with
+    # them; it's left out if any season couldn't be stored, so those seasons
+    # are tried again next run
+    if result['state'] is not None:
+        writer.add('nhl_sync_state', result['state'])
     else:
-        # record exists
-        return 1
+        log_file.warning(f"> Not updating sync state for {player_id}...some "
+            f"NHL seasons weren't stored...")
 
-def _get_player_sequence(url, team):
+def _get_player_sequence(url, years, team, season):
     '''
-    Given the player's NHL API endpoint (i.e. /api/v1/people/8473563) and an NHL team_id, return the sequence number for the player's current season at
-    that team.
+    Given the player's NHL API endpoint (i.e. /api/v1/people/8473563), the
+    player's yearByYear stats data, an NHL Team ID, and a season, return the
+    sequence number for the player's season at that team.
+
+    Teams are matched by ID rather than name, so seasons played under a
+    franchise's old name (i.e. when backfilling with --seasons) are found.
 
     This is needed to determine whether a player has been traded mid-season,
     reassigned to the AHL and called up again, etc.
@@ -846,15 +559,9 @@ def _get_player_sequence(url, team):
 
     # only want player id from the provided link
     player = url.split('/')[4]
+    log_file.info(f"Starting to get player sequence for {player}...")
 
-    # create link to player's stats to get sequence number for curr season
-    link = f"{nhl_players}/{player}/stats?stats=yearByYear"
-
-    # request intial data using link
-    log_file.info(f"Starting to get player sequence from {link}...")
-    years = request_data(link)
-
-    # only want current year data to find what sequence is for that team
+    # only want that season's data to find what sequence is for that team
     for key in years.keys():
         if key == 'stats':
             years = years[key][0]['splits']
@@ -862,19 +569,19 @@ def _get_player_sequence(url, team):
     found = []
     # pdb.set_trace()
     for year in years:
-        if year['season'] == current_season:
+        if year['season'] == season:
             found.append(year)
     # now find most recent team sequence number (if applicable)
     if len(found) >= 1:
         for i in found:
             if i['league']['name'] == 'National Hockey League' and \
-                i['team']['name'] == team:
+                i['team'].get('id') == team:
                 seq = i['sequenceNumber']
     else:
         # less than/equal to zero - something went wrong
         log_file.warning(
             f"Could not find sequence data for {player}...likely no NHL stats "
-            f"for season {current_season}...not adding to database."
+            f"for season {season}...not adding to database."
         )
         return None
     
@@ -882,7 +589,7 @@ def _get_player_sequence(url, team):
     if 'seq' not in locals():
         log_file.warning(
             f"Could not find sequence data for {player}...likely no NHL stats "
-            f"for season {current_season}...not adding to database."
+            f"for season {season}...not adding to database."
         )
         return None
     else:
@@ -902,7 +609,7 @@ if __name__ == '__main__':
 
     # setup and test logging
     log_dir = config['DEFAULT']['LOGDIR']
-    log_file = open_logs(log_dir)
+    log_file = open_logs(log_dir, 'nhl_data_pull', config)
     now = datetime.now().strftime("%d%b%Y %H:%M:%S")
     try:
         log_file.info(f"Starting NHL Data Pull at {now}...")
@@ -925,6 +632,7 @@ if __name__ == '__main__':
     stats_byYear = config['STATS']['yearByYear']
     stats_skatersByYear = config['STATS']['skatersByYear']
     stats_goaliesByYear = config['STATS']['goaliesByYear']
+    incremental = args.incremental
 
     # get database credentials from config file
     log_file.info('Setting database credentials from config file...')
@@ -933,37 +641,103 @@ if __name__ == '__main__':
     db_host = config['DATABASE']['CONNECTION']
     db_name = config['DATABASE']['DB_NAME']
     db_port = config['DATABASE']['PORT']
+    db_batch_size = config.getint('DATABASE', 'BATCH_SIZE', fallback=500)
+    db_writers = config.getint('DATABASE', 'WRITERS', fallback=1)
+    db_commit = commit_policy(config)
+
+    # setup pool used to parse players' stats
+    parse_config = parse_settings(config)
+
+    # setup fetch engine used to request data from the NHL API
+    setup_session(config)
 
     # open database connection using config file settings
     db_connect = database_connect()
 
+    # bring the database's schema up to date before anything relies on it
+    # (i.e. the nhl_goalie_stats primary key the goalie upserts need)
+    if migrate(db_connect, log_file.info) != 0:
+        sys.exit('Failed to migrate the database...exiting')
+    db_pool = database_pool()
+
+    # pull rosters for a range of seasons if backfilling. Stats are pulled
+    # once per player for the whole range, since each player's yearByYear
+    # stats already cover every season they've played
+    seasons = [current_season]
+    if args.seasons:
+        seasons = args.seasons
+        log_file.info(f"Backfilling {len(seasons)} seasons: {seasons[0]} to "
+            f"{seasons[-1]}...")
+
+    # track each team roster and player's stats in the work queue so an
+    # interrupted run resumes where it stopped
+    queue = open_queue(config, 'nhl_data_pull', {
+        'seasons': seasons, 'team_ids': nhl_players_teamIds,
+        'players': nhl_players_list, 'stats': stats_list,
+        'skaters': stats_skatersByYear, 'goalies': stats_goaliesByYear,
+        'incremental': incremental,
+    })
+    if args.restart:
+        queue.reset()
+
+    # only bulk load tables with COPY if they're still empty
+    load_tables = set()
+    if args.initial_load:
+        load_tables = empty_tables(db_connect, LOAD_TABLES)
+        if load_tables:
+            log_file.info(f"Loading empty tables with COPY: "
+                f"{', '.join(sorted(load_tables))}...")
+            indexes = drop_indexes(db_connect, load_tables)
+        else:
+            log_file.warning('Tables already contain data...ignoring '
+                '--initial-load and upserting records...')
+
     # initiate NHL team data getting if told by config file
     if nhl_teams_list != 'NONE':
         log_file.info('Pulling NHL Team data from website and storing in '
             'database...')
-        _teams(nhl_teams)
+        with phase('teams'):
+            _teams(nhl_teams)
 
     # initiate NHL player data getting
     if nhl_players_list != 'NONE':
         log_file.info('Pulling NHL Player data and storing in database...')
-        _players(nhl_players, nhl_players_teamIds)
+        with phase('players'):
+            _players(nhl_players, nhl_players_teamIds, seasons)
 
     if stats_list == 'ALL':
         log_file.info('Pulling year-by-year stats for NHL skaters...')
-        _skaterStats_yearByYear()
+        with phase('skater_stats'):
+            _skaterStats_yearByYear()
         log_file.info('Pulling year-by-year stats for NHL goalies...')
-        _goalieStats_yearByYear()
+        with phase('goalie_stats'):
+            _goalieStats_yearByYear()
     elif stats_list == 'SKATERS':
         # just get skaters season-by-season stats
         log_file.info('Pulling year-by-year stats for NHL skaters...')
-        _skaterStats_yearByYear()
+        with phase('skater_stats'):
+            _skaterStats_yearByYear()
     elif stats_list == 'GOALIES':
         # just get goalies season-by-season stats
         log_file.info('Pulling year-by-year stats for NHL goalies...')
-        _goalieStats_yearByYear()
+        with phase('goalie_stats'):
+            _goalieStats_yearByYear()
     else:
         # as of now, do nothing
         log_file.info('Not getting any player stats...')
 
-    # close database connection
-    db_connect.close()
\ No newline at end of file
+    # run finished; a rerun with the same settings starts over
+    queue.finish()
+    queue.close()
+
+    # rebuild any indexes dropped for the initial load
+    if load_tables:
+        create_indexes(db_connect, indexes)
+
+    # close database connections and fetch engine
+    db_pool.closeall()
+    db_connect.close()
+    close_session()
+
+    # write out timings and counters for each phase of the run
+    write_summary(config, 'nhl_data_pull')
\ No newline at end of file
@@ -0,0 +1,717 @@
+'''
+
+Description: Shared database helpers for the NHL data pull programs.
+
+Contains the helpers used to run the statements defined in statements.py with
+bound parameters, and the bulk writer used to store parsed NHL data in the
+database. Rather than checking for each record with a SELECT and then running
+a separate INSERT/UPDATE (and commit) per row, rows are accumulated per table
+and flushed together with INSERT ... ON CONFLICT DO UPDATE, one transaction
+per batch.
+
+When loading into empty tables (--initial-load), the bulk writer instead
+streams each batch into its table with COPY, and secondary indexes are dropped
+before the load and rebuilt once it's finished.
+
+The bulk writer also marks units of work done in the work queue once their
+rows have been committed, so an interrupted run can be resumed.
+
+For the stats phases, a writer pool runs a bulk writer on each of several
+pooled connections, each in its own thread and owning a partition of the
+players (by player ID hash), so writes keep up with the fetch engine instead
+of serializing on one connection.
+'''
+
+__version__ = '1.0'
+__title__ = 'nhl_db'
+
+import io
+import logging
+import threading
+import psycopg2
+
+from psycopg2.extensions import connection, TRANSACTION_STATUS_INTRANS
+from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.extras import execute_values
+from queue import Queue
+from statements import TABLES, STATEMENTS, upsert, upsert_row, positional
+from metrics import count, timed
+
+log_file = logging.getLogger(__name__)
+
+# commit policies: when a bulk writer commits the rows it has written
+ROW = 'ROW'
+BATCH = 'BATCH'
+UNIT = 'UNIT'
+PHASE = 'PHASE'
+COMMIT_POLICIES = (ROW, BATCH, UNIT, PHASE)
+
+# keys of the rows written to each table so far this run, shared by every
+# bulk writer so later phases can skip rows already copied into a table
+written_keys = {}
+
+class PreparedConnection(connection):
+    '''
+    Database connection that keeps track of which statements have already
+    been PREPAREd on it, and the command each was prepared for.
+
+    Pass as the connection_factory to psycopg2.connect().
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = {}
+
+def _prepare(cursor, conn, name, cmd):
+    '''
+    PREPARE a command (with %s placeholders) under a name on a connection,
+    unless it already has been. A name prepared for a different command (i.e.
+    a table registered with different update columns) is replaced.
+    '''
+
+    if conn.prepared.get(name) == cmd:
+        return
+    if name in conn.prepared:
+        cursor.execute(f"DEALLOCATE {name}")
+        del conn.prepared[name]
+        count('db_round_trips')
+    with timed(f"prepare {name}"):
+        cursor.execute(f"PREPARE {name} AS {positional(cmd)}")
+    conn.prepared[name] = cmd
+    count('db_round_trips')
+
+def _execute_prepared(cursor, name, params):
+    '''
+    EXECUTE a prepared statement by name with bound parameters.
+    '''
+
+    if params:
+        placeholders = ', '.join(['%s'] * len(params))
+        cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+    else:
+        cursor.execute(f"EXECUTE {name}")
+
+def _execute(cursor, conn, name, params):
+    '''
+    Execute a statement from the registry with bound parameters. Hot
+    statements are PREPAREd the first time they're run on a connection and
+    EXECUTEd by name after that. Each statement's latency is added to the
+    run metrics under its name.
+    '''
+
+    cmd, prepare = STATEMENTS[name]
+    if prepare and isinstance(conn, PreparedConnection):
+        _prepare(cursor, conn, name, cmd)
+        with timed(name):
+            _execute_prepared(cursor, name, params)
+    else:
+        with timed(name):
+            cursor.execute(cmd, params or None)
+    count('db_round_trips')
+
+def sql_select(conn, name, params=(), fetchall=False):
+    '''
+    Execute an SQL select command from the statement registry using an
+    established database connection, and return one/all selected records
+    depending on fetchall parameter.
+
+    conn     -> preexisting database connection
+    name     -> name of the select command in statements.STATEMENTS
+    params   -> tuple of values bound to the command's placeholders
+    fetchall -> Boolean that tells function whether to return all results or
+                only one result
+
+    Note: If the connection is shared with a bulk writer that has written
+    rows it hasn't committed yet (i.e. under the UNIT or PHASE commit
+    policy), the select runs inside a savepoint, so a failed select only
+    rolls back to the savepoint instead of discarding the writer's rows.
+    '''
+
+    cursor = conn.cursor()
+    savepoint = conn.get_transaction_status() == TRANSACTION_STATUS_INTRANS
+    try:
+        if savepoint:
+            cursor.execute('SAVEPOINT sql_select')
+            count('db_round_trips')
+        _execute(cursor, conn, name, params)
+        if fetchall:
+            result = cursor.fetchall()
+        else:
+            result = cursor.fetchone()
+        if savepoint:
+            cursor.execute('RELEASE SAVEPOINT sql_select')
+            count('db_round_trips')
+    except (Exception, psycopg2.DatabaseError) as e:
+        log_file.error(f"ERROR: {e}")
+        if savepoint:
+            cursor.execute('ROLLBACK TO SAVEPOINT sql_select')
+            count('db_round_trips')
+        else:
+            conn.rollback()
+        cursor.close()
+        return 1
+    cursor.close()
+    return result
+
+def empty_tables(conn, tables):
+    '''
+    Return the set of tables from a list that don't have any records yet -
+    i.e. tables in a freshly created database that can be loaded with COPY
+    instead of upserts.
+    '''
+
+    empty = set()
+    cursor = conn.cursor()
+    for table in tables:
+        with timed(f"exists {table}"):
+            cursor.execute(f"SELECT EXISTS(SELECT 1 FROM {table})")
+        count('db_round_trips')
+        if cursor.fetchone()[0]:
+            log_file.info(f"Found existing records in {table}...")
+        else:
+            empty.add(table)
+    # don't leave the connection idle in a transaction
+    conn.rollback()
+    cursor.close()
+
+    return empty
+
+def drop_indexes(conn, tables):
+    '''
+    Drop the secondary indexes (any index not backing a primary key/unique
+    constraint) on a list of tables so they aren't maintained row by row
+    during a bulk load.
+
+    Returns the list of CREATE INDEX commands needed to rebuild them with
+    create_indexes() after the load.
+    '''
+
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT i.schemaname, i.indexname, i.indexdef FROM pg_indexes i "
+        "WHERE i.tablename = ANY(%s) AND NOT EXISTS ("
+        "SELECT 1 FROM pg_constraint c WHERE c.conname = i.indexname)",
+        (list(tables),)
+    )
+    indexes = cursor.fetchall()
+    for schema, name, indexdef in indexes:
+        log_file.info(f"Dropping index {name} until load is finished...")
+        log_file.info(f">> Rebuild manually if load fails: {indexdef}")
+        cursor.execute(f"DROP INDEX {schema}.{name}")
+    conn.commit()
+    cursor.close()
+
+    return [indexdef for _, _, indexdef in indexes]
+
+def create_indexes(conn, indexdefs):
+    '''
+    Rebuild the indexes dropped by drop_indexes() once a bulk load is done.
+    '''
+
+    cursor = conn.cursor()
+    for indexdef in indexdefs:
+        log_file.info(f"Rebuilding index: {indexdef}...")
+        try:
+            cursor.execute(indexdef)
+            conn.commit()
+        except (Exception, psycopg2.DatabaseError) as e:
+            log_file.error(f"ERROR: {e}")
+            conn.rollback()
+    cursor.close()
+
+def _copy_value(value):
+    '''
+    Format a value as a field for COPY's text format.
+    '''
+
+    if value is None:
+        return '\\N'
+    return (
+        str(value).replace('\\', '\\\\').replace('\t', '\\t')
+        .replace('\n', '\\n').replace('\r', '\\r')
+    )
+
+class BulkWriter:
+    '''
+    Accumulate parsed rows for one or more tables and upsert them into the
+    database in batches.
+
+    conn        -> preexisting database connection
+    batch_size  -> number of queued rows (across all tables) that triggers a
+                   flush to the database
+    copy_tables -> tables to stream rows into with COPY rather than upserting
+                   them; only safe for tables that started out empty
+    queue       -> work queue (see work_queue) to mark units of work done in
+                   once their rows have been committed
+    policy      -> when written rows are committed (see commit_policy):
+                   ROW   - after every row
+                   BATCH - after every batch_size rows, or flush()
+                   UNIT  - once every row of a unit of work (i.e. a team's
+                           roster, or a player's stats) has been written
+                   PHASE - only when the writer is closed
+                   Rows are still sent to the database every batch_size rows
+                   under UNIT and PHASE; they just aren't committed yet.
+
+    Tables are flushed in the order they were registered, so a table should
+    be registered after any table its foreign keys reference.
+
+    There is no ON CONFLICT to fall back on with COPY, so a row whose key was
+    already written to a COPY table earlier in the run is skipped.
+    '''
+
+    def __init__(self, conn, batch_size=500, copy_tables=(), queue=None,
+            policy=BATCH):
+        self.conn = conn
+        self.batch_size = 1 if policy == ROW else batch_size
+        self.copy = set(copy_tables)
+        self.queue = queue
+        self.policy = policy
+        self.tables = {}
+        self.depends = set()
+        # first key column (i.e. player ID) of every row that failed this
+        # run; their rows in depends tables aren't written
+        self.failed = set()
+        self.rows = {}
+        self.pending = 0
+        self.written = {}
+        # keys of the rows written since the last commit; they're only added
+        # to written_keys once they've been committed
+        self.uncommitted = {}
+        self.units = []
+        # whether rows have been written since the last commit, and whether
+        # any of them failed
+        self.open = False
+        self.status = 0
+
+    def register(self, table, update=None, depends=False):
+        '''
+        Setup a table to write rows to.
+
+        update  -> columns to overwrite when a row's key already exists in the
+                   table. Defaults to every non-key column; an empty tuple
+                   leaves existing rows as they are (ON CONFLICT DO NOTHING).
+        depends -> a row is only written if every row in an earlier
+                   registered table with the same first key column (i.e.
+                   player ID) was; i.e. a player's sync state, which must not
+                   be written if any of their stats couldn't be
+        '''
+
+        columns, key = TABLES[table]
+        key_index = [columns.index(col) for col in key]
+        self.tables[table] = (upsert(table, update), key_index,
+            upsert_row(table, update))
+        if depends:
+            self.depends.add(table)
+        self.rows[table] = {}
+        self.uncommitted[table] = set()
+        self.written.setdefault(table, 0)
+        written_keys.setdefault(table, set())
+
+    def add(self, table, row):
+        '''
+        Queue a row (tuple of values in the table's column order) to be
+        written. A later row with the same key replaces an earlier queued one.
+        '''
+
+        _, key_index, _ = self.tables[table]
+        key = tuple(row[i] for i in key_index)
+        if table in self.copy and key in written_keys[table]:
+            # already copied into the table earlier in the run
+            log_file.info(f">> Skipping duplicate {table} row for {key}...")
+            return
+        if key not in self.rows[table]:
+            self.pending += 1
+        self.rows[table][key] = row
+
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def complete(self, unit):
+        '''
+        Record that every row for a unit of work has been queued. The unit is
+        marked done in the work queue once those rows are committed, or failed
+        if any of the rows committed with them couldn't be written.
+        '''
+
+        if self.queue:
+            self.units.append(unit)
+        if self.policy in (ROW, UNIT):
+            self._write()
+            self.commit()
+
+    def contains(self, table, key):
+        '''
+        Check whether a row with the given key (tuple) has been queued or
+        written by this writer.
+        '''
+
+        return (key in self.rows[table] or key in self.uncommitted[table]
+            or key in written_keys[table])
+
+    def flush(self):
+        '''
+        Write every queued row to the database, and commit them if the commit
+        policy is ROW or BATCH. Returns 0, or 1 if any rows couldn't be
+        written.
+        '''
+
+        status = self._write()
+        if self.policy in (ROW, BATCH):
+            status = self.commit()
+        return status
+
+    def _write(self):
+        '''
+        Write every queued row to the database without committing.
+
+        If the batch fails (i.e. a foreign key violation in one row), it's
+        rolled back and retried a row at a time so only the bad rows are
+        lost. When earlier batches are still waiting on a commit, the batch
+        is written inside a savepoint so rolling it back leaves them be.
+        '''
+
+        if not self.pending:
+            return 0
+
+        # a row in a depends table can arrive in a later batch than the row
+        # it depends on, so check the rows that failed in earlier batches
+        for table in self.depends:
+            for key in list(self.rows[table]):
+                self._skip_dependent(table, key)
+
+        cursor = self.conn.cursor()
+        savepoint = self.open
+        try:
+            if savepoint:
+                cursor.execute('SAVEPOINT bulk_batch')
+                count('db_round_trips')
+            for table, (cmd, _, _) in self.tables.items():
+                rows = list(self.rows[table].values())
+                if rows and table in self.copy:
+                    with timed(f"copy {table}"):
+                        self._copy_rows(cursor, table, rows)
+                elif len(rows) == 1:
+                    # a single row's upsert can be prepared
+                    with timed(f"upsert {table} (row)"):
+                        self._upsert_row(cursor, table, rows[0])
+                elif rows:
+                    with timed(f"upsert {table}"):
+                        execute_values(cursor, cmd, rows,
+                            page_size=len(rows))
+                if rows:
+                    count('db_round_trips')
+            if savepoint:
+                cursor.execute('RELEASE SAVEPOINT bulk_batch')
+                count('db_round_trips')
+            status = 0
+        except (Exception, psycopg2.DatabaseError) as e:
+            log_file.error(f"ERROR: {e}")
+            if savepoint:
+                cursor.execute('ROLLBACK TO SAVEPOINT bulk_batch')
+                count('db_round_trips')
+            else:
+                self.conn.rollback()
+            log_file.info('Retrying failed batch one row at a time...')
+            status = self._flush_rows(cursor)
+        cursor.close()
+
+        for table, rows in self.rows.items():
+            if rows:
+                count('rows', len(rows))
+                self.written[table] += len(rows)
+                self.uncommitted[table].update(rows)
+                log_file.info(f">> Wrote {len(rows)} rows to {table}...")
+            rows.clear()
+        self.pending = 0
+        self.open = True
+        self.status = max(self.status, status)
+
+        return status
+
+    def commit(self):
+        '''
+        Commit the rows written since the last commit, and update the work
+        queue with the units they finished. Returns 0, or 1 if any of those
+        rows couldn't be written (or the commit itself failed).
+        '''
+
+        status = self.status
+        if self.open:
+            try:
+                with timed('commit'):
+                    self.conn.commit()
+                count('db_round_trips')
+                for table, keys in self.uncommitted.items():
+                    written_keys[table].update(keys)
+            except (Exception, psycopg2.DatabaseError) as e:
+                log_file.error(f"ERROR: {e}")
+                self.conn.rollback()
+                self._rolled_back()
+                status = 1
+        for keys in self.uncommitted.values():
+            keys.clear()
+        self._finish_units(status)
+        self.open = False
+        self.status = 0
+
+        return status
+
+    def _rolled_back(self):
+        '''
+        Record that the rows written since the last commit were rolled back:
+        their first key columns (i.e. player IDs) are marked failed, so their
+        rows in depends tables aren't written by a later batch.
+        '''
+
+        for table, keys in self.uncommitted.items():
+            if keys:
+                log_file.warning(f">> {len(keys)} {table} rows were rolled "
+                    f"back...")
+            self.failed.update(key[0] for key in keys)
+            keys.clear()
+        self.open = False
+
+    def _finish_units(self, status):
+        '''
+        Update the work queue with the units whose rows were just committed.
+        '''
+
+        if not self.units:
+            return
+        if status == 0:
+            self.queue.complete(self.units)
+        else:
+            self.queue.fail(self.units)
+        self.units = []
+
+    def _copy_rows(self, cursor, table, rows):
+        '''
+        Stream rows into a table with COPY from an in-memory buffer.
+        '''
+
+        columns = TABLES[table][0]
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join(_copy_value(value) for value in row))
+            buffer.write('\n')
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer
+        )
+
+    def _flush_rows(self, cursor):
+        '''
+        Write queued rows one at a time, each inside its own savepoint, so a
+        bad row is rolled back without losing the rest of the batch. Rows in
+        a depends table are dropped if a row with the same first key column
+        failed.
+        '''
+
+        status = 0
+        for table in self.tables:
+            for key, row in list(self.rows[table].items()):
+                if self._skip_dependent(table, key):
+                    continue
+                cursor.execute('SAVEPOINT bulk_row')
+                try:
+                    with timed(f"upsert {table} (row)"):
+                        self._upsert_row(cursor, table, row)
+                    cursor.execute('RELEASE SAVEPOINT bulk_row')
+                except (Exception, psycopg2.DatabaseError) as e:
+                    log_file.error(f"ERROR: {table} {row}: {e}")
+                    cursor.execute('ROLLBACK TO SAVEPOINT bulk_row')
+                    # drop the bad row so it isn't counted as written
+                    del self.rows[table][key]
+                    self.failed.add(key[0])
+                    status = 1
+                # savepoint, row, and release/rollback
+                count('db_round_trips', 3)
+        return status
+
+    def _upsert_row(self, cursor, table, row):
+        '''
+        Upsert a single row. A single row's upsert always has the same
+        number of parameters, so on a PreparedConnection it's PREPAREd the
+        first time and EXECUTEd by name after that, unlike a batch's
+        execute_values() upsert.
+        '''
+
+        row_cmd = self.tables[table][2]
+        if isinstance(self.conn, PreparedConnection):
+            _prepare(cursor, self.conn, f"upsert_{table}", row_cmd)
+            _execute_prepared(cursor, f"upsert_{table}", row)
+        else:
+            cursor.execute(row_cmd, row)
+
+    def _skip_dependent(self, table, key):
+        '''
+        Drop a queued row in a depends table if a row with the same first key
+        column failed. Returns whether it was dropped.
+        '''
+
+        if table not in self.depends or key[0] not in self.failed:
+            return False
+        log_file.warning(f">> Skipping {table} row for {key}...an earlier "
+            f"row for {key[0]} couldn't be written...")
+        del self.rows[table][key]
+        return True
+
+    def close(self):
+        '''
+        Write and commit any rows left in the queue and log totals for each
+        table.
+        '''
+
+        self._write()
+        status = self.commit()
+        for table, total in self.written.items():
+            log_file.info(f"> {total} rows written to {table} in total...")
+        return status
+
+def commit_policy(config):
+    '''
+    Return the bulk writers' commit policy from the COMMIT setting in the
+    [DATABASE] section of the config file (ROW, BATCH, UNIT, or PHASE).
+    Defaults to BATCH.
+    '''
+
+    policy = config.get('DATABASE', 'COMMIT', fallback=BATCH).upper()
+    if policy not in COMMIT_POLICIES:
+        log_file.warning(f"Unknown commit policy {policy}...committing "
+            f"every batch instead...")
+        policy = BATCH
+    return policy
+
+def open_pool(writers, **params):
+    '''
+    Open a pool of database connections for a writer pool's writers.
+
+    writers -> number of connections in the pool
+    params  -> psycopg2.connect() parameters (user, password, host, etc.)
+    '''
+
+    return ThreadedConnectionPool(1, writers,
+        connection_factory=PreparedConnection, **params)
+
+class _Partition:
+    '''
+    Handle for queueing rows and units of work to one of a writer pool's
+    writers; has the same add()/complete() methods as a bulk writer.
+    '''
+
+    def __init__(self, inbox):
+        self.inbox = inbox
+
+    def add(self, table, row):
+        self.inbox.put(('add', table, row))
+
+    def complete(self, unit):
+        self.inbox.put(('complete', unit))
+
+class WriterPool:
+    '''
+    Bulk writers on a pool of database connections, each running in its own
+    thread. Rows are handed to a writer by partition key (i.e. player ID), so
+    every row for a key is written by the same writer in the order it was
+    queued, and each writer's batches are committed on its own connection.
+
+    pool        -> connection pool (see open_pool) to take connections from
+    writers     -> number of writers; no more than the size of the pool
+    batch_size  -> as for BulkWriter, per writer
+    copy_tables -> as for BulkWriter
+    queue       -> as for BulkWriter
+    policy      -> as for BulkWriter, per writer
+    max_pending -> max number of rows/units waiting on each writer before
+                   add() blocks, so a slow database holds back the fetch side
+                   instead of filling up memory
+
+    Every table is registered with every writer, so rows in different
+    partitions must not depend on each other (i.e. foreign keys across
+    partitions must already be in the database).
+    '''
+
+    def __init__(self, pool, writers, batch_size=500, copy_tables=(),
+            queue=None, policy=BATCH, max_pending=10000):
+        self.pool = pool
+        self.conns = [pool.getconn() for _ in range(writers)]
+        self.writers = [BulkWriter(conn, batch_size, copy_tables, queue,
+            policy) for conn in self.conns]
+        self.partitions = [_Partition(Queue(max_pending))
+            for _ in self.writers]
+        self.status = [0] * writers
+        self.threads = []
+
+    def register(self, table, update=None, depends=False):
+        '''
+        Setup a table to write rows to on every writer; see
+        BulkWriter.register(). Must be done before any rows are added.
+        '''
+
+        for writer in self.writers:
+            writer.register(table, update, depends)
+
+    def partition(self, key):
+        '''
+        Return the handle used to queue rows/units for a partition key. The
+        writer threads are started the first time this is called.
+        '''
+
+        if not self.threads:
+            for i in range(len(self.writers)):
+                thread = threading.Thread(target=self._run, args=(i,),
+                    name=f"db-writer-{i}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+        return self.partitions[hash(key) % len(self.partitions)]
+
+    def _run(self, i):
+        '''
+        Write the rows queued for one writer until the pool is closed.
+        '''
+
+        writer, inbox = self.writers[i], self.partitions[i].inbox
+        failed = False
+        while True:
+            item = inbox.get()
+            if item is None:
+                break
+            if failed:
+                # keep draining so add() never blocks on a dead writer
+                continue
+            try:
+                getattr(writer, item[0])(*item[1:])
+            except Exception as e:
+                log_file.error(f"ERROR: writer {i} stopped: {e}")
+                self.conns[i].rollback()
+                writer._rolled_back()
+                failed = True
+
+        if failed:
+            # units still waiting on a flush are retried on the next run
+            writer._finish_units(1)
+            self.status[i] = 1
+            return
+        try:
+            self.status[i] = writer.close()
+        except Exception as e:
+            log_file.error(f"ERROR: writer {i} failed to close: {e}")
+            self.conns[i].rollback()
+            writer._rolled_back()
+            self.status[i] = 1
+
+    def close(self):
+        '''
+        Flush every writer, wait for them to finish, and hand their
+        connections back to the pool. Returns 0 if every writer succeeded.
+        '''
+
+        for partition in self.partitions:
+            partition.inbox.put(None)
+        for thread in self.threads:
+            thread.join()
+        if not self.threads:
+            # nothing was ever queued; nothing to flush
+            self.status = [writer.close() for writer in self.writers]
+        for conn in self.conns:
+            self.pool.putconn(conn)
+        return max(self.status)
@@ -0,0 +1,251 @@
+'''
+
+Description: Local name to NHL Player ID index for the juniors data pull.
+
+Draft picks without a prospect profile have to have their NHL Player ID
+looked up by name, which otherwise means a Google search (spaced out by
+Google's rate limit) or probing the NHL API one player at a time. The index
+answers most of those lookups from memory instead. It's built from:
+    - the players and draft picks already stored in the database
+    - player profiles in the response cache
+    - every ID found by an external lookup in an earlier run (written back to
+      a local SQLite file, since a draft pick's name doesn't always match
+      the name on the player's NHL profile)
+
+Names are keyed after being normalized (accents folded, case and punctuation
+dropped), and a lookup can be narrowed down by date of birth and draft year
+when more than one player has the same name. Names that don't match exactly
+are matched fuzzily (see name_match.py), and only accepted with a high enough
+confidence and a matching DOB or draft year.
+
+The index's SQLite file is setup from the [PLAYER_INDEX] section of the
+configuration file.
+'''
+
+__version__ = '1.0'
+__title__ = 'player_index'
+
+import os
+import time
+import sqlite3
+import logging
+
+from name_match import NameIndex, normalize_name, MATCH
+
+log_file = logging.getLogger(__name__)
+
+class PlayerIndex:
+    '''
+    In-memory index of normalized player names to NHL Player IDs, backed by a
+    SQLite file for the IDs found by external lookups.
+
+    path -> location of the SQLite file holding the written back lookups
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        # normalized name -> {player ID: (dob, draft year)}
+        self.names = {}
+        # the same names, for fuzzy matching when there's no exact match
+        self.fuzzy = NameIndex()
+        # player ID -> draft year, and DOB
+        self.drafted = {}
+        self.born = {}
+
+        # counters reported when the index is closed
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self.learned = 0
+
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS players ('
+            'name TEXT, player_id INTEGER, dob TEXT, draft_year TEXT, '
+            'source TEXT, updated_at REAL, PRIMARY KEY (name, player_id))'
+        )
+        self.db.commit()
+        for name, player_id, dob, draft_year in self.db.execute(
+                'SELECT name, player_id, dob, draft_year FROM players'):
+            self._add(name, player_id, dob, draft_year)
+
+    def _add(self, key, player_id, dob=None, draft_year=None):
+        '''
+        Add a player under an already normalized name, keeping any DOB or
+        draft year already known for them.
+        '''
+
+        if not key or player_id is None:
+            return
+        players = self.names.setdefault(key, {})
+        old_dob, old_year = players.get(player_id, (None, None))
+        players[player_id] = (dob or old_dob, draft_year or old_year)
+        self.fuzzy.add(key, player_id, dob)
+        if draft_year:
+            self.drafted[player_id] = draft_year
+        if dob:
+            self.born[player_id] = dob
+
+    def add(self, name, player_id, dob=None, draft_year=None):
+        '''
+        Add a player to the index (in memory only) under a name.
+        '''
+
+        self._add(normalize_name(name), int(player_id),
+            str(dob) if dob else None, str(draft_year) if draft_year else None)
+
+    def load_players(self, records):
+        '''
+        Add (id, first name, last name, dob) records, i.e. from nhl_players.
+        '''
+
+        for player_id, first_name, last_name, dob in records:
+            self.add(f"{first_name} {last_name}", player_id, dob)
+
+    def load_draft(self, records):
+        '''
+        Add (id, first name, last name, dob, draft year) records, i.e. from
+        nhl_draft.
+        '''
+
+        for player_id, first_name, last_name, dob, draft_year in records:
+            self.add(f"{first_name} {last_name}", player_id, dob,
+                draft_year.strip() if draft_year else None)
+
+    def load_profiles(self, responses):
+        '''
+        Add the players from (url, data) pairs of cached people responses;
+        their stats responses are skipped.
+        '''
+
+        for url, data in responses:
+            if '/stats' in url:
+                continue
+            for person in data.get('people', []) if isinstance(data, dict) \
+                    else []:
+                if person.get('id') and person.get('fullName'):
+                    self.add(person['fullName'], person['id'],
+                        person.get('birthDate'))
+
+    def lookup(self, name, dob=None, draft_year=None):
+        '''
+        Return the NHL Player ID for a name and the confidence of the match,
+        or (None, 0) if the index doesn't have exactly one player it could
+        be. Players whose known DOB or draft year differs from the one given
+        are ruled out, and when there's more than one player with the name,
+        the ones with a matching draft year and then DOB are preferred. A
+        name with no exact match is matched fuzzily, and only accepted at
+        MATCH confidence.
+        '''
+
+        players = self.names.get(normalize_name(name), {})
+        candidates = [player_id for player_id, (known_dob, known_year)
+            in players.items()
+            if not (dob and known_dob and known_dob != str(dob))
+                and not (draft_year and known_year
+                    and known_year != str(draft_year))]
+        if players and not candidates:
+            # everyone with the name was born or drafted in another year
+            self.misses += 1
+            return None, 0.0
+        if len(candidates) > 1 and draft_year:
+            matches = [player_id for player_id in candidates
+                if players[player_id][1] == str(draft_year)]
+            candidates = matches or candidates
+        if len(candidates) > 1 and dob:
+            matches = [player_id for player_id in candidates
+                if players[player_id][0] == str(dob)]
+            candidates = matches or candidates
+
+        if len(candidates) == 1:
+            self.hits += 1
+            return candidates[0], 1.0
+        if not candidates:
+            player_id, confidence = self._fuzzy_lookup(name, dob, draft_year)
+            if player_id is not None:
+                self.fuzzy_hits += 1
+                return player_id, confidence
+        self.misses += 1
+        return None, 0.0
+
+    def _fuzzy_lookup(self, name, dob=None, draft_year=None):
+        '''
+        Return the one player whose name best matches a name at MATCH
+        confidence, and the confidence, or (None, 0). A name alone isn't
+        enough - names one letter apart can be different players - so only
+        players with the same DOB or drafted in the draft year are matched.
+        '''
+
+        matches = [match for match in self.fuzzy.search(name, dob, MATCH)
+            if (dob and self.born.get(match[0]) == str(dob))
+                or (draft_year
+                    and self.drafted.get(match[0]) == str(draft_year))]
+        if not matches or (len(matches) > 1
+                and matches[1][1] == matches[0][1]):
+            return None, 0.0
+        return matches[0]
+
+    def learn(self, name, player_id, dob=None, draft_year=None,
+            source='lookup'):
+        '''
+        Write back an ID found by an external lookup (i.e. a Google search)
+        so later lookups of the name - this run or the next - find it in the
+        index.
+        '''
+
+        self.add(name, player_id, dob, draft_year)
+        self.db.execute(
+            'INSERT OR REPLACE INTO players (name, player_id, dob, '
+            'draft_year, source, updated_at) VALUES (?, ?, ?, ?, ?, ?)',
+            (normalize_name(name), int(player_id), str(dob) if dob else None,
+                str(draft_year) if draft_year else None, source, time.time())
+        )
+        self.db.commit()
+        self.learned += 1
+
+    def summary(self):
+        '''
+        Return a one line summary of the index's counters for the log.
+        '''
+
+        return (
+            f"Player index: {self.hits} hits, {self.fuzzy_hits} fuzzy hits, "
+            f"{self.misses} misses, "
+            f"{self.learned} IDs written back, {len(self.names)} names"
+        )
+
+    def close(self):
+        '''
+        Log the index's counters and close the SQLite file.
+        '''
+
+        log_file.info(self.summary())
+        self.db.close()
+
+def open_player_index(config):
+    '''
+    Open the player index stored in the SQLite file set by PATH in the
+    [PLAYER_INDEX] section of the config file, or
+    {HOME}/cache/juniors_player_index.sqlite by default. The players in the
+    database and response cache are loaded into it by the caller.
+    '''
+
+    path = config.get('PLAYER_INDEX', 'PATH', fallback=None)
+    if not path:
+        path = f"{os.path.expanduser('~')}/cache/juniors_player_index.sqlite"
+
+    # create the index directory if it doesn't exist
+    index_dir = os.path.dirname(path)
+    if index_dir and not os.path.isdir(index_dir):
+        try:
+            os.makedirs(index_dir)
+        except:
+            # couldn't create dir; default to {HOME}/cache
+            index_dir = f"{os.path.expanduser('~')}/cache"
+            path = f"{index_dir}/{os.path.basename(path)}"
+            if not os.path.isdir(index_dir):
+                os.makedirs(index_dir)
+
+    log_file.info(f"Opening player index {path}...")
+    return PlayerIndex(path)
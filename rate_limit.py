@@ -0,0 +1,226 @@
+'''
+
+Description: Per-host request scheduling for the NHL data pull programs.
+
+Every request sent to an outside host (the NHL API, or Google when searching
+for a player's NHL Player ID) waits its turn on that host's limiter first.
+Each limiter has:
+    - a token bucket that caps the rate of requests sent to the host
+    - exponential backoff with jitter for retrying throttled (429) or failed
+      (5xx, timed out) requests, honoring the host's Retry-After header
+    - a circuit breaker that pauses every request to the host for a cooldown
+      once too many requests in a row have failed, rather than letting every
+      worker keep hammering a host that's down
+
+Limits are read in from the [RATE_LIMIT] section of the configuration file,
+and can be overridden for a single host in a [RATE_LIMIT <host>] section.
+'''
+
+__version__ = '1.0'
+__title__ = 'rate_limit'
+
+import time
+import random
+import logging
+import threading
+
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from metrics import count
+
+log_file = logging.getLogger(__name__)
+
+# default limits for every host; keys match the config file settings
+DEFAULT_LIMITS = {
+    'RATE': 10.0,
+    'BURST': 10,
+    'RETRIES': 3,
+    'BACKOFF': 1.0,
+    'BACKOFF_MAX': 60.0,
+    'BREAKER_THRESHOLD': 5,
+    'BREAKER_COOLDOWN': 30.0,
+}
+
+def retry_after(headers):
+    '''
+    Return the number of seconds a host asked us to wait before retrying, from
+    the Retry-After header of its response (either a number of seconds or an
+    HTTP date), or None if it didn't say.
+    '''
+
+    value = headers.get('Retry-After') if headers else None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+def retryable(status):
+    '''
+    Check whether an HTTP status code means the request should be retried:
+    the host is throttling us (429) or failed to handle it (5xx).
+    '''
+
+    return status == 429 or status >= 500
+
+class HostLimiter:
+    '''
+    Rate limit, backoff, and circuit breaker for requests sent to one host.
+
+    host      -> name of the host the limits apply to
+    rate      -> max number of requests per second
+    burst     -> number of requests that can be sent at once after a lull
+    retries   -> number of times a failed request is retried
+    backoff   -> seconds to wait before the first retry; doubles every retry
+    backoff_max       -> longest wait between retries
+    breaker_threshold -> failures in a row that open the circuit breaker
+    breaker_cooldown  -> seconds requests to the host are paused once open
+    '''
+
+    def __init__(self, host, rate, burst, retries, backoff, backoff_max,
+            breaker_threshold, breaker_cooldown):
+        self.host = host
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+
+        self.lock = threading.Lock()
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.failures = 0
+        self.open_until = 0
+
+        # counters reported in the summary
+        self.requests = 0
+        self.throttled = 0
+        self.retried = 0
+        self.trips = 0
+
+    def acquire(self):
+        '''
+        Block until a request can be sent to the host: the circuit breaker
+        isn't open and there's a token in the bucket.
+        '''
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.open_until:
+                    wait = self.open_until - now
+                else:
+                    # refill the bucket for the time since the last request
+                    self.tokens = min(self.burst,
+                        self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        self.requests += 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                    self.throttled += 1
+            count('throttled_waits')
+            time.sleep(wait)
+
+    def success(self):
+        '''
+        Record a request the host handled; closes the circuit breaker.
+        '''
+
+        with self.lock:
+            self.failures = 0
+
+    def failure(self, attempt, wait=None):
+        '''
+        Record a throttled/failed request and return the number of seconds to
+        wait before retrying it.
+
+        attempt -> number of retries already made for the request
+        wait    -> seconds the host asked us to wait (Retry-After), if any
+        '''
+
+        # exponential backoff; the jitter keeps every worker that was
+        # throttled at the same time from retrying at the same time too
+        delay = min(self.backoff_max, self.backoff * 2 ** attempt)
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        if wait is not None:
+            delay = max(delay, wait)
+
+        with self.lock:
+            self.failures += 1
+            self.retried += 1
+            if self.failures >= self.breaker_threshold:
+                # too many failures in a row; pause every request to the host
+                cooldown = max(self.breaker_cooldown, delay)
+                self.open_until = time.monotonic() + cooldown
+                self.failures = 0
+                self.trips += 1
+                log_file.warning(f"Circuit breaker opened for {self.host}..."
+                    f"pausing requests for {cooldown:.0f} seconds...")
+                count('breaker_trips')
+        count('retries')
+
+        return delay
+
+    def summary(self):
+        '''
+        Return a one line summary of the limiter's counters for the log.
+        '''
+
+        return (
+            f"Rate limit for {self.host}: {self.requests} requests, "
+            f"{self.throttled} throttled waits, {self.retried} retries, "
+            f"{self.trips} circuit breaker trips"
+        )
+
+class Scheduler:
+    '''
+    Hands out the limiter for each host requests are sent to, creating them
+    with the host's settings from the configuration file as they're needed.
+    '''
+
+    def __init__(self, config):
+        self.config = config
+        self.defaults = self._limits('RATE_LIMIT', DEFAULT_LIMITS)
+        self.limiters = {}
+        self.lock = threading.Lock()
+
+    def _limits(self, section, fallback):
+        '''
+        Read the limit settings from a section of the config file.
+        '''
+
+        limits = {}
+        for key, value in fallback.items():
+            get = self.config.getint if isinstance(value, int) \
+                else self.config.getfloat
+            limits[key] = get(section, key, fallback=value)
+        return limits
+
+    def host(self, url):
+        '''
+        Return the limiter for the host a URL (or host name) points to.
+        '''
+
+        host = urlsplit(url).hostname or url
+        with self.lock:
+            if host not in self.limiters:
+                limits = self._limits(f"RATE_LIMIT {host}", self.defaults)
+                self.limiters[host] = HostLimiter(host,
+                    **{key.lower(): value for key, value in limits.items()})
+            return self.limiters[host]
+
+    def summary(self):
+        '''
+        Return a summary of every host's counters for the log.
+        '''
+
+        return [limiter.summary() for limiter in self.limiters.values()]
@@ -0,0 +1,330 @@
+'''
+
+Description: Persistent on-disk cache for responses from the NHL's API.
+
+Responses are stored in a local SQLite file keyed by the URL they were pulled
+from. Each response is given a time-to-live based on the API endpoint it came
+from (i.e. a player's yearByYear stats change nightly during the season, but a
+retired player's don't change at all), and stale responses are revalidated
+with the API using their ETag/Last-Modified headers rather than pulled again in
+full. The cache is kept under a maximum size by evicting the least recently
+used responses.
+'''
+
+__version__ = '1.0'
+__title__ = 'response_cache'
+
+import os
+import re
+import json
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+
+from datetime import datetime
+
+log_file = logging.getLogger(__name__)
+
+# default number of seconds a response from each endpoint stays fresh
+DEFAULT_TTLS = {
+    'default': 86400,
+    'teams': 86400,
+    'roster': 3600,
+    'people': 86400,
+    'stats': 3600,
+    'draft': 86400,
+    'prospects': 604800,
+    'historic': 2592000,
+}
+
+def current_season():
+    '''
+    Return the NHL season in progress (or most recently finished) based on
+    today's date - in the same format as the SEASON config setting: '20192020'.
+    '''
+
+    now = datetime.now()
+    # new season starts in the fall
+    if now.month >= 9:
+        return f"{now.year}{now.year + 1}"
+    return f"{now.year - 1}{now.year}"
+
+def endpoint(url):
+    '''
+    Return the name of the NHL API endpoint a URL points to. The name is used
+    to look up the endpoint's TTL from the [CACHE] section of the config file.
+    '''
+
+    if '/draft/prospects' in url:
+        return 'prospects'
+    elif '/draft' in url:
+        return 'draft'
+    elif '/roster' in url:
+        return 'roster'
+    elif '/teams' in url:
+        return 'teams'
+    elif 'stats?stats=' in url:
+        return 'stats'
+    elif '/people' in url:
+        return 'people'
+    return 'default'
+
+class ResponseCache:
+    '''
+    URL-keyed cache of NHL API responses stored in a SQLite file.
+
+    path      -> location of the SQLite file holding the cache
+    max_size  -> max number of bytes of (compressed) responses to keep
+    ttls      -> dict of endpoint name to seconds a response stays fresh
+    season    -> current NHL season; older seasons use the 'historic' TTL
+    '''
+
+    def __init__(self, path, max_size, ttls, season=None):
+        self.path = path
+        self.max_size = max_size
+        self.ttls = dict(DEFAULT_TTLS, **ttls)
+        self.season = season or current_season()
+
+        # hit/miss counters reported when the cache is closed
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.stored = 0
+        self.evictions = 0
+
+        # requests from every fetch engine worker share one connection
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'url TEXT PRIMARY KEY, body BLOB, etag TEXT, last_modified TEXT, '
+            'expires_at REAL, accessed_at REAL, size INTEGER)'
+        )
+        self.db.execute(
+            'CREATE INDEX IF NOT EXISTS responses_accessed '
+            'ON responses (accessed_at)'
+        )
+        self.db.commit()
+        self.size = self.db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses'
+        ).fetchone()[0]
+
+    def lookup(self, url):
+        '''
+        Return the cached entry for a URL as a dict, or None if the URL isn't
+        cached. The entry's 'fresh' key says whether it can be used as is or
+        has to be revalidated with the API first.
+        '''
+
+        now = time.time()
+        with self.lock:
+            row = self.db.execute(
+                'SELECT body, etag, last_modified, expires_at FROM responses '
+                'WHERE url = ?', (url,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            # mark as recently used so it's the last to be evicted
+            self.db.execute(
+                'UPDATE responses SET accessed_at = ? WHERE url = ?',
+                (now, url)
+            )
+            self.db.commit()
+
+            body, etag, last_modified, expires_at = row
+            fresh = expires_at > now
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        return {
+            'data': json.loads(zlib.decompress(body)),
+            'etag': etag,
+            'last_modified': last_modified,
+            'fresh': fresh,
+        }
+
+    def validators(self, entry):
+        '''
+        Return the conditional request headers for revalidating a stale entry.
+        '''
+
+        headers = {}
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, url, data, etag=None, last_modified=None):
+        '''
+        Store a response pulled from the API, replacing any existing entry for
+        that URL.
+        '''
+
+        now = time.time()
+        body = zlib.compress(json.dumps(data).encode())
+        expires_at = now + self.ttl(url, data)
+        with self.lock:
+            old = self.db.execute(
+                'SELECT size FROM responses WHERE url = ?', (url,)
+            ).fetchone()
+            self.db.execute(
+                'INSERT OR REPLACE INTO responses (url, body, etag, '
+                'last_modified, expires_at, accessed_at, size) VALUES '
+                '(?, ?, ?, ?, ?, ?, ?)',
+                (url, body, etag, last_modified, expires_at, now, len(body))
+            )
+            self.size += len(body) - (old[0] if old else 0)
+            self.stored += 1
+            self._evict()
+            self.db.commit()
+
+    def refresh(self, url, data):
+        '''
+        Reset the TTL on an entry the API confirmed hasn't changed (HTTP 304).
+        '''
+
+        expires_at = time.time() + self.ttl(url, data)
+        with self.lock:
+            self.db.execute(
+                'UPDATE responses SET expires_at = ? WHERE url = ?',
+                (expires_at, url)
+            )
+            self.db.commit()
+            self.revalidated += 1
+
+    def scan(self, pattern):
+        '''
+        Yield (url, data) for every cached response whose URL matches a SQL
+        LIKE pattern, fresh or not. Each body is only decompressed when it's
+        reached.
+        '''
+
+        with self.lock:
+            rows = self.db.execute(
+                'SELECT url, body FROM responses WHERE url LIKE ?', (pattern,)
+            ).fetchall()
+        for url, body in rows:
+            yield url, json.loads(zlib.decompress(body))
+
+    def ttl(self, url, data):
+        '''
+        Return the number of seconds a response from a URL stays fresh.
+
+        Responses that only cover past seasons/drafts can't change anymore, so
+        they are given the 'historic' TTL instead of their endpoint's.
+        '''
+
+        name = endpoint(url)
+        if name == 'stats' and self._historic_stats(data):
+            name = 'historic'
+        elif name == 'draft':
+            year = re.search(r'/draft/(\d{4})', url)
+            if year and year.group(1) < self.season[:4]:
+                name = 'historic'
+
+        return self.ttls.get(name, self.ttls['default'])
+
+    def _historic_stats(self, data):
+        '''
+        Check whether a yearByYear stats response has no current season data.
+        '''
+
+        try:
+            splits = data['stats'][0]['splits']
+        except (KeyError, IndexError, TypeError):
+            return False
+        return all(split.get('season', '') < self.season for split in splits)
+
+    def _evict(self):
+        '''
+        Delete least recently used entries until the cache is back under 90%
+        of its max size. Must be called while holding the lock.
+        '''
+
+        if self.size <= self.max_size:
+            return
+
+        target = self.max_size * 0.9
+        rows = self.db.execute(
+            'SELECT url, size FROM responses ORDER BY accessed_at'
+        ).fetchall()
+        for url, size in rows:
+            if self.size <= target:
+                break
+            self.db.execute('DELETE FROM responses WHERE url = ?', (url,))
+            self.size -= size
+            self.evictions += 1
+
+    def summary(self):
+        '''
+        Return a one line summary of the cache's hit/miss counters for the log.
+        '''
+
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0
+        return (
+            f"Response cache: {self.hits} hits, {self.misses} misses "
+            f"({rate:.1f}% hit rate), {self.revalidated} revalidated, "
+            f"{self.stored} stored, {self.evictions} evicted, "
+            f"{self.size / 1048576:.1f} MB on disk"
+        )
+
+    def close(self):
+        '''
+        Log the cache's counters and close the SQLite file.
+        '''
+
+        log_file.info(self.summary())
+        with self.lock:
+            self.db.close()
+
+def open_cache(config):
+    '''
+    Setup the response cache from the [CACHE] section of the configuration
+    file. Returns None if the cache isn't enabled.
+
+    Settings:
+        ENABLED      -> TRUE to cache responses from the NHL API
+        PATH         -> SQLite file the cache is stored in
+        MAX_SIZE_MB  -> max size of the cache before old responses are evicted
+        TTL_<NAME>   -> seconds a response from endpoint <NAME> stays fresh
+    '''
+
+    if not config.getboolean('CACHE', 'ENABLED', fallback=False):
+        return None
+
+    path = config.get('CACHE', 'PATH', fallback=None)
+    if not path:
+        path = f"{os.path.expanduser('~')}/cache/nhl_api.sqlite"
+
+    # create the cache directory if it doesn't exist
+    cache_dir = os.path.dirname(path)
+    if cache_dir and not os.path.isdir(cache_dir):
+        try:
+            os.makedirs(cache_dir)
+        except:
+            # couldn't create dir; default to {HOME}/cache
+            cache_dir = f"{os.path.expanduser('~')}/cache"
+            path = f"{cache_dir}/{os.path.basename(path)}"
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+
+    max_size = config.getfloat('CACHE', 'MAX_SIZE_MB', fallback=500) * 1048576
+    ttls = {}
+    for name in DEFAULT_TTLS:
+        ttl = config.getint('CACHE', f"TTL_{name}", fallback=None)
+        if ttl is not None:
+            ttls[name] = ttl
+    season = config.get('DEFAULT', 'SEASON', fallback=None)
+
+    log_file.info(f"Caching NHL API responses in {path}...")
+    return ResponseCache(path, max_size, ttls, season)
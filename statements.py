@@ -0,0 +1,207 @@
+'''
+
+Description: Registry of the SQL statements run by the NHL data pull programs.
+
+Every select/insert/update the programs run against the database is defined
+once here and executed with bound parameters by nhl_db (never by formatting
+values into the SQL). Statements flagged as hot are run as server-side
+prepared statements, so Postgres only parses and plans them once per
+connection.
+
+The bulk writer builds its upserts from the same table definitions. A batch
+of rows is sent through execute_values(), whose command changes with the
+number of rows, but a single row's upsert (a batch of one row, or the row
+at a time retry of a failed batch) is prepared the same way as the hot
+statements.
+'''
+
+__version__ = '1.0'
+__title__ = 'statements'
+
+# columns and primary key of each table written to by the programs
+TABLES = {
+    'nhl_teams': (
+        ('id', 'name', 'abbreviation', 'conf_id', 'division_id',
+         'franchise_id', 'active'),
+        ('id',)
+    ),
+    'nhl_players': (
+        ('id', 'first_name', 'last_name', 'link', 'dob', 'nationality',
+         'active', 'rookie', 'shoots_catches', 'position_code',
+         'position_name', 'position_type'),
+        ('id',)
+    ),
+    'nhl_team_players': (
+        ('player_id', 'team_id', 'season', 'active', 'sequence'),
+        ('player_id', 'team_id', 'season', 'sequence')
+    ),
+    'nhl_skater_stats': (
+        ('player_id', 'team_id', 'season', 'time_on_ice', 'games', 'assists',
+         'goals', 'pim', 'shots', 'hits', 'pp_goals', 'pp_points', 'pp_toi',
+         'even_toi', 'faceoff_pct', 'shot_pct', 'gw_goals', 'ot_goals',
+         'sh_goals', 'sh_points', 'sh_toi', 'blocked_shots', 'plus_minus',
+         'points', 'shifts', 'sequence', 'toi_seconds', 'pp_toi_seconds',
+         'even_toi_seconds', 'sh_toi_seconds'),
+        ('player_id', 'team_id', 'season', 'sequence')
+    ),
+    'nhl_goalie_stats': (
+        ('player_id', 'team_id', 'season', 'time_on_ice', 'games', 'starts',
+         'wins', 'losses', 'ties', 'ot_wins', 'shutouts', 'saves',
+         'pp_saves', 'sh_saves', 'even_saves', 'pp_shots', 'sh_shots',
+         'even_shots', 'save_pct', 'gaa', 'shots_against', 'goals_against',
+         'pp_save_pct', 'sh_save_pct', 'even_save_pct', 'sequence',
+         'toi_seconds'),
+        ('player_id', 'team_id', 'season', 'sequence')
+    ),
+    'nhl_draft': (
+        ('nhl_player_id', 'draft_year', 'overall_pick', 'round_number',
+         'round_pick', 'team_id', 'prospect_id', 'first_name', 'last_name',
+         'dob', 'country', 'shoots', 'position', 'match_confidence'),
+        ('nhl_player_id',)
+    ),
+    'junior_skater_stats': (
+        ('player_id', 'season', 'league', 'games', 'goals', 'assists',
+         'points', 'pp_goals', 'gw_goals', 'sh_goals', 'faceoff_pct',
+         'time_on_ice', 'pp_toi', 'sh_toi', 'even_toi', 'plus_minus', 'pim',
+         'sequence', 'toi_seconds', 'pp_toi_seconds', 'sh_toi_seconds',
+         'even_toi_seconds'),
+        ('player_id', 'season', 'sequence')
+    ),
+    'junior_goalie_stats': (
+        ('player_id', 'season', 'league', 'games', 'wins', 'losses', 'ties',
+         'ot_wins', 'shutouts', 'goals_against', 'gaa', 'shots_against',
+         'saves', 'save_pct', 'sequence'),
+        ('player_id', 'season', 'sequence')
+    ),
+    'nhl_sync_state': (
+        ('player_id', 'historic_hash', 'current_hash', 'complete',
+         'last_season', 'synced_at'),
+        ('player_id',)
+    ),
+}
+
+# 'MM:SS' time on ice columns -> integer seconds column stored alongside them
+TOI_SECONDS = {
+    'time_on_ice': 'toi_seconds',
+    'pp_toi': 'pp_toi_seconds',
+    'sh_toi': 'sh_toi_seconds',
+    'even_toi': 'even_toi_seconds',
+}
+
+# name -> (SQL with %s placeholders, whether to PREPARE it server-side)
+STATEMENTS = {
+    # nhl_data_pull.py
+    'select_teams': (
+        'SELECT id, name FROM nhl_teams', False
+    ),
+    'select_teams_by_id': (
+        'SELECT id, name FROM nhl_teams WHERE id = ANY(%s)', False
+    ),
+    'select_team_ids': (
+        'SELECT id FROM nhl_teams', False
+    ),
+    'select_skaters': (
+        "SELECT DISTINCT player_id FROM nhl_team_players "
+        "INNER JOIN nhl_players ON nhl_team_players.player_id = "
+        "nhl_players.id WHERE nhl_players.position_code != 'G'", False
+    ),
+    'select_goalies': (
+        "SELECT DISTINCT player_id FROM nhl_team_players "
+        "INNER JOIN nhl_players ON nhl_team_players.player_id = "
+        "nhl_players.id WHERE nhl_players.position_code = 'G'", False
+    ),
+    'select_skaters_incremental': (
+        "SELECT DISTINCT player_id FROM nhl_team_players "
+        "INNER JOIN nhl_players ON nhl_team_players.player_id = "
+        "nhl_players.id LEFT JOIN nhl_sync_state ON "
+        "nhl_team_players.player_id = nhl_sync_state.player_id "
+        "WHERE nhl_players.position_code != 'G' AND ("
+        "nhl_sync_state.player_id IS NULL OR NOT nhl_sync_state.complete "
+        "OR nhl_team_players.season = %s)", False
+    ),
+    'select_goalies_incremental': (
+        "SELECT DISTINCT player_id FROM nhl_team_players "
+        "INNER JOIN nhl_players ON nhl_team_players.player_id = "
+        "nhl_players.id LEFT JOIN nhl_sync_state ON "
+        "nhl_team_players.player_id = nhl_sync_state.player_id "
+        "WHERE nhl_players.position_code = 'G' AND ("
+        "nhl_sync_state.player_id IS NULL OR NOT nhl_sync_state.complete "
+        "OR nhl_team_players.season = %s)", False
+    ),
+    'select_sync_state': (
+        'SELECT player_id, historic_hash, current_hash FROM nhl_sync_state '
+        'WHERE player_id = ANY(%s)', False
+    ),
+
+    # juniors_data_pull.py
+    'select_player_ids': (
+        'SELECT id FROM nhl_players WHERE id = ANY(%s)', True
+    ),
+    'select_draft_picks': (
+        'SELECT overall_pick, nhl_player_id FROM nhl_draft '
+        'WHERE draft_year = %s AND overall_pick = ANY(%s)', True
+    ),
+    'select_player_names': (
+        'SELECT id, first_name, last_name, dob FROM nhl_players', False
+    ),
+    'select_draft_names': (
+        'SELECT nhl_player_id, first_name, last_name, dob, draft_year '
+        'FROM nhl_draft', False
+    ),
+    'select_junior_sequences': (
+        'SELECT player_id, season, sequence, league FROM junior_skater_stats '
+        'WHERE player_id = ANY(%s) UNION ALL '
+        'SELECT player_id, season, sequence, league FROM junior_goalie_stats '
+        'WHERE player_id = ANY(%s)', True
+    ),
+}
+
+def upsert(table, update=None):
+    '''
+    Build the INSERT ... ON CONFLICT command for a table, with a single VALUES
+    %s placeholder to be expanded by psycopg2's execute_values().
+
+    update -> columns to overwrite when a row's key already exists in the
+              table. Defaults to every non-key column; an empty tuple leaves
+              existing rows as they are (ON CONFLICT DO NOTHING).
+    '''
+
+    columns, key = TABLES[table]
+    if update is None:
+        update = [col for col in columns if col not in key]
+
+    if update:
+        conflict = 'DO UPDATE SET ' + ', '.join(
+            f"{col} = EXCLUDED.{col}" for col in update
+        )
+    else:
+        conflict = 'DO NOTHING'
+
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s "
+        f"ON CONFLICT ({', '.join(key)}) {conflict}"
+    )
+
+def upsert_row(table, update=None):
+    '''
+    Build the same INSERT ... ON CONFLICT command as upsert() for a single
+    row, with a %s placeholder per column. Unlike upsert()'s command, its
+    number of parameters never changes, so it can be PREPAREd.
+    '''
+
+    columns, _ = TABLES[table]
+    placeholders = ', '.join(['%s'] * len(columns))
+    return upsert(table, update).replace('VALUES %s',
+        f"VALUES ({placeholders})")
+
+def positional(cmd):
+    '''
+    Convert a statement's %s placeholders to the $1, $2, ... parameters used
+    by PREPARE.
+    '''
+
+    parts = cmd.split('%s')
+    converted = parts[0]
+    for i, part in enumerate(parts[1:], start=1):
+        converted += f"${i}{part}"
+    return converted
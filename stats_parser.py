@@ -0,0 +1,275 @@
+'''
+
+Description: Parse NHL players' yearByYear stats into database rows.
+
+Turning a player's yearByYear splits into rows for the team_players and
+skater/goalie stats tables is pure dict walking, so it's kept apart from the
+network and database code in nhl_data_pull.py. Everything a parse needs is
+passed in as arguments and everything it produces (rows, sync state, and
+seasons that had to be skipped) is handed back, so players can be parsed on
+the main thread or fanned out to a pool of worker processes that feed the
+single database writer.
+
+The pool is setup from the [PARSE] section of the configuration file.
+'''
+
+__version__ = '1.0'
+__title__ = 'stats_parser'
+
+import json
+import hashlib
+import logging
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+log_file = logging.getLogger(__name__)
+
+NHL = 'National Hockey League'
+
+def payload_hash(seasons):
+    '''
+    Hash a list of season data from the NHL API so it can be compared against
+    the data pulled in a later run.
+    '''
+
+    payload = json.dumps(seasons, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def toi_seconds(toi):
+    '''
+    Convert a time on ice total in the API's 'MM:SS' format (minutes can run
+    past 59, i.e. '1234:56') to a number of seconds. Returns None for missing
+    or malformed values.
+    '''
+
+    if not toi:
+        return None
+    try:
+        minutes, seconds = toi.strip().split(':')
+        return int(minutes) * 60 + int(seconds)
+    except (AttributeError, ValueError):
+        return None
+
+def changed_seasons(player, nhl_years, last_hashes, current_season):
+    '''
+    Given a player's NHL seasons and the (historic_hash, current_hash) stored
+    at their last sync, return the (season, sequence) of each season whose
+    data has changed since then, along with the player's new sync state record.
+
+    Past seasons are hashed separately from the current season, so once
+    they've been synced they're skipped until the NHL changes their data.
+    A player without any current season data is marked complete; only players
+    on a current roster are pulled for them again in incremental mode.
+    '''
+
+    historic = [year for year in nhl_years if year['season'] < current_season]
+    current = [year for year in nhl_years if year['season'] >= current_season]
+    historic_hash = payload_hash(historic)
+    current_hash = payload_hash(current)
+
+    changed = set()
+    if historic_hash != last_hashes[0]:
+        changed.update((year['season'], year['sequenceNumber'])
+            for year in historic)
+    if current_hash != last_hashes[1]:
+        changed.update((year['season'], year['sequenceNumber'])
+            for year in current)
+
+    last_season = nhl_years[-1]['season'] if nhl_years else None
+    state = (player, historic_hash, current_hash, not current, last_season,
+        datetime.now())
+
+    return changed, state
+
+def skater_row(player_id, year):
+    '''
+    Return the nhl_skater_stats row for one of a skater's NHL seasons.
+    '''
+
+    stat = year['stat']
+    return (player_id, year['team']['id'], year['season'], stat['timeOnIce'],
+        stat['games'], stat['assists'], stat['goals'], stat['pim'],
+        stat['shots'], stat['hits'], stat['powerPlayGoals'],
+        stat['powerPlayPoints'], stat['powerPlayTimeOnIce'],
+        stat['evenTimeOnIce'], stat['faceOffPct'], stat['shotPct'],
+        stat['gameWinningGoals'], stat['overTimeGoals'],
+        stat['shortHandedGoals'], stat['shortHandedPoints'],
+        stat['shortHandedTimeOnIce'], stat['blocked'], stat['plusMinus'],
+        stat['points'], stat['shifts'], year['sequenceNumber'],
+        toi_seconds(stat['timeOnIce']),
+        toi_seconds(stat['powerPlayTimeOnIce']),
+        toi_seconds(stat['evenTimeOnIce']),
+        toi_seconds(stat['shortHandedTimeOnIce']))
+
+def goalie_row(player_id, year):
+    '''
+    Return the nhl_goalie_stats row for one of a goalie's NHL seasons.
+    '''
+
+    stat = year['stat']
+    season = year['season']
+
+    # pre 2005-2006 OT games could end in ties & OT wins weren't tracked
+    if season < '20052006':
+        ties = stat['ties']
+        ot_wins = None
+    else:
+        ties = None
+        ot_wins = stat['ot']
+
+    # individual save_pcts aren't saved if corresponding shot count is 0
+    pp_save_pct = 0
+    if stat['powerPlayShots'] != 0:
+        pp_save_pct = stat['powerPlaySavePercentage']
+    sh_save_pct = 0
+    if stat['shortHandedShots'] != 0:
+        sh_save_pct = stat['shortHandedSavePercentage']
+    even_save_pct = 0
+    if stat['evenShots'] != 0:
+        even_save_pct = stat['evenStrengthSavePercentage']
+
+    return (player_id, year['team']['id'], season, stat['timeOnIce'],
+        stat['games'], stat['gamesStarted'], stat['wins'], stat['losses'],
+        ties, ot_wins, stat['shutouts'], stat['saves'],
+        stat['powerPlaySaves'], stat['shortHandedSaves'], stat['evenSaves'],
+        stat['powerPlayShots'], stat['shortHandedShots'], stat['evenShots'],
+        stat['savePercentage'], stat['goalAgainstAverage'],
+        stat['shotsAgainst'], stat['goalsAgainst'], pp_save_pct,
+        sh_save_pct, even_save_pct, year['sequenceNumber'],
+        toi_seconds(stat['timeOnIce']))
+
+STAT_ROWS = {'skater': skater_row, 'goalie': goalie_row}
+
+def parse_player(kind, player_id, year_stats, last_hashes, current_season,
+        team_ids, incremental):
+    '''
+    Parse a player's yearByYear stats dataset into the rows to write for them.
+
+    kind        -> 'skater' or 'goalie'
+    last_hashes -> (historic_hash, current_hash) from the player's last sync
+    team_ids    -> IDs of the teams in nhl_teams; seasons with any other team
+                   can't be stored b/c of foreign key references
+    incremental -> only return rows for seasons that changed since last sync
+
+    Returns a dict with the number of NHL seasons found, the number changed
+    since the last sync, the player's new sync state record, the list of
+    (team_players row, stats row) pairs to write, the (team_id, season) of
+    each season skipped b/c its team isn't in the database, and the (season,
+    error) of each season whose stats couldn't be parsed.
+
+    The sync state is None if any season was skipped or couldn't be parsed,
+    so the player's last sync state is left as is and those seasons are
+    tried again next run.
+    '''
+
+    # remove copyright statement
+    for key in year_stats.keys():
+        if key == 'stats':
+            year_stats = year_stats[key][0]['splits']
+
+    # keep only seasons with actual NHL data
+    # i.e. ignore Junior Hockey data for now
+    nhl_years = [year for year in year_stats if year['league']['name'] == NHL]
+
+    # compare against the player's last sync to see what's changed
+    changed, state = changed_seasons(
+        player_id, nhl_years, last_hashes, current_season
+    )
+
+    rows = []
+    skipped = []
+    failed = []
+    # parse out specific data we need for the database for each NHL year
+    for i, year in enumerate(nhl_years):
+        season = year['season']
+        sequence = year['sequenceNumber']
+        if incremental and (season, sequence) not in changed:
+            # unchanged since last sync; nothing to rewrite
+            continue
+
+        # correctly set active to handle edge case of players that are
+        # traded/reassigned mid-season; only their last NHL season can be
+        # active, and only if it's the current season
+        active = i == len(nhl_years) - 1 and season == current_season
+
+        team_id = year['team']['id']
+        if team_id not in team_ids:
+            # teams that no longer exist aren't stored in nhl_teams
+            skipped.append((team_id, season))
+            continue
+
+        try:
+            stats = STAT_ROWS[kind](player_id, year)
+        except (KeyError, TypeError, AttributeError) as e:
+            # missing or malformed stats for the season
+            failed.append((season, repr(e)))
+            continue
+
+        rows.append((
+            (player_id, team_id, season, active, sequence),
+            stats,
+        ))
+
+    if skipped or failed:
+        state = None
+
+    return {
+        'seasons': len(nhl_years),
+        'changed': len(changed),
+        'state': state,
+        'rows': rows,
+        'skipped': skipped,
+        'failed': failed,
+    }
+
+def parse_players(tasks, workers=0, max_pending=64, executor='PROCESS'):
+    '''
+    Yield the result of parse_player() for each tuple of arguments in tasks,
+    in order.
+
+    workers     -> number of worker processes/threads to parse with; 0 parses
+                   each player on the calling thread as it's pulled
+    max_pending -> max number of players handed to the pool but not yet
+                   taken by the caller; bounds memory and keeps the pool from
+                   running too far ahead of the database writer
+    executor    -> 'PROCESS' for a process pool, or 'THREAD' for a thread pool
+                   on Python builds without the GIL
+    '''
+
+    if workers <= 0:
+        for task in tasks:
+            yield parse_player(*task)
+        return
+
+    pool_class = ThreadPoolExecutor
+    if executor.upper() == 'PROCESS':
+        pool_class = ProcessPoolExecutor
+    log_file.info(f"Parsing stats with {workers} {executor.lower()} "
+        f"workers...")
+
+    with pool_class(max_workers=workers) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(parse_player, *task))
+            if len(pending) >= max_pending:
+                # wait on the oldest player before handing out any more
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def parse_settings(config):
+    '''
+    Read the parse pool settings from the [PARSE] section of the
+    configuration file:
+        WORKERS     -> number of workers to parse stats with (0 = no pool)
+        MAX_PENDING -> max number of players queued up for the writer
+        EXECUTOR    -> PROCESS or THREAD
+    '''
+
+    return {
+        'workers': config.getint('PARSE', 'WORKERS', fallback=0),
+        'max_pending': config.getint('PARSE', 'MAX_PENDING', fallback=64),
+        'executor': config.get('PARSE', 'EXECUTOR', fallback='PROCESS'),
+    }
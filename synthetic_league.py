@@ -0,0 +1,256 @@
+'''
+
+Description: Generate a synthetic NHL league for benchmarking.
+
+Builds every NHL API response the data pull programs consume - teams, team
+rosters, player profiles, yearByYear stats, an Entry Draft, and its prospect
+profiles - for a made up league of a configurable size, keyed by the path
+(and query string) each one is requested from. The responses are in the same
+JSON shapes as the NHL API's, so benchmark.py can serve them from a local stub
+server and run both programs against them unchanged.
+'''
+
+__version__ = '1.0'
+__title__ = 'synthetic_league'
+
+import random
+
+API = '/api/v1'
+NHL = 'National Hockey League'
+JUNIOR_LEAGUES = ('OHL', 'WHL', 'QMJHL', 'USHL')
+
+SKATER_STATS = ('assists', 'goals', 'pim', 'shots', 'hits', 'powerPlayGoals',
+    'powerPlayPoints', 'gameWinningGoals', 'overTimeGoals',
+    'shortHandedGoals', 'shortHandedPoints', 'blocked', 'plusMinus', 'points',
+    'shifts')
+SKATER_TOI = ('timeOnIce', 'powerPlayTimeOnIce', 'evenTimeOnIce',
+    'shortHandedTimeOnIce')
+GOALIE_STATS = ('gamesStarted', 'wins', 'losses', 'shutouts', 'saves',
+    'powerPlaySaves', 'shortHandedSaves', 'evenSaves', 'powerPlayShots',
+    'shortHandedShots', 'evenShots', 'shotsAgainst', 'goalsAgainst')
+
+def _season(year):
+    '''
+    Return the season starting in a year in the API's format: '20192020'.
+    '''
+
+    return f"{year}{year + 1}"
+
+def _toi(rng):
+    '''
+    Return a random time on ice total in the API's 'MMMM:SS' format.
+    '''
+
+    return f"{rng.randint(0, 1500)}:{rng.randint(0, 59):02d}"
+
+def _stat(rng, goalie, league):
+    '''
+    Return a random season stat line for a skater or goalie.
+    '''
+
+    stat = {'games': rng.randint(1, 82)}
+    if goalie:
+        stat.update({key: rng.randint(0, 1500) for key in GOALIE_STATS})
+        stat['timeOnIce'] = _toi(rng)
+        stat['ties'] = rng.randint(0, 5)
+        stat['ot'] = rng.randint(0, 5)
+        stat['savePercentage'] = round(rng.uniform(0.85, 0.93), 3)
+        stat['goalAgainstAverage'] = round(rng.uniform(2.0, 3.5), 2)
+        stat['powerPlaySavePercentage'] = round(rng.uniform(80, 90), 2)
+        stat['shortHandedSavePercentage'] = round(rng.uniform(80, 95), 2)
+        stat['evenStrengthSavePercentage'] = round(rng.uniform(88, 93), 2)
+    else:
+        stat.update({key: rng.randint(0, 300) for key in SKATER_STATS})
+        stat.update({key: _toi(rng) for key in SKATER_TOI})
+        stat['faceOffPct'] = round(rng.uniform(0, 60), 2)
+        stat['shotPct'] = round(rng.uniform(0, 20), 1)
+    return stat
+
+class League:
+    '''
+    Synthetic league of NHL teams, players, and an Entry Draft.
+
+    teams          -> number of NHL teams
+    roster         -> number of players on each team's current roster
+    seasons        -> number of NHL seasons each rostered player has played
+    junior_seasons -> number of junior seasons each player played before that
+    rounds         -> number of rounds in the Entry Draft
+    season         -> current NHL season, i.e. '20192020'
+    draft_year     -> year of the Entry Draft, i.e. '2015'
+    probe_share    -> share of draft picks whose prospect profile is missing
+                      an NHL Player ID, so it has to be found from the
+                      previous pick
+    seed           -> random seed; the same settings and seed always
+                      generate the same league
+    '''
+
+    def __init__(self, teams=32, roster=25, seasons=5, junior_seasons=3,
+            rounds=7, season='20192020', draft_year='2015', probe_share=0.1,
+            seed=0):
+        self.rng = random.Random(seed)
+        self.season = season
+        self.draft_year = draft_year
+        self.responses = {}
+        self.team_names = {}
+
+        self._teams(teams)
+        self._rosters(roster, seasons, junior_seasons)
+        self._draft(rounds, junior_seasons, probe_share)
+
+    def _teams(self, teams):
+        '''
+        Generate the teams endpoint.
+        '''
+
+        team_list = []
+        for team_id in range(1, teams + 1):
+            name = f"Synthetic Team {team_id}"
+            self.team_names[team_id] = name
+            team_list.append({
+                'id': team_id,
+                'name': name,
+                'abbreviation': f"T{team_id:02d}",
+                'conference': {'id': team_id % 2 + 5},
+                'division': {'id': team_id % 4 + 15},
+                'franchise': {'franchiseId': team_id},
+                'active': True,
+            })
+        self.responses[f"{API}/teams"] = {'teams': team_list}
+
+    def _player(self, player_id, goalie, splits):
+        '''
+        Generate a player's profile and yearByYear stats endpoints.
+        '''
+
+        first, last = f"Player{player_id}", f"Surname{player_id}"
+        link = f"{API}/people/{player_id}"
+        position = ('G', 'Goalie', 'Goalie') if goalie else \
+            self.rng.choice((('C', 'Center', 'Forward'),
+                ('D', 'Defenseman', 'Defenseman')))
+        self.responses[link] = {'people': [{
+            'id': player_id,
+            'fullName': f"{first} {last}",
+            'firstName': first,
+            'lastName': last,
+            'link': link,
+            'birthDate': f"{self.rng.randint(1980, 2000)}-01-01",
+            'nationality': 'CAN',
+            'birthCountry': 'CAN',
+            'active': True,
+            'rookie': False,
+            'shootsCatches': self.rng.choice(('L', 'R')),
+            'primaryPosition': dict(zip(('abbreviation', 'name', 'type'),
+                position)),
+        }]}
+        self.responses[f"{link}/stats?stats=yearByYear"] = {
+            'stats': [{'splits': splits}]
+        }
+
+    def _splits(self, goalie, nhl_seasons, junior_seasons, last_year,
+            team_id=None):
+        '''
+        Generate a player's yearByYear splits: junior seasons followed by NHL
+        seasons ending in last_year, the last of them with team_id.
+        '''
+
+        splits = []
+        first_year = last_year - nhl_seasons - junior_seasons + 1
+        for i in range(junior_seasons + nhl_seasons):
+            year = first_year + i
+            if i < junior_seasons:
+                league = self.rng.choice(JUNIOR_LEAGUES)
+                team = {'name': f"{league} Team"}
+            else:
+                league = NHL
+                if i == junior_seasons + nhl_seasons - 1 and team_id:
+                    tid = team_id
+                else:
+                    tid = self.rng.choice(list(self.team_names))
+                team = {'id': tid, 'name': self.team_names[tid]}
+            splits.append({
+                'season': _season(year),
+                'sequenceNumber': i + 1,
+                'league': {'name': league},
+                'team': team,
+                'stat': _stat(self.rng, goalie, league),
+            })
+        return splits
+
+    def _rosters(self, roster, seasons, junior_seasons):
+        '''
+        Generate each team's current roster and its players.
+        '''
+
+        current_year = int(self.season[:4])
+        player_id = 8470000
+        for team_id in self.team_names:
+            players = []
+            for i in range(roster):
+                player_id += 1
+                # two goalies per team
+                goalie = i < 2
+                self._player(player_id, goalie, self._splits(
+                    goalie, seasons, junior_seasons, current_year, team_id))
+                players.append(
+                    {'person': {'link': f"{API}/people/{player_id}"}}
+                )
+            self.responses[f"{API}/teams/{team_id}/roster"] = {
+                'roster': players
+            }
+
+    def _draft(self, rounds, junior_seasons, probe_share):
+        '''
+        Generate the Entry Draft, its prospects, and the drafted players.
+        Drafted players' IDs are in order of the picks, the same way the
+        draft pull expects when it has to work out an ID from the one before.
+        '''
+
+        draft_year = int(self.draft_year)
+        player_id = 8480000
+        prospect_id = 90000
+        overall = 0
+        draft_rounds = []
+        for rnd in range(1, rounds + 1):
+            picks = []
+            for pick, team_id in enumerate(self.team_names, 1):
+                overall += 1
+                player_id += 1
+                prospect_id += 1
+                goalie = self.rng.random() < 0.1
+                self._player(player_id, goalie, self._splits(
+                    goalie, 0, junior_seasons, draft_year - 1))
+
+                link = f"{API}/draft/prospects/{prospect_id}"
+                nhl_id = player_id
+                if overall > 1 and self.rng.random() < probe_share:
+                    nhl_id = None
+                self.responses[link] = {'prospects': [{
+                    'id': prospect_id, 'nhlPlayerId': nhl_id,
+                }]}
+                picks.append({
+                    'round': str(rnd),
+                    'pickInRound': pick,
+                    'pickOverall': overall,
+                    'team': {'id': team_id,
+                        'name': self.team_names[team_id]},
+                    'prospect': {'id': prospect_id,
+                        'fullName': f"Player{player_id} Surname{player_id}",
+                        'link': link},
+                })
+            draft_rounds.append({'round': str(rnd), 'picks': picks})
+
+        self.responses[f"{API}/draft/{self.draft_year}"] = {
+            'drafts': [{'draftYear': draft_year, 'rounds': draft_rounds}]
+        }
+
+    def summary(self):
+        '''
+        Return a one line description of the league's size.
+        '''
+
+        players = sum(1 for path in self.responses
+            if path.startswith(f"{API}/people/") and '/stats' not in path)
+        return (
+            f"{len(self.team_names)} teams, {players} players, "
+            f"{len(self.responses)} API responses"
+        )
@@ -0,0 +1,27 @@
+'''
+
+Description: Unit tests for the --seasons/--drafts range parsing in
+backfill.py.
+'''
+
+import argparse
+import pytest
+
+from backfill import season_range, draft_range
+
+def test_season_range_expands_a_range():
+    assert season_range('20172018-20192020') == [
+        '20172018', '20182019', '20192020']
+
+def test_season_list_is_sorted_without_duplicates():
+    assert season_range('20152016,20102011-20112012,20102011') == [
+        '20102011', '20112012', '20152016']
+
+@pytest.mark.parametrize('text', ['20102012', '2010-2011', '20112012-20102011',
+    '20102011-20112012-20122013'])
+def test_invalid_season_ranges_are_rejected(text):
+    with pytest.raises(argparse.ArgumentTypeError):
+        season_range(text)
+
+def test_draft_range():
+    assert draft_range('2005-2007,2010') == ['2005', '2006', '2007', '2010']
@@ -0,0 +1,109 @@
+'''
+
+Description: Unit tests for finding draft picks' NHL Player IDs from the
+previous picks in juniors_data_pull.py.
+'''
+
+import logging
+import pytest
+import juniors_data_pull
+
+from juniors_data_pull import _previous_pick_ids, _candidate_ids
+
+class FakeIndex:
+    '''
+    Player index that records the IDs written back to it.
+    '''
+
+    def __init__(self):
+        self.learned = {}
+
+    def learn(self, name, player_id, dob=None, draft_year=None,
+            source='lookup'):
+        self.learned[name] = player_id
+
+@pytest.fixture
+def draft(monkeypatch):
+    '''
+    Serve NHL Player Profiles from a dict of player ID -> (name, DOB) and
+    stored draft picks from a dict of overall pick -> NHL Player ID.
+    '''
+
+    players = {}
+    stored = {}
+    requested = []
+
+    def request_batch(links):
+        requested.append(links)
+        profiles = []
+        for link in links:
+            player_id = int(link.split('/')[-1])
+            name, dob = players.get(player_id, (None, None))
+            profiles.append({'people': [{'fullName': name, 'birthDate': dob}]}
+                if name else {})
+        return profiles
+
+    def sql_select(conn, name, params=(), fetchall=False):
+        return [(pick, stored[pick]) for pick in params[1] if pick in stored]
+
+    monkeypatch.setattr(juniors_data_pull, 'request_batch', request_batch)
+    monkeypatch.setattr(juniors_data_pull, 'sql_select', sql_select)
+    monkeypatch.setattr(juniors_data_pull, 'player_index', FakeIndex(),
+        raising=False)
+    monkeypatch.setattr(juniors_data_pull, 'db_connect', None, raising=False)
+    monkeypatch.setattr(juniors_data_pull, 'log_file',
+        logging.getLogger('juniors_data_pull'), raising=False)
+    monkeypatch.setattr(juniors_data_pull, 'nhl_players', 'people',
+        raising=False)
+    return players, stored, requested
+
+def test_candidates_are_in_the_order_they_were_checked():
+    known = {4: 100, 3: 98, 2: 97}
+    assert _candidate_ids(5, known) == [101, 99, 100, 98]
+
+def test_consecutive_unresolved_picks_chain_off_each_other(draft):
+    players, _, requested = draft
+    names = {5: 'Alpha Skater', 6: 'Bravo Skater', 7: 'Charlie Skater',
+        8: 'Delta Skater'}
+    for overall_pick, name in names.items():
+        players[95 + overall_pick] = (name, None)
+
+    found = _previous_pick_ids('2015', names, {4: 99}, {}, {})
+
+    assert {pick: player_id for pick, (player_id, _) in found.items()} == {
+        5: 100, 6: 101, 7: 102, 8: 103}
+    # every pick waits on the pick before it
+    assert len(requested) == 4
+
+def test_unrelated_unresolved_picks_are_requested_together(draft):
+    players, _, requested = draft
+    players[101] = ('Alpha Skater', None)
+    players[201] = ('Bravo Skater', None)
+
+    found = _previous_pick_ids('2015', {5: 'Alpha Skater',
+        20: 'Bravo Skater'}, {4: 100, 19: 200}, {}, {})
+
+    assert found[5][0] == 101 and found[20][0] == 201
+    assert len(requested) == 1
+
+def test_stored_id_of_an_unresolved_pick_is_a_candidate_source(draft):
+    players, stored, _ = draft
+    # pick 5 was stored by an earlier run but can't be found again
+    stored[5] = 100
+    players[101] = ('Bravo Skater', None)
+
+    found = _previous_pick_ids('2015', {5: 'Alpha Skater',
+        6: 'Bravo Skater'}, {}, {}, {})
+
+    assert 5 not in found
+    assert found[6][0] == 101
+
+def test_dob_mismatch_rules_out_a_candidate(draft):
+    players, _, _ = draft
+    players[101] = ('Alpha Skater', '1997-01-01')
+    players[102] = ('Alpha Skater', '1998-02-02')
+
+    found = _previous_pick_ids('2015', {6: 'Alpha Skater'}, {5: 100, 4: 100},
+        {6: '1998-02-02'}, {})
+
+    assert found[6][0] == 102
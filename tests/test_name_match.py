@@ -0,0 +1,36 @@
+'''
+
+Description: Unit tests for the fuzzy name matching in name_match.py.
+'''
+
+from name_match import (normalize_name, phonetic, confidence, NameIndex,
+    MATCH, REVIEW)
+
+def test_normalize_name_folds_accents_and_punctuation():
+    assert normalize_name('Jean-Sébastien Giguère') == 'jean sebastien giguere'
+    assert normalize_name("Ryan O'Reilly") == 'ryan o reilly'
+
+def test_transliterated_first_name_matches():
+    assert phonetic('aleksandr') == phonetic('alexander')
+    assert confidence('Aleksandr Barkov', 'Alexander Barkov') >= MATCH
+
+def test_same_name_is_certain():
+    assert confidence('Oliver Ekman-Larsson', 'Oliver Ekman Larsson') == 1.0
+
+def test_dob_rules_out_or_raises_confidence():
+    name, other = 'Alex Ovechkin', 'Alexander Ovechkin'
+    assert confidence(name, other, '1985-09-17', '1985-09-17') > \
+        confidence(name, other)
+    assert confidence(name, other, '1985-09-17', '1986-09-17') == 0.0
+
+def test_different_players_score_below_review():
+    assert confidence('Sidney Crosby', 'Nathan MacKinnon') < REVIEW
+
+def test_index_best_skips_ties():
+    index = NameIndex()
+    index.add('Jordan Staal', 1)
+    index.add('Jordan Staal', 2)
+    index.add('Marc Staal', 3)
+
+    assert index.best('Marc Staal') == (3, 1.0)
+    assert index.best('Jordan Staal')[0] is None
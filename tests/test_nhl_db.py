@@ -0,0 +1,226 @@
+'''
+
+Description: Unit tests for the bulk writer in nhl_db.py.
+
+The writer is run against a fake connection that keeps the rows written to it
+in memory, so no database is needed. A row fails to write if its table and
+first key column (i.e. player ID) were marked bad on the connection.
+'''
+
+import pytest
+import nhl_db
+
+from psycopg2.extensions import (TRANSACTION_STATUS_IDLE,
+    TRANSACTION_STATUS_INTRANS)
+
+from nhl_db import BulkWriter
+from statements import TABLES
+
+class FakeCursor:
+    '''
+    Cursor that hands INSERT/COPY rows to its fake connection.
+    '''
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, cmd, params=None):
+        self.conn.log.append(cmd)
+        if cmd.startswith('INSERT'):
+            self.insert(cmd, [params])
+        elif cmd.startswith('SAVEPOINT'):
+            self.conn.savepoints.append(len(self.conn.pending))
+        elif cmd.startswith('RELEASE'):
+            self.conn.savepoints.pop()
+        elif cmd.startswith('ROLLBACK TO'):
+            del self.conn.pending[self.conn.savepoints.pop():]
+        elif cmd.startswith('SELECT') and self.conn.fail_select:
+            raise Exception('select failed')
+
+    def insert(self, cmd, rows):
+        table = cmd.split()[2]
+        for row in rows:
+            if (table, row[0]) in self.conn.bad:
+                raise Exception(f"bad row {row}")
+        self.conn.pending.extend((table, row) for row in rows)
+
+    def copy_expert(self, cmd, buffer):
+        table = cmd.split()[1]
+        rows = [tuple(int(value) if value.isdigit() else value
+            for value in line.split('\t'))
+            for line in buffer.read().splitlines()]
+        self.insert(f"INSERT INTO {table}", rows)
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    '''
+    Connection that keeps its uncommitted and committed rows in memory.
+
+    bad -> (table, first key column) of the rows that fail to write
+    '''
+
+    def __init__(self, bad=()):
+        self.bad = set(bad)
+        self.log = []
+        self.pending = []
+        self.committed = []
+        self.savepoints = []
+        self.fail_commit = False
+        self.fail_select = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        if self.fail_commit:
+            self.fail_commit = False
+            raise Exception('commit failed')
+        self.committed.extend(self.pending)
+        self.pending = []
+        self.savepoints = []
+
+    def rollback(self):
+        self.pending = []
+        self.savepoints = []
+
+    def get_transaction_status(self):
+        if self.pending:
+            return TRANSACTION_STATUS_INTRANS
+        return TRANSACTION_STATUS_IDLE
+
+    def rows(self, table):
+        return [row[0] for name, row in self.committed if name == table]
+
+class FakeQueue:
+    '''
+    Work queue that records the units marked done/failed.
+    '''
+
+    def __init__(self):
+        self.done = []
+        self.failed = []
+
+    def complete(self, units):
+        self.done.extend(units)
+
+    def fail(self, units):
+        self.failed.extend(units)
+
+def row(table, player_id):
+    '''
+    Return a row for a table with the player ID as its first column.
+    '''
+
+    return (player_id,) + (None,) * (len(TABLES[table][0]) - 1)
+
+@pytest.fixture(autouse=True)
+def fake_execute_values(monkeypatch):
+    monkeypatch.setattr(nhl_db, 'execute_values',
+        lambda cursor, cmd, rows, page_size=None: cursor.insert(cmd, rows))
+    nhl_db.written_keys.clear()
+
+def stats_writer(conn, batch_size=2, **kwargs):
+    writer = BulkWriter(conn, batch_size, **kwargs)
+    writer.register('nhl_skater_stats')
+    writer.register('nhl_sync_state', depends=True)
+    return writer
+
+def test_failed_row_skips_its_depends_row():
+    conn = FakeConnection(bad={('nhl_skater_stats', 10)})
+    writer = stats_writer(conn, batch_size=10)
+    for player_id in (10, 11):
+        writer.add('nhl_skater_stats', row('nhl_skater_stats', player_id))
+        writer.add('nhl_sync_state', row('nhl_sync_state', player_id))
+
+    assert writer.close() == 1
+    assert conn.rows('nhl_skater_stats') == [11]
+    assert conn.rows('nhl_sync_state') == [11]
+
+def test_failed_row_skips_its_depends_row_in_a_later_batch():
+    conn = FakeConnection(bad={('nhl_skater_stats', 10)})
+    writer = stats_writer(conn)
+    # the stats rows fill the first batch, so the sync state rows are only
+    # written in the next one
+    writer.add('nhl_skater_stats', row('nhl_skater_stats', 10))
+    writer.add('nhl_skater_stats', row('nhl_skater_stats', 11))
+    writer.add('nhl_sync_state', row('nhl_sync_state', 10))
+    writer.add('nhl_sync_state', row('nhl_sync_state', 11))
+    writer.close()
+
+    assert writer.failed == {10}
+    assert conn.rows('nhl_sync_state') == [11]
+
+class FakePool:
+    '''
+    Connection pool handing out fake connections.
+    '''
+
+    def __init__(self):
+        self.conns = []
+
+    def getconn(self):
+        self.conns.append(FakeConnection())
+        return self.conns[-1]
+
+    def putconn(self, conn):
+        pass
+
+def test_partition_writes_every_row_for_a_key_on_one_connection():
+    pool = FakePool()
+    writers = nhl_db.WriterPool(pool, 3, batch_size=4)
+    writers.register('nhl_skater_stats')
+    for player_id in range(20):
+        partition = writers.partition(player_id)
+        assert partition is writers.partition(player_id)
+        partition.add('nhl_skater_stats', row('nhl_skater_stats', player_id))
+
+    assert writers.close() == 0
+    written = [conn.rows('nhl_skater_stats') for conn in pool.conns]
+    assert sorted(sum(written, [])) == list(range(20))
+    for i, players in enumerate(written):
+        assert all(hash(player_id) % 3 == i for player_id in players)
+
+def test_rolled_back_rows_are_not_marked_written():
+    conn = FakeConnection()
+    queue = FakeQueue()
+    writer = stats_writer(conn, copy_tables=('nhl_skater_stats',),
+        queue=queue, policy=nhl_db.UNIT)
+    writer.add('nhl_skater_stats', row('nhl_skater_stats', 10))
+    conn.fail_commit = True
+    writer.complete('player 10')
+
+    assert queue.failed == ['player 10']
+    assert not writer.contains('nhl_skater_stats', (10, None, None, None))
+    assert writer.failed == {10}
+
+    # the row isn't skipped as already copied when it's queued again, but
+    # the player's sync state still isn't written this run
+    writer.add('nhl_skater_stats', row('nhl_skater_stats', 10))
+    writer.add('nhl_sync_state', row('nhl_sync_state', 10))
+    writer.complete('player 10')
+
+    assert queue.done == ['player 10']
+    assert conn.rows('nhl_skater_stats') == [10]
+    assert conn.rows('nhl_sync_state') == []
+
+def test_failed_select_keeps_uncommitted_rows():
+    conn = FakeConnection()
+    writer = stats_writer(conn, policy=nhl_db.PHASE)
+    writer.add('nhl_skater_stats', row('nhl_skater_stats', 10))
+    writer.add('nhl_skater_stats', row('nhl_skater_stats', 11))
+    conn.fail_select = True
+
+    assert nhl_db.sql_select(conn, 'select_teams') == 1
+    assert 'ROLLBACK TO SAVEPOINT sql_select' in conn.log
+
+    conn.fail_select = False
+    assert writer.close() == 0
+    assert conn.rows('nhl_skater_stats') == [10, 11]
@@ -0,0 +1,38 @@
+'''
+
+Description: Unit tests for the incremental sync checks in stats_parser.py.
+'''
+
+from stats_parser import changed_seasons, payload_hash
+
+CURRENT = '20222023'
+
+def season(season, sequence=1, goals=0):
+    return {'season': season, 'sequenceNumber': sequence,
+        'stat': {'goals': goals}}
+
+def test_first_sync_changes_every_season():
+    years = [season('20202021'), season('20212022'), season(CURRENT)]
+    changed, state = changed_seasons(8471214, years, (None, None), CURRENT)
+
+    assert changed == {('20202021', 1), ('20212022', 1), (CURRENT, 1)}
+    assert state[:3] == (8471214, payload_hash(years[:2]),
+        payload_hash(years[2:]))
+    # still has current season data, so isn't complete
+    assert state[3] is False
+    assert state[4] == CURRENT
+
+def test_only_current_season_changed():
+    years = [season('20212022'), season(CURRENT, goals=1)]
+    last = (payload_hash(years[:1]), payload_hash([season(CURRENT)]))
+    changed, _ = changed_seasons(8471214, years, last, CURRENT)
+
+    assert changed == {(CURRENT, 1)}
+
+def test_unchanged_player_without_current_season_is_complete():
+    years = [season('20192020'), season('20192020', sequence=2)]
+    last = (payload_hash(years), payload_hash([]))
+    changed, state = changed_seasons(8471214, years, last, CURRENT)
+
+    assert changed == set()
+    assert state[3] is True
@@ -0,0 +1,223 @@
+'''
+
+Description: Persistent work queue that lets an interrupted run be resumed.
+
+A run of nhl_data_pull.py or juniors_data_pull.py is broken up into units of
+work (i.e. one team's roster for a season, one player's stats, or one draft
+pick). Each unit is recorded in a local SQLite file along with its state -
+pending, done, or failed - and is only marked done once its rows have been
+committed to the database. If a run dies partway through, the next run with
+the same settings skips every unit that's already done and only processes the
+pending and failed ones. Once every unit of a run is done, the run's units are
+removed so the next run starts fresh.
+'''
+
+__version__ = '1.0'
+__title__ = 'work_queue'
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+
+log_file = logging.getLogger(__name__)
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+class WorkQueue:
+    '''
+    Units of work for one run of a program, stored in a SQLite file.
+
+    path -> location of the SQLite file holding the queue
+    run  -> key identifying the run; runs with the same settings share a key
+    '''
+
+    def __init__(self, path, run):
+        self.path = path
+        self.run = run
+
+        # counters reported when the queue is closed
+        self.skipped = 0
+        self.completed = 0
+        self.failed = 0
+
+        # bulk writers on every database writer thread share one connection
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS units ('
+            'run TEXT, unit TEXT, state TEXT, attempts INTEGER, '
+            'updated_at REAL, PRIMARY KEY (run, unit))'
+        )
+        self.db.commit()
+
+        counts = dict(self.db.execute(
+            'SELECT state, COUNT(*) FROM units WHERE run = ? GROUP BY state',
+            (run,)
+        ).fetchall())
+        if counts:
+            log_file.info(f"Resuming run {run}: {counts.get(DONE, 0)} units "
+                f"done, {counts.get(PENDING, 0)} pending, "
+                f"{counts.get(FAILED, 0)} failed...")
+
+    def plan(self, units):
+        '''
+        Add a list of units to the run (units already in the queue keep their
+        state) and return the ones that still need to be processed, in order.
+        '''
+
+        units = list(dict.fromkeys(units))
+        now = time.time()
+        done = set()
+        with self.lock:
+            self.db.executemany(
+                'INSERT OR IGNORE INTO units (run, unit, state, attempts, '
+                'updated_at) VALUES (?, ?, ?, 0, ?)',
+                [(self.run, unit, PENDING, now) for unit in units]
+            )
+            self.db.commit()
+
+            # look up states in chunks to stay under SQLite's variable limit
+            for i in range(0, len(units), 500):
+                chunk = units[i:i + 500]
+                done.update(unit for unit, in self.db.execute(
+                    f"SELECT unit FROM units WHERE run = ? AND state = ? AND "
+                    f"unit IN ({', '.join('?' * len(chunk))})",
+                    [self.run, DONE] + chunk
+                ))
+        if done:
+            log_file.info(f"Skipping {len(done)} of {len(units)} units "
+                f"finished by an earlier run...")
+        self.skipped += len(done)
+
+        return [unit for unit in units if unit not in done]
+
+    def done(self, unit):
+        '''
+        Check whether a unit was finished by this or an earlier run.
+        '''
+
+        with self.lock:
+            row = self.db.execute(
+                'SELECT state FROM units WHERE run = ? AND unit = ?',
+                (self.run, unit)
+            ).fetchone()
+        return row is not None and row[0] == DONE
+
+    def complete(self, units):
+        '''
+        Mark units as done once their rows are committed to the database.
+        '''
+
+        self._set_state(units, DONE)
+
+    def fail(self, units):
+        '''
+        Mark units as failed so the next run processes them again.
+        '''
+
+        self._set_state(units, FAILED)
+        log_file.warning(f"Marked {len(units)} units as failed...they'll be "
+            f"retried on the next run...")
+
+    def _set_state(self, units, state):
+        '''
+        Update the state of a list of units and count the attempt. Safe to
+        call from any of the database writer threads.
+        '''
+
+        now = time.time()
+        with self.lock:
+            self.db.executemany(
+                'UPDATE units SET state = ?, attempts = attempts + 1, '
+                'updated_at = ? WHERE run = ? AND unit = ?',
+                [(state, now, self.run, unit) for unit in units]
+            )
+            self.db.commit()
+            if state == DONE:
+                self.completed += len(units)
+            else:
+                self.failed += len(units)
+
+    def reset(self):
+        '''
+        Throw away every unit recorded for the run so it starts over.
+        '''
+
+        self.db.execute('DELETE FROM units WHERE run = ?', (self.run,))
+        self.db.commit()
+        log_file.info(f"Discarded saved progress for run {self.run}...")
+
+    def finish(self):
+        '''
+        Remove the run's units if every one of them is done, so the next run
+        with the same settings starts from scratch. Otherwise they're kept
+        for the next run to pick up.
+        '''
+
+        left = self.db.execute(
+            'SELECT COUNT(*) FROM units WHERE run = ? AND state != ?',
+            (self.run, DONE)
+        ).fetchone()[0]
+        if left:
+            log_file.warning(f"{left} units of run {self.run} weren't "
+                f"finished...rerun with the same settings to resume...")
+        else:
+            self.db.execute('DELETE FROM units WHERE run = ?', (self.run,))
+            self.db.commit()
+
+    def summary(self):
+        '''
+        Return a one line summary of the queue's counters for the log.
+        '''
+
+        return (
+            f"Work queue: {self.completed} units done, {self.failed} failed, "
+            f"{self.skipped} skipped as already done"
+        )
+
+    def close(self):
+        '''
+        Log the queue's counters and close the SQLite file.
+        '''
+
+        log_file.info(self.summary())
+        self.db.close()
+
+def open_queue(config, program, settings):
+    '''
+    Open the work queue for a run of a program. The run is identified by a
+    hash of the settings that decide what it pulls (a dict), so a rerun with
+    the same settings resumes the earlier run.
+
+    The queue is stored in the SQLite file set by PATH in the [QUEUE] section
+    of the config file, or {HOME}/cache/{program}_queue.sqlite by default.
+    '''
+
+    path = config.get('QUEUE', 'PATH', fallback=None)
+    if not path:
+        path = f"{os.path.expanduser('~')}/cache/{program}_queue.sqlite"
+
+    # create the queue directory if it doesn't exist
+    queue_dir = os.path.dirname(path)
+    if queue_dir and not os.path.isdir(queue_dir):
+        try:
+            os.makedirs(queue_dir)
+        except:
+            # couldn't create dir; default to {HOME}/cache
+            queue_dir = f"{os.path.expanduser('~')}/cache"
+            path = f"{queue_dir}/{os.path.basename(path)}"
+            if not os.path.isdir(queue_dir):
+                os.makedirs(queue_dir)
+
+    settings = json.dumps(settings, sort_keys=True)
+    run = f"{program}-{hashlib.sha1(settings.encode()).hexdigest()[:12]}"
+    log_file.info(f"Tracking run {run} in work queue {path}...")
+    return WorkQueue(path, run)